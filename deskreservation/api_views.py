@@ -7,6 +7,10 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .helpers import (
+    DETAIL_REPORT_EXPORTS, desk_utilization_summary, detail_report_export_response,
+    detail_report_rows, employee_utilization_summary, publish_desk_events
+)
 from .models import Desk, DeskReservation
 from .serializers import DeskReservationSerializer, DeskSerializer
 from mainsite.helpers import get_is_trusted_ip
@@ -20,6 +24,9 @@ class DeskViewSet(viewsets.ModelViewSet):
     queryset = Desk.active_objects.all()
     serializer_class = DeskSerializer
 
+    def get_queryset(self):
+        return Desk.active_objects.with_todays_holds()
+
     # TODO: We should only allow trusted IPs to see desks unauthenticated,
     # but I couldn't get it to work because the server doesn't have the client
     # IP.
@@ -80,12 +87,14 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
                 context={'request': request})
             return Response({**serialized_reservation.data, 'created': False})
         else:
-            if desk.held_today and not any([employee in hold.employees.all() for hold in desk.todays_holds]):
+            holds = desk.todays_holds or []
+            if holds and not any([employee in hold.employees.all() for hold in holds]):
                 # Check to see if the desk is held for other employees today.
                 return Response({'desk_number': request.data['desk_number'], 'desk_held': True})
             else:
                 # Otherwise, reserve the desk
                 reservation = DeskReservation.objects.create(employee=employee, desk=desk)
+                publish_desk_events([desk.pk])
                 serialized_reservation = DeskReservationSerializer(reservation,
                     context={'request': request})
                 return Response({**serialized_reservation.data, 'created': True})
@@ -95,6 +104,7 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
         reservation = DeskReservation.objects.get(pk=pk)
         reservation.check_out = datetime.now(tz=get_current_timezone())
         reservation.save()
+        publish_desk_events([reservation.desk_id])
         serialized_reservation = DeskReservationSerializer(reservation,
             context={'request': request})
         return Response(serialized_reservation.data)
@@ -132,6 +142,18 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
         end_date_time = timezone('US/Pacific').localize(end_date_time)
         return (start_date_time, end_date_time)
 
+    @staticmethod
+    def detail_report_response(request, rows, filename):
+        """
+        Helper method to return detail report rows as JSON keyed by
+        reservation pk, or streamed as a file when an export of 'csv' or
+        'ndjson' is requested.
+        """
+        export = request.data.get('export')
+        if export in DETAIL_REPORT_EXPORTS:
+            return detail_report_export_response(rows, export, filename)
+        return Response({pk: row for pk, row in rows})
+
     @action(
         detail=False,
         methods=['post'],
@@ -145,37 +167,7 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
         """
         start_date_time, end_date_time = \
             self.parseReportRequestData(request.data)
-        desk_stats = {}
-        for desk in Desk.objects.all():
-            total_hours = timedelta(0)
-            days_utilized = []
-            most_frequent_employee = '' 
-            most_frequent_employee_time = timedelta(0)
-            reservations = DeskReservation.objects.filter(
-                desk=desk,
-                check_in__lte=end_date_time,
-                check_out__gte=start_date_time
-            )
-            for reservation in reservations:
-                start = max(start_date_time, reservation.check_in)
-                end = min(end_date_time, reservation.check_out)
-                reservation_duration = end - start
-                total_hours += reservation_duration
-                day = [start.month, start.day]
-                if not day in days_utilized:
-                    days_utilized.append(day)
-                if reservation_duration > most_frequent_employee_time:
-                    most_frequent_employee_time = reservation_duration
-                    most_frequent_employee = reservation.employee.username()
-            desk_stats[
-                f'{desk.get_building_display()} {desk.floor}F {desk.number}'
-            ] = {
-                'total_hours': \
-                    f'{total_hours.days * 24 + total_hours.seconds // 3600}h' +
-                    f'{(total_hours.seconds//60)%60}m',
-                'days_utilized': len(days_utilized),
-                'most_frequent_employee': most_frequent_employee
-            }
+        desk_stats = desk_utilization_summary(start_date_time, end_date_time)
         return Response(desk_stats)
 
     @action(
@@ -187,26 +179,10 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
     def desk_detail_report(self, request):
         start_dt, end_dt = self.parseReportRequestData(request.data)
         # For each desk, and within the date range, give all reservations.
-        reservation_data = {}
-        reservations = DeskReservation.objects.filter(
-            check_in__lte=end_dt,
-            check_out__gte=start_dt,
-            desk__pk__in=request.data['desks']
+        rows = detail_report_rows(
+            start_dt, end_dt, desk__pk__in=request.data['desks']
         )
-        for res in reservations:
-            start = max(start_dt, res.check_in)
-            end = min(end_dt, res.check_out)
-            duration = end - start
-            reservation_data[res.pk] = {
-                'employee': res.employee.username(),
-                'desk': f'{res.desk.get_building_display()} {res.desk.floor}' +
-                    f'F {res.desk.number}',
-                'day': res.check_in.strftime('%Y-%m-%d'),
-                'total_hours':
-                    f'{duration.days * 24 + duration.seconds // 3600}h' +
-                    f'{(duration.seconds//60)%60}m'
-            }
-        return Response(reservation_data)
+        return self.detail_report_response(request, rows, 'desk-detail-report')
     
     @action(
         detail=False,
@@ -216,42 +192,14 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
     )
     def employee_summary_report(self, request):
         """
-        For each desk, and within the range, give the number of hours it was
-        utilized and the number of days it was utilized at all.
+        For each employee, and within the range, give the number of hours they
+        reserved desks and the number of days they reserved a desk at all.
         """
         start_date_time, end_date_time = \
             self.parseReportRequestData(request.data)
-        employee_stats = {}
-        for employee in Employee.objects.all():
-            total_hours = timedelta(0)
-            days_utilized = []
-            most_frequent_desk = '' 
-            most_frequent_desk_time = timedelta(0)
-            reservations = DeskReservation.objects.filter(
-                employee=employee,
-                check_in__lte=end_date_time,
-                check_out__gte=start_date_time
-            )
-            for reservation in reservations:
-                start = max(start_date_time, reservation.check_in)
-                end = min(end_date_time, reservation.check_out)
-                reservation_duration = end - start
-                total_hours += reservation_duration
-                day = [start.month, start.day]
-                if not day in days_utilized:
-                    days_utilized.append(day)
-                if reservation_duration > most_frequent_desk_time:
-                    most_frequent_desk_time = reservation_duration
-                    desk = reservation.desk
-                    most_frequent_desk = f'{desk.get_building_display()} ' +\
-                        f'{desk.floor}F {desk.number}'
-            employee_stats[f'{employee.username()}'] = {
-                'total_hours':
-                    f'{total_hours.days * 24 + total_hours.seconds // 3600}h' +
-                    f'{(total_hours.seconds//60)%60}m',
-                'days_utilized': len(days_utilized),
-                'most_frequent_desk': most_frequent_desk
-            }
+        employee_stats = employee_utilization_summary(
+            start_date_time, end_date_time
+        )
         return Response(employee_stats)
 
     @action(
@@ -263,23 +211,9 @@ class DeskReservationViewSet(viewsets.ModelViewSet):
     def employee_detail_report(self, request):
         start_dt, end_dt = self.parseReportRequestData(request.data)
         # For each employee, and within the date range, give all reservations.
-        reservation_data = {}
-        reservations = DeskReservation.objects.filter(
-            check_in__lte=end_dt,
-            check_out__gte=start_dt,
-            employee__pk__in=request.data['employees']
+        rows = detail_report_rows(
+            start_dt, end_dt, employee__pk__in=request.data['employees']
+        )
+        return self.detail_report_response(
+            request, rows, 'employee-detail-report'
         )
-        for res in reservations:
-            start = max(start_dt, res.check_in)
-            end = min(end_dt, res.check_out)
-            duration = end - start
-            reservation_data[res.pk] = {
-                'employee': res.employee.username(),
-                'desk': f'{res.desk.get_building_display()} {res.desk.floor}' +
-                    f'F {res.desk.number}',
-                'day': res.check_in.strftime('%Y-%m-%d'),
-                'total_hours':
-                    f'{duration.days * 24 + duration.seconds // 3600}h' +
-                    f'{(duration.seconds//60)%60}m'
-            }
-        return Response(reservation_data)
@@ -1,14 +1,327 @@
-from datetime import datetime
+import csv
+from datetime import datetime, timedelta
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 
 from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models import Value, Window
+from django.db.models.functions import Greatest, Least, RowNumber, TruncDate
 from django.utils.timezone import get_current_timezone
 
 
 def end_all_desk_reservations():
+    """
+    Check out every open reservation with a single update and reset the
+    screens of each floor that had one. Returns a dict of (building, floor)
+    to the number of reservations ended there.
+    """
+    DeskReservation = apps.get_model('deskreservation.DeskReservation')
+    now = datetime.now(tz=get_current_timezone())
+    with transaction.atomic():
+        # Lock the open reservations so the summary matches what is updated
+        open_reservations = list(
+            DeskReservation.currently_reserved_objects\
+                .select_for_update(of=('self',))\
+                .order_by('desk__building', 'desk__floor')\
+                .values_list('pk', 'desk__building', 'desk__floor')
+        )
+        DeskReservation.objects\
+            .filter(pk__in=[pk for pk, building, floor in open_reservations])\
+            .update(check_out=now)
+        summary = {}
+        for pk, building, floor in open_reservations:
+            summary[(building, floor)] = summary.get((building, floor), 0) + 1
+        publish_floor_snapshots(summary.keys())
+    return summary
+
+
+def format_duration(duration):
+    return f'{duration.days * 24 + duration.seconds // 3600}h' + \
+        f'{(duration.seconds//60)%60}m'
+
+
+def desk_label(building, floor, number):
+    Desk = apps.get_model('deskreservation.Desk')
+    return f'{dict(Desk.BUILDING_CHOICE).get(building, building)} ' + \
+        f'{floor}F {number}'
+
+
+def clipped_reservations(start_date_time, end_date_time):
+    """
+    Reservations overlapping the range, annotated with their check in and
+    check out clipped to the range and the resulting duration.
+    """
     DeskReservation = apps.get_model('deskreservation.DeskReservation')
-    active_reservations = DeskReservation.objects.filter(check_out__isnull=True)
-    for reservation in active_reservations:
-        reservation.check_out = datetime.now(tz=get_current_timezone())
-        reservation.save()
-    return active_reservations.count()
+    return DeskReservation.objects\
+        .filter(
+            check_in__lte=end_date_time,
+            check_out__gte=start_date_time
+        )\
+        .annotate(
+            clipped_start=Greatest('check_in', Value(start_date_time)),
+            clipped_end=Least('check_out', Value(end_date_time))
+        )\
+        .annotate(duration=ExpressionWrapper(
+            F('clipped_end') - F('clipped_start'),
+            output_field=DurationField()
+        ))
+
+
+def utilization_summary(start_date_time, end_date_time, group_by, top_fields):
+    """
+    Group the clipped reservations in the range by `group_by` and return a
+    dict of group pk to total duration, number of distinct days utilized,
+    and the `top_fields` values of the group's longest reservation. Runs two
+    queries no matter how many reservations are in the range.
+    """
+    reservations = clipped_reservations(start_date_time, end_date_time)
+    totals = reservations.order_by().values(group_by).annotate(
+        total=Sum('duration'),
+        days=Count(TruncDate('clipped_start'), distinct=True)
+    )
+    summary = {
+        row[group_by]: {
+            'total': row['total'] or timedelta(0),
+            'days': row['days'],
+            'top': None
+        } for row in totals
+    }
+    # Ties go to the most recent reservation
+    longest = reservations\
+        .filter(duration__gt=timedelta(0))\
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F(group_by)],
+            order_by=[F('duration').desc(), F('pk').desc()]
+        ))\
+        .filter(rank=1)\
+        .values_list(group_by, *top_fields)
+    for pk, *values in longest:
+        summary[pk]['top'] = values
+    return summary
+
+
+def desk_utilization_summary(start_date_time, end_date_time):
+    """
+    For each desk, and within the range, give the number of hours it was
+    utilized, the number of days it was utilized at all, and the employee
+    with the longest reservation.
+    """
+    Desk = apps.get_model('deskreservation.Desk')
+    summary = utilization_summary(
+        start_date_time, end_date_time, 'desk_id',
+        ['employee__user__username']
+    )
+    desk_stats = {}
+    for desk in Desk.objects.all():
+        stats = summary.get(desk.pk)
+        desk_stats[desk_label(desk.building, desk.floor, desk.number)] = {
+            'total_hours': format_duration(
+                stats['total'] if stats else timedelta(0)
+            ),
+            'days_utilized': stats['days'] if stats else 0,
+            'most_frequent_employee': \
+                stats['top'][0] if stats and stats['top'] else ''
+        }
+    return desk_stats
+
+
+def employee_utilization_summary(start_date_time, end_date_time):
+    """
+    For each employee, and within the range, give the number of hours they
+    reserved desks, the number of days they reserved a desk at all, and the
+    desk of their longest reservation.
+    """
+    Employee = apps.get_model('people.Employee')
+    summary = utilization_summary(
+        start_date_time, end_date_time, 'employee_id',
+        ['desk__building', 'desk__floor', 'desk__number']
+    )
+    employee_stats = {}
+    employees = Employee.objects.values_list('pk', 'user__username')
+    for pk, username in employees:
+        stats = summary.get(pk)
+        employee_stats[f'{username}'] = {
+            'total_hours': format_duration(
+                stats['total'] if stats else timedelta(0)
+            ),
+            'days_utilized': stats['days'] if stats else 0,
+            'most_frequent_desk': \
+                desk_label(*stats['top']) if stats and stats['top'] else ''
+        }
+    return employee_stats
+
+
+DETAIL_REPORT_CHUNK_SIZE = 2000
+DETAIL_REPORT_COLUMNS = ['reservation', 'employee', 'desk', 'day', 'total_hours']
+
+
+def detail_report_rows(start_date_time, end_date_time, **filters):
+    """
+    Yield a (pk, row) pair for each reservation overlapping the range, with
+    its hours clipped to the range. Reservations are read in chunks so a long
+    range never has to be held in memory at once.
+    """
+    reservations = clipped_reservations(start_date_time, end_date_time)\
+        .filter(**filters)\
+        .select_related('employee__user', 'desk')\
+        .order_by('pk')
+    for res in reservations.iterator(chunk_size=DETAIL_REPORT_CHUNK_SIZE):
+        yield res.pk, {
+            'employee': res.employee.username(),
+            'desk': desk_label(res.desk.building, res.desk.floor, res.desk.number),
+            'day': res.check_in.strftime('%Y-%m-%d'),
+            'total_hours': format_duration(res.duration)
+        }
+
+
+class Echo:
+    """
+    File-like object that hands back whatever is written to it, so csv.writer
+    can format one line at a time for a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(DETAIL_REPORT_COLUMNS)
+    for pk, row in rows:
+        yield writer.writerow([pk] + [row[key] for key in DETAIL_REPORT_COLUMNS[1:]])
+
+
+def stream_ndjson(rows):
+    for pk, row in rows:
+        yield json.dumps({'reservation': pk, **row}) + '\n'
+
+
+DETAIL_REPORT_EXPORTS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson')
+}
+
+
+def detail_report_export_response(rows, export, filename):
+    """
+    Stream the detail report rows as a CSV or NDJSON attachment.
+    """
+    stream, content_type = DETAIL_REPORT_EXPORTS[export]
+    return StreamingHttpResponse(
+        stream(rows),
+        content_type=content_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{export}"'
+        }
+    )
+
+
+def screen_group_name(building, floor):
+    return f'screen_{building}_{floor}'
+
+
+def screens_enabled():
+    # Channels falls back to an in-memory layer when CHANNEL_LAYERS isn't
+    # set, which no screen would be listening on
+    return bool(getattr(settings, 'CHANNEL_LAYERS', None))
+
+
+def desk_event(desk, reservation=None):
+    """
+    Compact description of a desk's current state for the floor screens.
+    """
+    if reservation:
+        state = 'reserved'
+        initials = reservation.employee.initials
+    else:
+        state = 'held' if desk.held_today else 'available'
+        initials = ''
+    return {
+        'desk': desk.pk,
+        'number': desk.number,
+        'state': state,
+        'initials': initials
+    }
+
+
+def floor_snapshot(building, floor):
+    """
+    The state of every active desk on a floor, in a constant number of
+    queries.
+    """
+    Desk = apps.get_model('deskreservation.Desk')
+    DeskReservation = apps.get_model('deskreservation.DeskReservation')
+    desks = Desk.active_objects\
+        .filter(building=building, floor=floor)\
+        .with_todays_holds()
+    reservations = {
+        res.desk_id: res for res in DeskReservation.currently_reserved_objects\
+            .filter(desk__building=building, desk__floor=floor)\
+            .select_related('employee__user')
+    }
+    return [desk_event(desk, reservations.get(desk.pk)) for desk in desks]
+
+
+def publish_desk_events(desk_pks):
+    """
+    Once the current transaction commits, send the new state of the desks to
+    the screens for their floors. Does nothing unless CHANNEL_LAYERS is
+    set, as there are no screens to send to without it.
+    """
+    if not screens_enabled():
+        return
+    desk_pks = list(desk_pks)
+    transaction.on_commit(lambda: send_desk_events(desk_pks))
+
+
+def send_desk_events(desk_pks):
+    Desk = apps.get_model('deskreservation.Desk')
+    DeskReservation = apps.get_model('deskreservation.DeskReservation')
+    channel_layer = get_channel_layer()
+    reservations = {
+        res.desk_id: res for res in DeskReservation.currently_reserved_objects\
+            .filter(desk__pk__in=desk_pks)\
+            .select_related('employee__user')
+    }
+    floors = {}
+    for desk in Desk.objects.filter(pk__in=desk_pks).with_todays_holds():
+        floors.setdefault(screen_group_name(desk.building, desk.floor), [])\
+            .append(desk_event(desk, reservations.get(desk.pk)))
+    for group_name, events in floors.items():
+        async_to_sync(channel_layer.group_send)(
+            group_name,
+            {
+                'type': 'desk_events',
+                'events': events
+            }
+        )
+
+
+def publish_floor_snapshots(floors):
+    """
+    Once the current transaction commits, send a fresh snapshot to the
+    screens of each (building, floor), replacing whatever they were showing.
+    Does nothing unless CHANNEL_LAYERS is set.
+    """
+    if not screens_enabled():
+        return
+    floors = list(floors)
+    transaction.on_commit(lambda: send_floor_snapshots(floors))
+
 
+def send_floor_snapshots(floors):
+    channel_layer = get_channel_layer()
+    for building, floor in floors:
+        async_to_sync(channel_layer.group_send)(
+            screen_group_name(building, floor),
+            {
+                'type': 'desk_snapshot',
+                'snapshot': floor_snapshot(building, floor)
+            }
+        )
@@ -3,12 +3,18 @@ from datetime import datetime
 from django.core.management.base import BaseCommand, CommandError
 
 from deskreservation.helpers import end_all_desk_reservations
+from deskreservation.models import Desk
 
 class Command(BaseCommand):
     help = 'Ends all active desk reservations. To be run at the end of each day.'
 
     def handle(self, *args, **options):
-        count = end_all_desk_reservations()
-        # TODO: Output some data about how many reservations ended, etc.
+        summary = end_all_desk_reservations()
+        count = sum(summary.values())
         message = f'{ datetime.now() } - Ended all active desk reservations. Count: { count }'
-        self.stdout.write(self.style.SUCCESS(message))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(message))
+        buildings = dict(Desk.BUILDING_CHOICE)
+        for (building, floor), floor_count in summary.items():
+            self.stdout.write(
+                f'    { buildings.get(building, building) } { floor }F: { floor_count }'
+            )
\ No newline at end of file
@@ -1,12 +1,32 @@
 from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.utils.timezone import get_current_timezone
 from django.utils.translation import gettext as _
 
+from .helpers import publish_desk_events
 from mainsite.models import ActiveManager
 
 
+class DeskQuerySet(models.QuerySet):
+    def with_todays_holds(self):
+        """
+        Prefetch each desk's holds for today, with their employees, so that
+        held_today and todays_holds cost no further queries per desk.
+        """
+        hold_pks = [
+            pk for pks in DeskHold.todays_index().values() for pk in pks
+        ]
+        return self.prefetch_related(models.Prefetch(
+            'holds',
+            queryset=DeskHold.objects.filter(pk__in=hold_pks)\
+                .prefetch_related('employees'),
+            to_attr='_todays_holds'
+        ))
+
+
 class Desk(models.Model):
     SCHAEFERS = 'S'
     PARK_PLACE = 'P'
@@ -21,8 +41,8 @@ class Desk(models.Model):
     def __str__(self):
         return f"Desk: {self.get_building_display()} {self.floor}F #{self.number} "
 
-    objects = models.Manager()
-    active_objects = ActiveManager()
+    objects = DeskQuerySet.as_manager()
+    active_objects = ActiveManager.from_queryset(DeskQuerySet)()
 
     building = models.CharField(
         _("building"), max_length=1, choices=BUILDING_CHOICE,
@@ -37,58 +57,20 @@ class Desk(models.Model):
     @property
     def held_today(self):
         # Return true if there is a hold on a desk today
-        # Check day of week
-        day_of_week = datetime.now(tz=get_current_timezone()).weekday()
-        day = None
-        if day_of_week == 0:
-            day = DeskHold.MONDAY
-        elif day_of_week == 1:
-            day = DeskHold.TUESDAY
-        elif day_of_week == 2:
-            day = DeskHold.WEDNESDAY
-        elif day_of_week == 3:
-            day = DeskHold.THURSDAY
-        elif day_of_week == 4:
-            day = DeskHold.FRIDAY
-        if DeskHold.active_objects.filter(desk=self, day=day).count():
-            return True
-        # Check dates
-        for hold in DeskHold.active_objects.filter(desk=self):
-            if hold.dates and isinstance(hold.dates, list) and datetime.now(
-                tz=get_current_timezone()
-            ).date().isoformat() in hold.dates:
-                return True
-        return False
-    
+        if hasattr(self, '_todays_holds'):
+            return bool(self._todays_holds)
+        return self.pk in DeskHold.todays_index()
+
     @property
     def todays_holds(self):
         # Return today's holds if there are any holds on a desk today.
-        # Check day of week
-        holds = []
-        day_of_week = datetime.now(tz=get_current_timezone()).weekday()
-        if day_of_week == 0:
-            day = DeskHold.MONDAY
-        elif day_of_week == 1:
-            day = DeskHold.TUESDAY
-        elif day_of_week == 2:
-            day = DeskHold.WEDNESDAY
-        elif day_of_week == 3:
-            day = DeskHold.THURSDAY
-        elif day_of_week == 4:
-            day = DeskHold.FRIDAY
-        if DeskHold.active_objects.filter(desk=self, day=day).count():
-            hold = DeskHold.active_objects.filter(desk=self, day=day).first()
-            if hold:
-                holds.append(hold)
-        # Check dates
-        for hold in DeskHold.active_objects.filter(desk=self):
-            if hold.dates and isinstance(hold.dates, list) and datetime.now(
-                tz=get_current_timezone()
-            ).date().isoformat() in hold.dates:
-                holds.append(hold)
-        if holds:
-            return holds
-        return None
+        if hasattr(self, '_todays_holds'):
+            return self._todays_holds or None
+        hold_pks = DeskHold.todays_index().get(self.pk)
+        if not hold_pks:
+            return None
+        holds = DeskHold.objects.in_bulk(hold_pks)
+        return [holds[pk] for pk in hold_pks if pk in holds] or None
 
 
 class DeskHold(models.Model):
@@ -105,12 +87,64 @@ class DeskHold(models.Model):
         (FRIDAY, 'Friday'),
     ]
 
+    # Weekday number to day code, for Monday through Friday
+    WEEKDAYS = [MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY]
+
     class Meta:
         unique_together = ["desk", "day"]
 
     def __str__(self):
         return f"Desk hold for {self.desk} on {self.get_day_display()}s"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        DeskHold.clear_todays_index()
+        publish_desk_events([self.desk_id])
+
+    def delete(self, *args, **kwargs):
+        desk_pk = self.desk_id
+        result = super().delete(*args, **kwargs)
+        DeskHold.clear_todays_index()
+        publish_desk_events([desk_pk])
+        return result
+
+    @staticmethod
+    def index_cache_key(day):
+        return f'deskreservation:todays_holds:{day.isoformat()}'
+
+    @staticmethod
+    def todays_index():
+        """
+        Return a dict of desk pk to the pks of that desk's active holds today,
+        day of week holds first. Built with one query and cached for the day.
+        """
+        today = datetime.now(tz=get_current_timezone()).date()
+        key = DeskHold.index_cache_key(today)
+        index = cache.get(key)
+        if index is None:
+            index = {}
+            day = DeskHold.WEEKDAYS[today.weekday()] \
+                if today.weekday() < len(DeskHold.WEEKDAYS) else None
+            holds = DeskHold.active_objects\
+                .order_by('pk')\
+                .values_list('pk', 'desk_id', 'day', 'dates')
+            date_holds = []
+            for pk, desk_id, hold_day, dates in holds:
+                if day and hold_day == day:
+                    index.setdefault(desk_id, []).append(pk)
+                elif dates and isinstance(dates, list) and \
+                    today.isoformat() in dates:
+                    date_holds.append((desk_id, pk))
+            for desk_id, pk in date_holds:
+                index.setdefault(desk_id, []).append(pk)
+            cache.set(key, index, settings.LOCAL_CACHE_TIMEOUT)
+        return index
+
+    @staticmethod
+    def clear_todays_index():
+        today = datetime.now(tz=get_current_timezone()).date()
+        cache.delete(DeskHold.index_cache_key(today))
+
     objects = models.Manager()
     active_objects = ActiveManager()
 
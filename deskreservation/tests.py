@@ -1,3 +1,266 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+import json
 
-# Create your tests here.
+from pytz import timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.timezone import get_current_timezone
+
+from rest_framework.test import APIClient
+
+from deskreservation.helpers import end_all_desk_reservations
+from deskreservation.models import Desk, DeskHold, DeskReservation
+from people.models import Employee
+
+
+def pacific(*args):
+    return timezone('US/Pacific').localize(datetime(*args))
+
+
+class DeskReportTestCase(TestCase):
+    def setUp(self):
+        self.alice = Employee.objects.create(
+            user=User.objects.create(username="alice")
+        )
+        self.bob = Employee.objects.create(
+            user=User.objects.create(username="bob")
+        )
+        self.desk_1 = Desk.objects.create(number="101")
+        self.desk_2 = Desk.objects.create(number="102", floor=2)
+        Desk.objects.create(number="103")
+        self.client = APIClient()
+        self.report_range = {
+            'startDateTime': '2025-01-06 00:00',
+            'endDateTime': '2025-01-11 00:00'
+        }
+
+    def reserve(self, employee, desk, check_in, check_out):
+        reservation = DeskReservation.objects.create(
+            employee=employee, desk=desk
+        )
+        DeskReservation.objects.filter(pk=reservation.pk).update(
+            check_in=check_in, check_out=check_out
+        )
+
+    def test_desk_summary_report(self):
+        # 2h on Monday and 3h on Tuesday for Alice
+        self.reserve(
+            self.alice, self.desk_1, pacific(2025, 1, 6, 8), pacific(2025, 1, 6, 10)
+        )
+        self.reserve(
+            self.alice, self.desk_1, pacific(2025, 1, 7, 8), pacific(2025, 1, 7, 11)
+        )
+        # 4h on Monday for Bob, clipped to 1h30m by the start of the range
+        self.reserve(
+            self.bob, self.desk_1, pacific(2025, 1, 5, 22), pacific(2025, 1, 6, 1, 30)
+        )
+        self.reserve(
+            self.bob, self.desk_2, pacific(2025, 1, 8, 9), pacific(2025, 1, 8, 9, 45)
+        )
+        # Outside of the range
+        self.reserve(
+            self.bob, self.desk_2, pacific(2025, 1, 2, 9), pacific(2025, 1, 2, 17)
+        )
+
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                '/api/v1/deskreservation/desk-summary-report',
+                self.report_range, format='json'
+            )
+        self.assertEqual(response.data, {
+            'Schaefers 1F 101': {
+                'total_hours': '6h30m',
+                'days_utilized': 2,
+                'most_frequent_employee': 'alice'
+            },
+            'Schaefers 1F 103': {
+                'total_hours': '0h0m',
+                'days_utilized': 0,
+                'most_frequent_employee': ''
+            },
+            'Schaefers 2F 102': {
+                'total_hours': '0h45m',
+                'days_utilized': 1,
+                'most_frequent_employee': 'bob'
+            }
+        })
+
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                '/api/v1/deskreservation/employee-summary-report',
+                self.report_range, format='json'
+            )
+        self.assertEqual(response.data, {
+            'alice': {
+                'total_hours': '5h0m',
+                'days_utilized': 2,
+                'most_frequent_desk': 'Schaefers 1F 101'
+            },
+            'bob': {
+                'total_hours': '2h15m',
+                'days_utilized': 2,
+                'most_frequent_desk': 'Schaefers 1F 101'
+            }
+        })
+
+    def test_detail_report_exports(self):
+        self.reserve(
+            self.alice, self.desk_1, pacific(2025, 1, 6, 8), pacific(2025, 1, 6, 10)
+        )
+        self.reserve(
+            self.bob, self.desk_1, pacific(2025, 1, 5, 22), pacific(2025, 1, 6, 1, 30)
+        )
+        self.reserve(
+            self.bob, self.desk_2, pacific(2025, 1, 8, 9), pacific(2025, 1, 8, 9, 45)
+        )
+        desks = {**self.report_range, 'desks': [self.desk_1.pk]}
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/v1/deskreservation/desk-detail-report', desks,
+                format='json'
+            )
+        self.assertEqual(
+            [row['total_hours'] for row in response.data.values()],
+            ['2h0m', '1h30m']
+        )
+
+        response = self.client.post(
+            '/api/v1/deskreservation/desk-detail-report',
+            {**desks, 'export': 'csv'}, format='json'
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'reservation,employee,desk,day,total_hours')
+        self.assertEqual(
+            [line.split(',')[1:] for line in lines[1:]],
+            [
+                ['alice', 'Schaefers 1F 101', '2025-01-06', '2h0m'],
+                ['bob', 'Schaefers 1F 101', '2025-01-06', '1h30m']
+            ]
+        )
+
+        response = self.client.post(
+            '/api/v1/deskreservation/employee-detail-report',
+            {**self.report_range, 'employees': [self.bob.pk], 'export': 'ndjson'},
+            format='json'
+        )
+        rows = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [(row['desk'], row['total_hours']) for row in rows],
+            [('Schaefers 1F 101', '1h30m'), ('Schaefers 2F 102', '0h45m')]
+        )
+
+
+class DeskHoldIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = datetime.now(tz=get_current_timezone()).date()
+        self.alice = Employee.objects.create(
+            user=User.objects.create(username="alice")
+        )
+        self.desks = [
+            Desk.objects.create(number=f"{100 + i}") for i in range(4)
+        ]
+        hold = DeskHold.objects.create(
+            desk=self.desks[0], dates=[self.today.isoformat()]
+        )
+        hold.employees.add(self.alice)
+        DeskHold.objects.create(
+            desk=self.desks[1],
+            dates=[(self.today + timedelta(days=1)).isoformat()]
+        )
+        DeskHold.objects.create(
+            desk=self.desks[2], dates=[self.today.isoformat()], active=False
+        )
+        self.client = APIClient()
+
+    def held_today(self):
+        response = self.client.get('/api/v1/desk')
+        return {
+            desk['number']: desk['held_today']
+            for desk in response.data['results']
+        }
+
+    def test_floor_queries_do_not_grow_with_desks(self):
+        # Count, desks, index, holds and hold employees
+        with self.assertNumQueries(5):
+            self.assertEqual(self.held_today(), {
+                '100': True, '101': False, '102': False, '103': False
+            })
+        for i in range(4, 10):
+            Desk.objects.create(number=f"{100 + i}")
+        # The index is cached
+        with self.assertNumQueries(4):
+            self.held_today()
+
+    def test_hold_changes_refresh_index(self):
+        self.assertEqual(self.desks[1].todays_holds, None)
+        hold = self.desks[1].holds.get()
+        hold.dates.append(self.today.isoformat())
+        hold.save()
+        self.assertTrue(self.held_today()['101'])
+        self.assertEqual(self.desks[1].todays_holds, [hold])
+        hold.delete()
+        self.assertFalse(self.desks[1].held_today)
+
+
+@override_settings(CHANNEL_LAYERS={
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+})
+class EndAllDeskReservationsTestCase(TestCase):
+    def test_bulk_check_out_summary(self):
+        employee = Employee.objects.create(
+            user=User.objects.create(username="alice")
+        )
+        desks = [
+            Desk.objects.create(number="101"),
+            Desk.objects.create(number="102"),
+            Desk.objects.create(number="201", floor=2),
+            Desk.objects.create(number="P101", building=Desk.PARK_PLACE)
+        ]
+        for desk in desks[:3]:
+            DeskReservation.objects.create(employee=employee, desk=desk)
+        ended = DeskReservation.objects.create(employee=employee, desk=desks[3])
+        ended.check_out = pacific(2025, 1, 6, 17)
+        ended.save()
+
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('screen_S_1', channel_name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Select and update, inside a savepoint
+            with self.assertNumQueries(4):
+                summary = end_all_desk_reservations()
+        self.assertEqual(summary, {('S', 1): 2, ('S', 2): 1})
+        self.assertFalse(DeskReservation.currently_reserved_objects.exists())
+        ended.refresh_from_db()
+        self.assertEqual(ended.check_out, pacific(2025, 1, 6, 17))
+
+        message = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(message['type'], 'desk_snapshot')
+        self.assertEqual(
+            [desk['state'] for desk in message['snapshot']],
+            ['available', 'available']
+        )
+
+    @override_settings(CHANNEL_LAYERS=None)
+    def test_nothing_published_without_channel_layers(self):
+        employee = Employee.objects.create(
+            user=User.objects.create(username="alice")
+        )
+        DeskReservation.objects.create(
+            employee=employee, desk=Desk.objects.create(number="101")
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            end_all_desk_reservations()
+        self.assertEqual(callbacks, [])
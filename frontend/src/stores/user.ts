@@ -33,9 +33,9 @@ export const useUserStore = defineStore('user', {
       is_division_director: false,
       is_executive_director: false,
       viewed_security_message: false,
-      prs_can_view: [] as Array<number>,
+      prs_can_view_count: 0,
       notes_can_view: [] as Array<number>,
-      telework_applications_can_view: [] as Array<number>,
+      telework_applications_can_view_count: 0,
       time_off_requests_can_view: [] as Array<number>,
       next_to_sign_prs: '',
       workflow_roles: [] as Array<number>,
@@ -98,10 +98,10 @@ export const useUserStore = defineStore('user', {
             this.profile.is_executive_director = resp.data.is_executive_director
             this.profile.viewed_security_message =
               resp.data.viewed_security_message
-            this.profile.prs_can_view = resp.data.prs_can_view
+            this.profile.prs_can_view_count = resp.data.prs_can_view_count
             this.profile.notes_can_view = resp.data.notes_can_view
-            this.profile.telework_applications_can_view =
-              resp.data.telework_applications_can_view
+            this.profile.telework_applications_can_view_count =
+              resp.data.telework_applications_can_view_count
             this.profile.time_off_requests_can_view =
               resp.data.time_off_requests_can_view
             this.profile.next_to_sign_prs = resp.data.next_to_sign_prs
@@ -145,11 +145,13 @@ export const useUserStore = defineStore('user', {
               'can_edit_seating_charts',
               resp.data.can_edit_seating_charts.toString()
             )
-            cookies.set('prs_can_view', resp.data.prs_can_view.toString())
+            cookies.set(
+              'prs_can_view_count', resp.data.prs_can_view_count.toString()
+            )
             cookies.set('notes_can_view', resp.data.notes_can_view.toString())
             cookies.set(
-              'telework_applications_can_view',
-              resp.data.telework_applications_can_view.toString()
+              'telework_applications_can_view_count',
+              resp.data.telework_applications_can_view_count.toString()
             )
             cookies.set(
               'time_off_requests_can_view',
@@ -220,9 +222,9 @@ export const useUserStore = defineStore('user', {
         cookies.remove('is_eligible_for_telework_application')
         cookies.remove('can_view_seating_charts')
         cookies.remove('can_edit_seating_charts')
-        cookies.remove('prs_can_view')
+        cookies.remove('prs_can_view_count')
         cookies.remove('notes_can_view')
-        cookies.remove('telework_applications_can_view')
+        cookies.remove('telework_applications_can_view_count')
         cookies.remove('time_off_requests_can_view')
         cookies.remove('workflow_roles')
         cookies.remove('workflow_display_options')
@@ -116,10 +116,10 @@ export interface EmployeeRetrieve {
   can_view_seating_charts: boolean
   can_edit_seating_charts: boolean
   can_view_desk_reservation_reports: boolean
-  prs_can_view: Array<number>
+  prs_can_view_count: number
   notes_can_view: Array<number>
   time_off_requests_can_view: Array<number>
-  telework_applications_can_view: Array<number>
+  telework_applications_can_view_count: number
   next_to_sign_prs: string
   email_opt_out_all: boolean
   email_opt_out_timeoff_all: boolean
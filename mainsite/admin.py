@@ -11,7 +11,8 @@ from django.utils.translation import gettext_lazy as _
 from mainsite.models import ImageUpload, SecurityMessage, TrustedIPAddress
 
 from .models import (
-    City, ImageUpload, Organization, SecurityMessage, State, ZipCode
+    City, GeocodedAddress, ImageUpload, Organization, OutgoingEmail,
+    SecurityMessage, State, ZipCode
 )
 
 
@@ -36,11 +37,28 @@ class OrganizationAdmin(admin.ModelAdmin):
     employees_link.short_description = "Employees"
 
 
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    list_display = ("query", "latitude", "longitude", "geocoded_at")
+    search_fields = ("query",)
+
+
 @admin.register(ImageUpload)
 class ImageUploadAdmin(admin.ModelAdmin):
     list_display = ("pk", "description")
 
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk", "subject", "to_addresses", "status", "attempts", "created_at",
+        "sent_at"
+    )
+    list_filter = ("status",)
+    search_fields = ("subject", "dedupe_key")
+    readonly_fields = ("created_at", "sent_at")
+
+
 @admin.register(SecurityMessage)
 class SecurityMessageAdmin(admin.ModelAdmin):
     list_display = (
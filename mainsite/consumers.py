@@ -1,54 +1,101 @@
 # Consumers for Django Channels Websocket connections - Desk Reservations
 
-import pdb
-from turtle import pd
-from asgiref.sync import async_to_sync
-from distutils.log import debug
+import asyncio
 import json
 
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
 
+from deskreservation.helpers import floor_snapshot
 
-class DeskReservationConsumer(WebsocketConsumer):
-    def connect(self):
+
+class DeskReservationConsumer(AsyncWebsocketConsumer):
+    # Seconds to hold desk events so a burst of check-ins goes out as one
+    # message, with only the latest state of each desk.
+    coalesce_delay = 0.05
+
+    async def connect(self):
         self.building = self.scope['url_route']['kwargs']['building']
         self.floor = self.scope['url_route']['kwargs']['floor']
         self.screen_group_name = 'screen_%s_%s' % (self.building, self.floor)
+        self.pending_events = {}
+        self.flush_task = None
 
         # Join floor screen group
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.screen_group_name,
             self.channel_name
         )
 
-        self.accept()
+        await self.accept()
+
+        # Send the current state of the floor so screens need not fetch it
+        snapshot = await database_sync_to_async(floor_snapshot)(
+            self.building, self.floor
+        )
+        await self.send(text_data=json.dumps({
+            'snapshot': snapshot
+        }))
+
+    async def disconnect(self, close_code):
+        if self.flush_task:
+            self.flush_task.cancel()
 
-    def disconnect(self, close_code):
         # Leave floor screen group
-        async_to_sync(self.channel_layer.group_discard)(
+        await self.channel_layer.group_discard(
             self.screen_group_name,
             self.channel_name
         )
 
     # Receive message from WebSocket
-    def receive(self, text_data):
+    async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
 
         # Send message to floor screen group
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             self.screen_group_name,
             {
                 'type': 'screen_group_message',
                 'message': message
             }
         )
-    
+
     # Receive message from floor screen group
-    def screen_group_message(self, event):
+    async def screen_group_message(self, event):
         message = event['message']
 
         # Send message to WebSocket
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             'message': message
-        }))
\ No newline at end of file
+        }))
+
+    # Receive desk state changes published for this floor
+    async def desk_events(self, event):
+        for desk_event in event['events']:
+            self.pending_events[desk_event['desk']] = desk_event
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_desk_events())
+
+    async def wait_to_flush(self):
+        await asyncio.sleep(self.coalesce_delay)
+
+    async def flush_desk_events(self):
+        await self.wait_to_flush()
+        events = list(self.pending_events.values())
+        self.pending_events = {}
+        self.flush_task = None
+        await self.send(text_data=json.dumps({
+            'events': events
+        }))
+
+    # Receive a fresh snapshot of the floor, which supersedes any desk events
+    # still waiting to be sent
+    async def desk_snapshot(self, event):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.pending_events = {}
+        await self.send(text_data=json.dumps({
+            'snapshot': event['snapshot']
+        }))
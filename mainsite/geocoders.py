@@ -0,0 +1,75 @@
+import threading
+import time
+
+import requests
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Geocoder:
+    """
+    Looks up the latitude and longitude of an address.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def geocode(self, query):
+        """
+        Return the latitude and longitude for the query, or (None, None) if
+        the address could not be found.
+        """
+        raise NotImplementedError
+
+
+class NominatimGeocoder(Geocoder):
+    URL = 'https://nominatim.openstreetmap.org/search'
+    USER_AGENT = 'LCOG Team App'
+    # Nominatim's usage policy allows at most one request a second
+    MIN_INTERVAL = 1
+
+    lock = threading.Lock()
+    next_request_at = 0
+
+    def wait_for_turn(self):
+        # Requests start at least MIN_INTERVAL apart, but can overlap, so that
+        # several threads can geocode while keeping to the limit
+        with NominatimGeocoder.lock:
+            start_at = max(time.monotonic(), NominatimGeocoder.next_request_at)
+            NominatimGeocoder.next_request_at = start_at + self.MIN_INTERVAL
+        wait = start_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def geocode(self, query):
+        self.wait_for_turn()
+        response = requests.get(
+            self.URL,
+            params={'q': query, 'format': 'json', 'limit': 1},
+            headers={'User-Agent': self.USER_AGENT},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        results = response.json()
+        if results:
+            return results[0]['lat'], results[0]['lon']
+        return None, None
+
+
+class LocalGeocoder(Geocoder):
+    """
+    Answers from the GEOCODER_LOCAL_RESULTS setting without using the
+    network, for tests and offline development. Queries are recorded in
+    `queries`.
+    """
+    queries = []
+
+    def geocode(self, query):
+        LocalGeocoder.queries.append(query)
+        return settings.GEOCODER_LOCAL_RESULTS.get(query, (None, None))
+
+
+def get_geocoder():
+    return import_string(settings.GEOCODER_BACKEND)(
+        timeout=settings.GEOCODER_TIMEOUT
+    )
@@ -1,14 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import datetime
+from decimal import Decimal
+import json
 import logging
 import os
 import pytz
+import time
 from rest_framework.test import APIRequestFactory
-import requests
-import urllib.parse
 
 from django.apps import apps
+from django.conf import settings
 from django.contrib.sites.models import Site
-from django.core.mail import EmailMultiAlternatives, send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.db import connection
 from django.urls import reverse
 
 error_logger = logging.getLogger('watchtower-error-logger')
@@ -28,6 +33,10 @@ HR_SIGNATURE_REMINDER_SUBSEQUENT = 1
 
 ED_SIGNATURE_REMINDER_SUBSEQUENT = 1
 
+QUEUED_EMAIL_BATCH_SIZE = 100
+
+GEOCODE_WORKERS = 4
+
 
 def readable_date(date):
     local_date = date.astimezone(pytz.timezone('America/Los_Angeles'))
@@ -44,96 +53,235 @@ def get_host_url(request):
 def record_error(
     message, error, request=None, traceback=None, other_info=None
 ):
-    message = 'Environment: ' + os.environ.get('ENVIRONMENT') + '\n' + message
-    message += '\n'
-    message += 'User: ' + str(request.user) if request else 'None'
-    message += '\n'
-    message += 'Error: ' + str(error)
-    message += '\n'
-    message += str(request.__dict__) if request else 'None'
-    message += '\n'
-    message += str(traceback)
-    message += '\n'
-    message += 'Other Info: ' + str(other_info) if other_info else 'None'
-    error_logger.error(message)
+    """
+    Log an error as a compact JSON record: what happened, the error, who made
+    the request and to where, the traceback and any other info.
+    """
+    record = {
+        'environment': os.environ.get('ENVIRONMENT'),
+        'message': message,
+    }
+    if error is not None:
+        record['error'] = str(error)
+        record['error_type'] = type(error).__name__
+    if request:
+        record['request'] = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': str(getattr(request, 'user', None)),
+            'ip': request.META.get('HTTP_X_FORWARDED_FOR') or \
+                request.META.get('REMOTE_ADDR'),
+        }
+    if traceback:
+        record['traceback'] = traceback
+    if other_info:
+        record['other_info'] = other_info
+    error_logger.error(json.dumps(record, default=str))
 
 def record_email_sent(subject='', body='', to_addresses=[], cc_addresses=[]):
-    message = 'Environment: ' + os.environ.get('ENVIRONMENT') + '\n'
+    message = 'Environment: ' + os.environ.get('ENVIRONMENT', '') + '\n'
     message += 'To: ' + ', '.join(to_addresses) + '\n'
     message += 'CC: ' + ', '.join(cc_addresses) + '\n'
     message += 'Subject: ' + subject + '\n'
     message += 'Body: ' + body
     email_logger.info(message)
 
-def send_email(to_address, subject, body, html_body, headers=None):
+def build_email(
+    to_addresses=[], cc_addresses=[], subject='', text_body='', html_body='',
+    headers=None
+):
     """
-    Send an email with optional custom headers.
-    
-    Args:
-        to_address: Recipient email address
-        subject: Email subject
-        body: Plain text body
-        html_body: HTML body
-        headers: Optional dictionary of custom headers (e.g., {'X-Custom-Header': 'value'})
+    Build an email with plain text and HTML bodies, marked as a test outside
+    of production, without sending it.
     """
     env = os.getenv('ENVIRONMENT')
     if env == 'DEV':
         subject = f'TEST FROM DEV: {subject}'
-        body = f'THIS IS A TEST EMAIL\n{body}'
+        text_body = f'THIS IS A TEST EMAIL\n{text_body}'
         html_body = \
             f'<div style="color: red;">THIS IS A TEST EMAIL</div>{html_body}'
     elif env == 'STAGING':
         subject = f'TEST FROM STAGING: {subject}'
-        body = f'THIS IS A TEST EMAIL\n{body}'
+        text_body = f'THIS IS A TEST EMAIL\n{text_body}'
         html_body = \
             f'<div style="color: red;">THIS IS A TEST EMAIL</div>{html_body}'
-    
     email = EmailMultiAlternatives(
-        subject=subject,
-        body=body,
-        from_email=os.environ.get('FROM_EMAIL'),
-        to=[to_address]
+        subject=subject, body=text_body,
+        from_email=os.environ.get('FROM_EMAIL'), to=to_addresses,
+        cc=cc_addresses
     )
     email.attach_alternative(html_body, "text/html")
-    
     # Add custom headers if provided
     if headers:
         for header_name, header_value in headers.items():
             email.extra_headers[header_name] = header_value
+    return email
+
+def queue_email(email, dedupe_key=None):
+    """
+    Queue an email built with build_email for the send_queued_emails worker.
+    """
+    OutgoingEmail = apps.get_model('mainsite.OutgoingEmail')
+    html_body = email.alternatives[0][0] if email.alternatives else ''
+    return OutgoingEmail.objects.enqueue(
+        email.to, email.cc, email.subject, email.body, html_body,
+        email.extra_headers, dedupe_key
+    )
+
+def send_email(
+    to_address, subject, body, html_body, headers=None, dedupe_key=None
+):
+    """
+    Queue an email with optional custom headers. It is sent by the
+    send_queued_emails worker rather than during the request.
     
+    Args:
+        to_address: Recipient email address
+        subject: Email subject
+        body: Plain text body
+        html_body: HTML body
+        headers: Optional dictionary of custom headers (e.g., {'X-Custom-Header': 'value'})
+        dedupe_key: Optional key so that the same email is only queued once
+    """
+    email = build_email([to_address], [], subject, body, html_body, headers)
     try:
-        sent_email = email.send()
-        record_email_sent(subject, body, [to_address])
-        return sent_email
+        queue_email(email, dedupe_key)
+        return 1
     except Exception as e:
-        record_error('Error sending email', e)
+        record_error('Error queueing email', e)
 
 def send_email_multiple(
-    to_addresses=[], cc_addresses=[], subject='', text_body='', html_body=''
+    to_addresses=[], cc_addresses=[], subject='', text_body='', html_body='',
+    dedupe_key=None
 ):
-    env = os.getenv('ENVIRONMENT')
-    if env == 'DEV':
-        subject = f'TEST FROM DEV: {subject}'
-        text_body = f'THIS IS A TEST EMAIL\n{text_body}'
-        html_body = \
-            f'<div style="color: red;">THIS IS A TEST EMAIL</div>{html_body}'
-    elif env == 'STAGING':
-        subject = f'TEST FROM STAGING: {subject}'
-        text_body = f'THIS IS A TEST EMAIL\n{text_body}'
-        html_body = \
-            f'<div style="color: red;">THIS IS A TEST EMAIL</div>{html_body}'
-    email = EmailMultiAlternatives(
-        subject=subject, body=text_body,
-        from_email=os.environ.get('FROM_EMAIL'), to=to_addresses,
-        cc=cc_addresses
+    email = build_email(
+        to_addresses, cc_addresses, subject, text_body, html_body
     )
-    email.attach_alternative(html_body, "text/html")
     try:
-        sent_email = email.send()
-        record_email_sent(subject, text_body, to_addresses, cc_addresses)
-        return sent_email
+        queue_email(email, dedupe_key)
+        return 1
     except Exception as e:
-        record_error('Error sending email', e)
+        record_error('Error queueing email', e)
+
+def queue_emails(emails, dedupe_keys=None):
+    """
+    Queue emails built with build_email for the send_queued_emails worker,
+    in a single query. Emails with a dedupe key that was already queued are
+    left out.
+    """
+    OutgoingEmail = apps.get_model('mainsite.OutgoingEmail')
+    dedupe_keys = dedupe_keys or [None] * len(emails)
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(
+            to_addresses=email.to, cc_addresses=email.cc,
+            subject=email.subject, text_body=email.body,
+            html_body=email.alternatives[0][0] if email.alternatives else '',
+            headers=email.extra_headers, dedupe_key=dedupe_key
+        ) for email, dedupe_key in zip(emails, dedupe_keys)
+    ], ignore_conflicts=True)
+
+def send_emails(
+    emails, chunk_size=None, max_send_rate=None, connection=None
+):
+    """
+    Send emails built with build_email over a single connection to the mail
+    server, rather than one connection each. They go a chunk at a time,
+    pausing after each chunk to stay under the maximum send rate, which
+    default to the EMAIL_SEND_CHUNK_SIZE and EMAIL_MAX_SEND_RATE settings.
+
+    Returns an (email, error) pair for each email, where the error is None if
+    the email was sent.
+    """
+    chunk_size = chunk_size or settings.EMAIL_SEND_CHUNK_SIZE
+    max_send_rate = max_send_rate or settings.EMAIL_MAX_SEND_RATE
+    if not emails:
+        return []
+    own_connection = connection is None
+    if own_connection:
+        connection = get_connection()
+    try:
+        # Does nothing if a connection passed in is already open
+        connection.open()
+    except Exception as e:
+        record_error('Error sending emails', e)
+        return [(email, e) for email in emails]
+    outcomes = []
+    try:
+        for start in range(0, len(emails), chunk_size):
+            chunk = emails[start:start + chunk_size]
+            chunk_started_at = time.monotonic()
+            for email in chunk:
+                try:
+                    connection.send_messages([email])
+                except Exception as e:
+                    record_error('Error sending email', e,
+                        other_info=f'To: {", ".join(email.to)}')
+                    outcomes.append((email, e))
+                    continue
+                outcomes.append((email, None))
+                # The email is sent even if logging it fails
+                try:
+                    record_email_sent(
+                        email.subject, email.body, email.to, email.cc
+                    )
+                except Exception as e:
+                    record_error('Error logging sent email', e)
+            if start + chunk_size < len(emails):
+                wait = len(chunk) / max_send_rate - \
+                    (time.monotonic() - chunk_started_at)
+                if wait > 0:
+                    time.sleep(wait)
+    finally:
+        if own_connection:
+            connection.close()
+    return outcomes
+
+def num_sent(outcomes):
+    """
+    The number of emails that send_emails sent.
+    """
+    return len([email for email, error in outcomes if error is None])
+
+def send_queued_emails(batch_size=QUEUED_EMAIL_BATCH_SIZE):
+    """
+    Send the queued emails that are due, a batch at a time, over a single
+    connection to the mail server with send_emails. Failed emails, including
+    ones that couldn't be sent because the connection failed to open, are
+    retried later, waiting longer after each attempt. Returns the numbers sent
+    and failed.
+    """
+    OutgoingEmail = apps.get_model('mainsite.OutgoingEmail')
+    sent_emails = failed_emails = 0
+    # Opened by send_emails, so not at all when nothing is due
+    connection = get_connection()
+    try:
+        while True:
+            # Claimed and recorded in short transactions of their own, so no
+            # rows stay locked while the mail server is slow
+            batch = OutgoingEmail.objects.claim(batch_size)
+            if not batch:
+                break
+            outcomes = send_emails(
+                [queued.message() for queued in batch], connection=connection
+            )
+            for queued, (email, error) in zip(batch, outcomes):
+                if error is None:
+                    queued.mark_sent()
+                    sent_emails += 1
+                else:
+                    queued.mark_failed(error)
+                    failed_emails += 1
+            OutgoingEmail.objects.bulk_update(batch, [
+                'status', 'attempts', 'next_attempt_at', 'last_error',
+                'sent_at'
+            ])
+            if num_sent(outcomes) == 0:
+                # The mail server is likely unavailable, so leave the rest
+                # for the next run
+                break
+    finally:
+        connection.close()
+    return sent_emails, failed_emails
 
 def send_evaluation_written_email_to_employee(employee, review):
     # Notification #5
@@ -144,7 +292,8 @@ def send_evaluation_written_email_to_employee(employee, review):
         employee.user.email,
         f'Signature required: {review.employee.manager.name} has completed your performance evaluation',
         f'Your manager {review.employee.manager.name} has completed your evaluation for an upcoming performance review, which requires your signature. View and sign here: {url}',
-        f'Your manager {review.employee.manager.name} has completed your evaluation for an upcoming performance review, which requires your signature. View and sign here: <a href="{url}">{url}</a>'
+        f'Your manager {review.employee.manager.name} has completed your evaluation for an upcoming performance review, which requires your signature. View and sign here: <a href="{url}">{url}</a>',
+        dedupe_key=f'pr-signature-{review.pk}-{employee.pk}-{datetime.date.today()}'
     )
     next_reminder = datetime.datetime.today() + datetime.timedelta(days=EMPLOYEE_SIGNATURE_REMINDER)
     SignatureReminder.objects.create(review=review, employee=employee, next_date=next_reminder)
@@ -159,7 +308,8 @@ def send_signature_email_to_manager(employee, review):
         employee.user.email,
         f'Signature required: Performance evaluation for {review.employee.name}',
         f'{review.employee.manager.name} has completed an evaluation for {review.employee.name}, which requires your signature. View and sign here: {url}',
-        f'{review.employee.manager.name} has completed an evaluation for {review.employee.name}, which requires your signature. View and sign here: <a href="{url}">{url}</a>'
+        f'{review.employee.manager.name} has completed an evaluation for {review.employee.name}, which requires your signature. View and sign here: <a href="{url}">{url}</a>',
+        dedupe_key=f'pr-signature-{review.pk}-{employee.pk}-{datetime.date.today()}'
     )
     next_reminder = datetime.datetime.today() + datetime.timedelta(days=MANAGER_SIGNATURE_REMINDER)
     SignatureReminder.objects.create(review=review, employee=employee, next_date=next_reminder)
@@ -193,7 +343,8 @@ def send_pay_change_notification(review):
         to_addresses=pr_completed_employees.values_list('user__email', flat=True),
         subject='PR ready for pay change',
         text_body=f'A performance evaluation for {review.employee.name} has been signed by a Deputy Director. View it here: {url}',
-        html_body=f'A performance evaluation for {review.employee.name} has been signed by a Deputy Director. View it here: <a href="{url}">{url}</a>'
+        html_body=f'A performance evaluation for {review.employee.name} has been signed by a Deputy Director. View it here: <a href="{url}">{url}</a>',
+        dedupe_key=f'pr-pay-change-{review.pk}'
     )
 
 
@@ -209,7 +360,8 @@ def send_print_notification(review):
         to_addresses=pr_completed_employees.values_list('user__email', flat=True),
         subject='PR ready for printing',
         text_body=f'A performance evaluation for {review.employee.name} has been signed by the Executive Director. Please print it here: {url}',
-        html_body=f'A performance evaluation for {review.employee.name} has been signed by the Executive Director. Please print it here: <a href="{url}">{url}</a>'
+        html_body=f'A performance evaluation for {review.employee.name} has been signed by the Executive Director. Please print it here: <a href="{url}">{url}</a>',
+        dedupe_key=f'pr-print-{review.pk}'
     )
 
 
@@ -419,6 +571,7 @@ def send_pr_reminder_emails():
     ####################################################
     ### Gather all the reminders and send the emails ###
     ####################################################
+    emails = []
     for user in users.items():
         print('\n')
         print('USER:', user[0])
@@ -450,7 +603,10 @@ def send_pr_reminder_emails():
             # Single Notification Email
             notifications = review_to_write_notifications + review_to_write_other_notifications + signature_required_notifications + signature_required_other_notifications
             notification = notifications[0]
-            send_email(user[0], notification[0], notification[1], notification[2])
+            emails.append(build_email(
+                [user[0]], [], notification[0], notification[1],
+                notification[2]
+            ))
         elif total_num_notifications > 1:
             # Batch Notification Email
             subject = 'LCOG Performance Review To-Dos'
@@ -470,7 +626,10 @@ def send_pr_reminder_emails():
             html_body += '<style>table { border-collapse: collapse; } th, td { border: 1px black solid; padding: 5px; }'
             print('HTML_BODY')
             print(html_body)
-            send_email(user[0], subject, text_body, html_body)
+            emails.append(build_email(
+                [user[0]], [], subject, text_body, html_body
+            ))
+    send_emails(emails)
     
     return users
 
@@ -485,6 +644,22 @@ def prop_in_obj(obj, prop, is_not):
     return prop in obj and obj[prop] != is_not
 
 
+@contextmanager
+def count_queries():
+    """
+    Count the queries run on the default database inside the block, in the
+    list of statements yielded, to report how much work a command did.
+    """
+    queries = []
+
+    def record_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record_query):
+        yield queries
+
+
 # d = datetime.date(2022, 8, 4)
 # next_monday = next_weekday(d, 0) # 0=Monday, 1=Tuesday, 2=Wednesday...
 def next_weekday(d, weekday):
@@ -494,18 +669,87 @@ def next_weekday(d, weekday):
     return d + datetime.timedelta(days_ahead)
 
 
-def get_lat_long(address, city, state, zip):
+def geocode_query(address, city, state, zip):
+    """
+    The address as looked up and cached: without any unit number or 1/2
+    designation, in lower case and with single spaces.
+    """
     if '#' in address:
         address = address[:address.index('#')] # Remove unit number
     if ' 1/2' in address:
         address = address.replace(' 1/2', '') # Remove the 1/2 designation
-    url = 'https://nominatim.openstreetmap.org/search/' + \
-        urllib.parse.quote(f'${address}, ${city}, ${state}, ${zip}') + \
-        '?format=json'
-    response = requests.get(url).json()
-    if response:
-        return response[0]["lat"], response[0]["lon"]
-    return None, None
+    query = ', '.join(
+        ' '.join(str(part).split()) for part in [address, city, state, zip]
+    )
+    return query.lower()
+
+def get_lat_long(address, city, state, zip):
+    """
+    The latitude and longitude of an address, or (None, None) if it can't be
+    found. Each address is only geocoded once, after which it comes from the
+    GeocodedAddress table.
+    """
+    from mainsite.geocoders import get_geocoder
+    GeocodedAddress = apps.get_model('mainsite.GeocodedAddress')
+    query = geocode_query(address, city, state, zip)
+    geocoded = GeocodedAddress.objects.filter(query=query).first()
+    if not geocoded:
+        try:
+            latitude, longitude = get_geocoder().geocode(query)
+        except Exception as e:
+            # Not cached, so that it is tried again next time
+            record_error('Error geocoding address', e, other_info=query)
+            return None, None
+        geocoded, created = GeocodedAddress.objects.update_or_create(
+            query=query, defaults={
+                'latitude': latitude, 'longitude': longitude
+            }
+        )
+        geocoded.refresh_from_db()
+    return geocoded.latitude, geocoded.longitude
+
+
+def geocode_addresses(queries, workers=GEOCODE_WORKERS):
+    """
+    The latitude and longitude of each of several addresses normalized with
+    geocode_query, by address. Addresses that aren't cached yet are geocoded
+    on a pool of threads, within the geocoder's own rate limit, and cached
+    together. Addresses that fail to geocode are left out.
+    """
+    from mainsite.geocoders import get_geocoder
+    GeocodedAddress = apps.get_model('mainsite.GeocodedAddress')
+    queries = set(queries)
+    results = {
+        geocoded.query: (geocoded.latitude, geocoded.longitude)
+        for geocoded in GeocodedAddress.objects.filter(query__in=queries)
+    }
+    missing = sorted(queries - set(results))
+    if not missing:
+        return results
+    geocoder = get_geocoder()
+
+    def geocode(query):
+        try:
+            return query, geocoder.geocode(query), None
+        except Exception as e:
+            return query, None, e
+
+    to_cache = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for query, coordinates, error in executor.map(geocode, missing):
+            if error:
+                record_error('Error geocoding address', error, other_info=query)
+                continue
+            latitude, longitude = [
+                Decimal(str(value)) if value is not None else None
+                for value in coordinates
+            ]
+            results[query] = (latitude, longitude)
+            to_cache.append(GeocodedAddress(
+                query=query, latitude=latitude, longitude=longitude
+            ))
+    GeocodedAddress.objects.bulk_create(to_cache, ignore_conflicts=True)
+    return results
 
 
 def get_is_trusted_ip():
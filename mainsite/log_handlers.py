@@ -0,0 +1,116 @@
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+
+
+class LazyCloudWatchLogHandler(logging.Handler):
+    """
+    Sends records to a CloudWatch log stream, only creating the boto3 client
+    and the watchtower handler when the first record is emitted.
+    """
+    def __init__(
+        self, log_group_name, log_stream_name, region_name=None, **options
+    ):
+        super().__init__()
+        self.log_group_name = log_group_name
+        self.log_stream_name = log_stream_name
+        self.region_name = region_name
+        self.options = options
+        self.cloudwatch_handler = None
+
+    def get_cloudwatch_handler(self):
+        if self.cloudwatch_handler is None:
+            import boto3
+            import watchtower
+            self.cloudwatch_handler = watchtower.CloudWatchLogHandler(
+                log_group_name=self.log_group_name,
+                log_stream_name=self.log_stream_name,
+                boto3_client=boto3.client(
+                    'logs', region_name=self.region_name
+                ),
+                **self.options
+            )
+        return self.cloudwatch_handler
+
+    def emit(self, record):
+        try:
+            self.get_cloudwatch_handler().emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.cloudwatch_handler is not None:
+            self.cloudwatch_handler.close()
+        super().close()
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room when the queue is full, so that stopping still sends
+        # everything queued before it
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class CloudWatchQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue for a background thread to send to
+    CloudWatch, so that logging never waits on AWS. Records that arrive while
+    the queue is full are dropped and counted, and the count is logged once
+    there is room again.
+    """
+    def __init__(
+        self, log_group_name, log_stream_name, region_name=None,
+        max_queue_size=10000, **options
+    ):
+        super().__init__(queue.Queue(max_queue_size))
+        self.cloudwatch_handler = LazyCloudWatchLogHandler(
+            log_group_name, log_stream_name, region_name, **options
+        )
+        self.listener = None
+        self.listener_lock = threading.Lock()
+        self.dropped = 0
+        self.reported_dropped = 0
+
+    def start_listener(self):
+        # Started on first use rather than when settings are loaded, so that
+        # commands which never log don't start a thread
+        with self.listener_lock:
+            if self.listener is None:
+                self.listener = DrainingQueueListener(
+                    self.queue, self.cloudwatch_handler
+                )
+                self.listener.start()
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self.reported_dropped:
+            dropped = self.dropped - self.reported_dropped
+            self.reported_dropped = self.dropped
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': record.name, 'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': f'Dropped {dropped} log records while the ' + \
+                        'CloudWatch queue was full',
+                }))
+            except queue.Full:
+                pass
+
+    def close(self):
+        with self.listener_lock:
+            if self.listener is not None:
+                try:
+                    # Send what is queued before exiting
+                    self.listener.stop()
+                except queue.Full:
+                    pass
+                self.listener = None
+        self.cloudwatch_handler.close()
+        super().close()
@@ -0,0 +1,35 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from mainsite.helpers import QUEUED_EMAIL_BATCH_SIZE, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails that are due, retrying failed ones later'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=QUEUED_EMAIL_BATCH_SIZE,
+            help='Number of queued emails to lock and send at a time'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep checking the queue instead of exiting once it is empty'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='Seconds to wait between checks of an empty queue with --loop'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'])
+            if sent or failed or not options['loop']:
+                message = f'{ datetime.now() } - Sent {sent} queued ' + \
+                    f'emails, {failed} failed.'
+                self.stdout.write(self.style.SUCCESS(message))
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+import os
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
@@ -166,6 +170,134 @@ class TrustedIPAddress(models.Model):
         return addresses
 
 
+class OutgoingEmailManager(models.Manager):
+    def enqueue(
+        self, to_addresses=[], cc_addresses=[], subject='', text_body='',
+        html_body='', headers=None, dedupe_key=None
+    ):
+        """
+        Queue an email to be sent by the send_queued_emails worker. An email
+        with a dedupe key is only queued once; queueing it again returns the
+        email already queued.
+        """
+        fields = {
+            'to_addresses': list(to_addresses),
+            'cc_addresses': list(cc_addresses),
+            'subject': subject,
+            'text_body': text_body,
+            'html_body': html_body,
+            'headers': headers or {},
+        }
+        if dedupe_key:
+            email, created = self.get_or_create(
+                dedupe_key=dedupe_key, defaults=fields
+            )
+            return email
+        return self.create(**fields)
+
+    def due(self):
+        return self.filter(
+            status=OutgoingEmail.STATUS_QUEUED,
+            next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at', 'pk')
+
+    def claim(self, batch_size):
+        """
+        Return a batch of the emails that are due, with their next attempt
+        pushed back so that other workers leave them alone while they are
+        sent. Emails whose outcome is never recorded are due again once the
+        claim runs out.
+        """
+        with transaction.atomic():
+            # Locked rows are being claimed by another worker
+            batch = list(
+                self.due().select_for_update(skip_locked=True)[:batch_size]
+            )
+            self.filter(pk__in=[queued.pk for queued in batch]).update(
+                next_attempt_at=timezone.now() + OutgoingEmail.CLAIM_TIMEOUT
+            )
+        return batch
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting to be sent, or the record of one that was, so that
+    requests don't wait on the mail server.
+    """
+    class Meta:
+        verbose_name = _("Outgoing Email")
+        verbose_name_plural = _("Outgoing Emails")
+        ordering = ["-pk"]
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='outgoing_email_due_idx'
+            )
+        ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, _('Queued')),
+        (STATUS_SENT, _('Sent')),
+        (STATUS_FAILED, _('Failed')),
+    ]
+
+    # Give up after this many attempts, waiting twice as long after each one
+    MAX_ATTEMPTS = 6
+    RETRY_DELAY = timedelta(minutes=1)
+    # How long a worker has to send the emails it claimed
+    CLAIM_TIMEOUT = timedelta(minutes=10)
+
+    to_addresses = models.JSONField(default=list)
+    cc_addresses = models.JSONField(default=list, blank=True)
+    subject = models.CharField(_("subject"), max_length=998)
+    text_body = models.TextField(_("text body"), blank=True)
+    html_body = models.TextField(_("HTML body"), blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(
+        _("dedupe key"), max_length=255, unique=True, blank=True, null=True
+    )
+    status = models.CharField(
+        max_length=6, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    objects = OutgoingEmailManager()
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.to_addresses)}'
+
+    def message(self):
+        email = EmailMultiAlternatives(
+            subject=self.subject, body=self.text_body,
+            from_email=os.environ.get('FROM_EMAIL'), to=self.to_addresses,
+            cc=self.cc_addresses, headers=self.headers
+        )
+        email.attach_alternative(self.html_body, "text/html")
+        return email
+
+    def mark_sent(self):
+        self.status = self.STATUS_SENT
+        self.attempts += 1
+        self.sent_at = timezone.now()
+        self.last_error = ''
+
+    def mark_failed(self, error):
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+        else:
+            self.next_attempt_at = timezone.now() + \
+                self.RETRY_DELAY * 2 ** (self.attempts - 1)
+
+
 class State(models.Model):
     class Meta:
         verbose_name = _("State")
@@ -200,6 +332,29 @@ class City(models.Model):
     state = models.ForeignKey(State, on_delete=models.CASCADE)
 
 
+class GeocodedAddress(models.Model):
+    """
+    The result of geocoding a normalized address, so that it is only ever
+    looked up once. Addresses the geocoder could not find are kept too, with
+    no latitude or longitude.
+    """
+    class Meta:
+        verbose_name = _("Geocoded Address")
+        verbose_name_plural = _("Geocoded Addresses")
+
+    def __str__(self):
+        return self.query
+
+    query = models.CharField(_("query"), max_length=255, unique=True)
+    latitude = models.DecimalField(
+        max_digits=10, decimal_places=7, blank=True, null=True
+    )
+    longitude = models.DecimalField(
+        max_digits=10, decimal_places=7, blank=True, null=True
+    )
+    geocoded_at = models.DateTimeField(auto_now=True)
+
+
 LANGUAGE_CHOICES = (
     ("asl", _("American Sign Language")),
     ("ar", _("Arabic")),
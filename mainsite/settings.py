@@ -15,7 +15,6 @@ import os
 from distutils.util import strtobool
 
 import logging
-import boto3
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -266,6 +265,11 @@ AWS_S3_OBJECT_PARAMETERS = {
 
 X_FRAME_OPTIONS = "SAMEORIGIN"
 
+# Each worker process may have its own cache, so values cached there and
+# cleared when they change are kept no longer than this many seconds, bounding
+# how long another process can serve them out of date
+LOCAL_CACHE_TIMEOUT = 5 * 60
+
 #########
 # Email #
 #########
@@ -284,18 +288,37 @@ EMAIL_HOST_USER = os.environ.get('SES_EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('SES_EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = 'noreply@lcog-or.gov'
 
+# Sending many emails over one connection goes a chunk at a time, pausing
+# between chunks to stay under the SES account's maximum send rate (messages
+# per second)
+EMAIL_SEND_CHUNK_SIZE = int(os.environ.get('EMAIL_SEND_CHUNK_SIZE', 50))
+EMAIL_MAX_SEND_RATE = float(os.environ.get('EMAIL_MAX_SEND_RATE', 14))
+
 # Required for django-ses
 # AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 # AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 # AWS_SES_REGION_NAME = 'us-west-2'
 # AWS_SES_REGION_ENDPOINT = 'email.us-west-2.amazonaws.com'
 
+#############
+# Geocoding #
+#############
+
+# Looks up the latitude and longitude of meal stop addresses. Results are kept
+# in GeocodedAddress, so each address is only looked up once.
+GEOCODER_BACKEND = os.environ.get(
+    'GEOCODER_BACKEND', 'mainsite.geocoders.NominatimGeocoder'
+)
+GEOCODER_TIMEOUT = 10
+# Coordinates the local geocoder answers with, by normalized address
+GEOCODER_LOCAL_RESULTS = {}
+
 ###########
 # LOGGING #
 ###########
 
-boto3_logs_client = boto3.client("logs", region_name=AWS_REGION_NAME)
-
+# CloudWatch handlers queue records for a background thread, and only create
+# their boto3 client when the first record is sent
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -313,17 +336,19 @@ LOGGING = {
             'class': 'logging.StreamHandler',
         },
         'watchtower-error-handler': {
-            'class': 'watchtower.CloudWatchLogHandler',
-            'boto3_client': boto3_logs_client,
+            '()': 'mainsite.log_handlers.CloudWatchQueueHandler',
             'log_group_name': 'TeamAppLogGroup',
             'log_stream_name': 'TeamAppErrorLogStream',
+            'region_name': AWS_REGION_NAME,
+            'max_queue_size': 10000,
             'level': 'DEBUG'
         },
         'watchtower-email-handler': {
-            'class': 'watchtower.CloudWatchLogHandler',
-            'boto3_client': boto3_logs_client,
+            '()': 'mainsite.log_handlers.CloudWatchQueueHandler',
             'log_group_name': 'TeamAppLogGroup',
             'log_stream_name': 'TeamAppEmailLogStream',
+            'region_name': AWS_REGION_NAME,
+            'max_queue_size': 10000,
             'level': 'DEBUG'
         }
         # Log to a file
@@ -1,22 +1,182 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
 from django.urls import re_path
+from django.utils.timezone import get_current_timezone
 
+from channels.layers import get_channel_layer
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
+from rest_framework.test import APIClient
+
+from deskreservation.models import Desk, DeskHold
 from mainsite.consumers import DeskReservationConsumer
+from people.models import Employee
 
 
-class DeskReservationWebSocketConsumerTestCase(TestCase):
+@override_settings(CHANNEL_LAYERS={
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+})
+class DeskReservationWebSocketConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.application = URLRouter([re_path(r"ws/desk-reservation/(?P<building>\w+)/(?P<floor>\w+)/$", DeskReservationConsumer.as_asgi())])
+        self.employee = Employee.objects.create(
+            user=User.objects.create(
+                username="alice", first_name="Alice", last_name="Smith"
+            )
+        )
+        self.desk = Desk.objects.create(number="101")
+        Desk.objects.create(number="201", floor=2)
+
     async def test_reservation_consumer(self):
-        application = URLRouter([re_path(r"ws/desk-reservation/(?P<building>\w+)/(?P<floor>\w+)/$", DeskReservationConsumer.as_asgi())])
-        communicator = WebsocketCommunicator(application, "/ws/desk-reservation/S/1/")
+        communicator = WebsocketCommunicator(self.application, "/ws/desk-reservation/S/1/")
         connected, subprotocol = await communicator.connect()
         assert connected
 
+        # The floor's current state is sent on connect
+        response = await communicator.receive_json_from()
+        assert response.get("snapshot") == [{
+            "desk": self.desk.pk, "number": "101", "state": "available",
+            "initials": ""
+        }]
+
         # test sending text
         await communicator.send_json_to({"message": "refresh"})
         response = await communicator.receive_json_from()
         assert response.get("message") == "refresh"
 
         # close
-        await communicator.disconnect()
\ No newline at end of file
+        await communicator.disconnect()
+
+    async def test_desk_changes_are_pushed(self):
+        communicator = WebsocketCommunicator(self.application, "/ws/desk-reservation/S/1/")
+        await communicator.connect()
+        await communicator.receive_json_from()
+        client = APIClient()
+
+        response = await sync_to_async(client.post)(
+            '/api/v1/deskreservation',
+            {'employee_pk': self.employee.pk, 'desk_number': '101'},
+            format='json'
+        )
+        assert response.data['created']
+        response = await communicator.receive_json_from()
+        assert response.get("events") == [{
+            "desk": self.desk.pk, "number": "101", "state": "reserved",
+            "initials": "AS"
+        }]
+
+        reservation_pk = await sync_to_async(
+            lambda: self.desk.reservations.get().pk
+        )()
+        await sync_to_async(client.put)(
+            f'/api/v1/deskreservation/{reservation_pk}/cancel-reservation'
+        )
+        response = await communicator.receive_json_from()
+        assert response["events"][0]["state"] == "available"
+
+        today = datetime.now(tz=get_current_timezone()).date()
+        await sync_to_async(DeskHold.objects.create)(
+            desk=self.desk, dates=[today.isoformat()]
+        )
+        response = await communicator.receive_json_from()
+        assert response["events"][0]["state"] == "held"
+
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS={
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+})
+class DeskReservationWebSocketLoadTestCase(TransactionTestCase):
+    connections = 300
+
+    def setUp(self):
+        cache.clear()
+        self.application = URLRouter([re_path(r"ws/desk-reservation/(?P<building>\w+)/(?P<floor>\w+)/$", DeskReservationConsumer.as_asgi())])
+        self.desks = [Desk.objects.create(number=f"{100 + i}") for i in range(5)]
+
+    async def test_burst_is_coalesced_for_every_screen(self):
+        communicators = [
+            WebsocketCommunicator(self.application, "/ws/desk-reservation/S/1/")
+            for i in range(self.connections)
+        ]
+        connected = await asyncio.gather(*[
+            communicator.connect() for communicator in communicators
+        ])
+        self.assertTrue(all(
+            is_connected for is_connected, subprotocol in connected
+        ))
+        snapshots = await asyncio.gather(*[
+            communicator.receive_json_from(timeout=30)
+            for communicator in communicators
+        ])
+        self.assertTrue(all(
+            len(message["snapshot"]) == 5 for message in snapshots
+        ))
+
+        # Hold every screen's flush until the whole burst has reached every
+        # screen, however long fanning it out takes, rather than racing the
+        # coalescing delay
+        num_events = 2 * len(self.desks)
+        received = 0
+        burst_received = asyncio.Event()
+        desk_events = DeskReservationConsumer.desk_events
+
+        async def count_desk_events(consumer, event):
+            nonlocal received
+            await desk_events(consumer, event)
+            received += 1
+            if received == num_events * self.connections:
+                burst_received.set()
+
+        async def wait_for_burst(consumer):
+            await burst_received.wait()
+
+        with patch.object(
+            DeskReservationConsumer, 'desk_events', count_desk_events
+        ), patch.object(
+            DeskReservationConsumer, 'wait_to_flush', wait_for_burst
+        ):
+            # Each desk is reserved then cancelled, one event at a time
+            channel_layer = get_channel_layer()
+            for state in ["reserved", "available"]:
+                for desk in self.desks:
+                    await channel_layer.group_send("screen_S_1", {
+                        "type": "desk_events",
+                        "events": [{
+                            "desk": desk.pk, "number": desk.number,
+                            "state": state, "initials": ""
+                        }]
+                    })
+
+            # Every screen gets the burst as a single frame, with only the
+            # latest state of each desk
+            frames = await asyncio.gather(*[
+                communicator.receive_json_from(timeout=30)
+                for communicator in communicators
+            ])
+            for frame in frames:
+                states = {
+                    event["desk"]: event["state"] for event in frame["events"]
+                }
+                self.assertEqual(
+                    states, {desk.pk: "available" for desk in self.desks}
+                )
+                self.assertEqual(len(frame["events"]), len(self.desks))
+            nothing_more = await asyncio.gather(*[
+                communicator.receive_nothing()
+                for communicator in communicators
+            ])
+            self.assertTrue(all(nothing_more))
+
+        await asyncio.gather(*[
+            communicator.disconnect() for communicator in communicators
+        ])
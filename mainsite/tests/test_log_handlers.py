@@ -0,0 +1,72 @@
+import json
+import logging
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase
+
+from mainsite.helpers import record_error
+from mainsite.log_handlers import CloudWatchQueueHandler
+
+
+class BlockingHandler(logging.Handler):
+    """
+    Collects records, but only once it has been released.
+    """
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.released.wait(5)
+        self.messages.append(record.getMessage())
+
+
+class CloudWatchQueueHandlerTestCase(SimpleTestCase):
+    def test_records_are_dropped_and_counted_when_the_queue_is_full(self):
+        handler = CloudWatchQueueHandler('Group', 'Stream', max_queue_size=2)
+        self.assertIsNone(handler.listener)
+        self.assertIsNone(handler.cloudwatch_handler.cloudwatch_handler)
+        target = handler.cloudwatch_handler = BlockingHandler()
+        logger = logging.Logger('cloudwatch-queue-test')
+        logger.addHandler(handler)
+
+        logger.error('Error 0')
+        # Wait for the thread to take the first record and stall on it
+        while handler.queue.qsize():
+            time.sleep(0.01)
+        for i in range(1, 10):
+            logger.error('Error %s', i)
+        # One record taken by the stalled thread and two queued
+        self.assertEqual(handler.dropped, 7)
+
+        target.released.set()
+        handler.queue.join()
+        logger.error('Error 10')
+        handler.close()
+        self.assertEqual(target.messages, [
+            'Error 0', 'Error 1', 'Error 2', 'Error 10',
+            'Dropped 7 log records while the CloudWatch queue was full'
+        ])
+
+
+class RecordErrorTestCase(SimpleTestCase):
+    def test_error_record_is_compact(self):
+        request = RequestFactory().post(
+            '/api/v1/timeoffrequest?x=1', REMOTE_ADDR='10.0.0.1'
+        )
+        request.user = AnonymousUser()
+        with self.assertLogs('watchtower-error-logger') as logs:
+            record_error(
+                'Error updating request', ValueError('Bad date'), request,
+                'Traceback', {'pk': 1}
+            )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['error_type'], 'ValueError')
+        self.assertEqual(record['request'], {
+            'method': 'POST', 'path': '/api/v1/timeoffrequest?x=1',
+            'user': 'AnonymousUser', 'ip': '10.0.0.1'
+        })
+        self.assertEqual(record['other_info'], {'pk': 1})
@@ -0,0 +1,212 @@
+from datetime import timedelta
+from io import StringIO
+import os
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from mainsite.helpers import (
+    build_email, num_sent, queue_emails, send_email, send_email_multiple,
+    send_emails, send_queued_emails
+)
+from mainsite.models import OutgoingEmail
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('Mail server unavailable')
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionError('Mail server unreachable')
+
+    def send_messages(self, email_messages):
+        raise AssertionError('Not opened')
+
+
+class CountingEmailBackend(EmailBackend):
+    """
+    Counts the connections opened, and rejects mail to bounce@example.com.
+    """
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+
+    def send_messages(self, messages):
+        if any('bounce@example.com' in message.to for message in messages):
+            raise ValueError('Rejected recipient')
+        return super().send_messages(messages)
+
+
+class ClaimCheckingEmailBackend(EmailBackend):
+    """
+    Records whether the emails being sent could be picked up by another
+    worker.
+    """
+    due_while_sending = None
+
+    def send_messages(self, messages):
+        ClaimCheckingEmailBackend.due_while_sending = \
+            OutgoingEmail.objects.due().count()
+        return super().send_messages(messages)
+
+
+class OutgoingEmailTestCase(TestCase):
+    def test_sending_only_queues(self):
+        send_email(
+            'ada@example.com', 'Hello', 'Hi', '<p>Hi</p>',
+            headers={'X-Report': 'phish'}
+        )
+        send_email_multiple(['grace@example.com'], ['ada@example.com'], 'Hey')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.due().count(), 2)
+
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+        self.assertIn('Sent 2 queued emails, 0 failed', out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+        email = mail.outbox[0]
+        self.assertEqual(email.to, ['ada@example.com'])
+        self.assertEqual(email.extra_headers, {'X-Report': 'phish'})
+        self.assertEqual(email.alternatives[0][0], '<p>Hi</p>')
+        self.assertEqual(mail.outbox[1].cc, ['ada@example.com'])
+        self.assertFalse(OutgoingEmail.objects.due().exists())
+
+    def test_dedupe_key_queues_once(self):
+        for i in range(2):
+            send_email(
+                'ada@example.com', 'Reminder', 'Hi', '<p>Hi</p>',
+                dedupe_key='reminder-ada'
+            )
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+        self.assertEqual(send_queued_emails(), (1, 0))
+        send_email(
+            'ada@example.com', 'Reminder', 'Hi', '<p>Hi</p>',
+            dedupe_key='reminder-ada'
+        )
+        self.assertEqual(send_queued_emails(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_dedupe_keys_queue_each_email_once(self):
+        emails = [
+            build_email([f'user{i}@example.com'], [], 'Reminder', 'Hi', '')
+            for i in range(2)
+        ]
+        for i in range(2):
+            queue_emails(emails, ['reminder-0', 'reminder-1'])
+        queue_emails(emails)
+        self.assertEqual(OutgoingEmail.objects.count(), 4)
+
+    def test_failures_are_retried_with_backoff(self):
+        send_email('ada@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        queued = OutgoingEmail.objects.get()
+        with override_settings(EMAIL_BACKEND=
+            'mainsite.tests.test_outgoing_email.FailingEmailBackend'
+        ):
+            for attempt in range(1, OutgoingEmail.MAX_ATTEMPTS + 1):
+                self.assertEqual(send_queued_emails(), (0, 1))
+                queued.refresh_from_db()
+                self.assertEqual(queued.attempts, attempt)
+                if queued.status == OutgoingEmail.STATUS_QUEUED:
+                    # Not due again until the delay has passed
+                    self.assertEqual(send_queued_emails(), (0, 0))
+                    delay = queued.next_attempt_at - timezone.now()
+                    self.assertGreater(
+                        delay, OutgoingEmail.RETRY_DELAY * 2 ** (attempt - 1)
+                            - timedelta(seconds=5)
+                    )
+                    OutgoingEmail.objects.update(
+                        next_attempt_at=timezone.now()
+                    )
+        self.assertEqual(queued.status, OutgoingEmail.STATUS_FAILED)
+        self.assertIn('Mail server unavailable', queued.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(EMAIL_BACKEND=
+        'mainsite.tests.test_outgoing_email.ClaimCheckingEmailBackend'
+    )
+    def test_emails_are_claimed_while_sending(self):
+        send_email('ada@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(ClaimCheckingEmailBackend.due_while_sending, 0)
+        self.assertEqual(
+            OutgoingEmail.objects.get().status, OutgoingEmail.STATUS_SENT
+        )
+
+        # Left for another worker once the claim runs out
+        send_email('grace@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        claimed = OutgoingEmail.objects.claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(OutgoingEmail.objects.claim(10), [])
+        OutgoingEmail.objects.filter(pk=claimed[0].pk).update(
+            next_attempt_at=timezone.now()
+        )
+        self.assertEqual(send_queued_emails(), (1, 0))
+
+    @override_settings(EMAIL_BACKEND=
+        'mainsite.tests.test_outgoing_email.UnreachableEmailBackend'
+    )
+    def test_connection_only_opened_when_something_is_due(self):
+        # Opening would raise
+        self.assertEqual(send_queued_emails(), (0, 0))
+        for i in range(3):
+            send_email(f'user{i}@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        self.assertEqual(send_queued_emails(batch_size=2), (0, 2))
+        self.assertEqual(
+            OutgoingEmail.objects.filter(attempts=1).count(), 2
+        )
+        self.assertIn(
+            'Mail server unreachable', OutgoingEmail.objects.filter(
+                attempts=1
+            ).first().last_error
+        )
+
+
+@override_settings(
+    EMAIL_BACKEND='mainsite.tests.test_outgoing_email.CountingEmailBackend'
+)
+class SendEmailsTestCase(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    @patch('mainsite.helpers.time.sleep')
+    def test_chunks_share_one_connection(self, sleep):
+        addresses = [f'user{i}@example.com' for i in range(5)]
+        addresses[3] = 'bounce@example.com'
+        outcomes = send_emails([
+            build_email([address], [], 'Reminder', 'Hi', '<p>Hi</p>')
+            for address in addresses
+        ], chunk_size=2, max_send_rate=1)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(
+            [error is None for email, error in outcomes],
+            [True, True, True, False, True]
+        )
+        self.assertEqual(num_sent(outcomes), 4)
+        self.assertEqual(len(mail.outbox), 4)
+        # Paused after each of the first two chunks of two to keep to one
+        # email a second
+        self.assertEqual(sleep.call_count, 2)
+        self.assertGreater(sleep.call_args[0][0], 1.5)
+
+    @patch.dict(os.environ)
+    def test_sent_without_an_environment(self):
+        os.environ.pop('ENVIRONMENT', None)
+        send_email('ada@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @patch('mainsite.helpers.record_email_sent', side_effect=OSError)
+    def test_sent_even_if_logging_fails(self, record_email_sent):
+        send_email('ada@example.com', 'Hello', 'Hi', '<p>Hi</p>')
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(
+            OutgoingEmail.objects.get().status, OutgoingEmail.STATUS_SENT
+        )
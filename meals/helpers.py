@@ -0,0 +1,193 @@
+import csv
+from itertools import islice
+
+from django.db import transaction
+
+from mainsite.helpers import GEOCODE_WORKERS, geocode_addresses, geocode_query
+from mainsite.models import City, State, ZipCode
+from meals.models import Route, Stop
+
+
+# How each kind of stop file is imported. Stops are deduplicated against the
+# existing stops matching the filter.
+MEAL_STOP_IMPORTS = {
+    'hot': {
+        'path': 'meals/management/hot-meals.csv',
+        'filter': {'meal_type': Stop.TYPE_CHOICE_HOT, 'waitlist': False},
+        'use_overrides': True,
+    },
+    'cold': {
+        'path': 'meals/management/cold-meals.csv',
+        'filter': {'meal_type': Stop.TYPE_CHOICE_COLD, 'waitlist': False},
+        'use_overrides': False,
+    },
+    'waitlist': {
+        'path': 'meals/management/waitlist.csv',
+        'filter': {'waitlist': True},
+        'use_overrides': False,
+    },
+}
+
+# Waitlisted stops on these routes get hot meals, and the rest frozen
+WAITLIST_HOT_ROUTES = [
+    'Gateway', 'Long', 'Marcola', 'MC', 'North', 'Short', 'Will'
+]
+
+MEAL_STOP_IMPORT_BATCH_SIZE = 500
+
+
+class MealStopImport:
+    """
+    Imports the rows of a meal stop CSV file in batches. Routes, cities and
+    zip codes are loaded once and created as needed, the stops already
+    imported are loaded with one query, and the addresses in each batch are
+    geocoded together before its stops are created with one insert.
+
+    Problems are collected in `report` rather than stopping the import.
+    """
+    def __init__(self, stop_type, workers=GEOCODE_WORKERS):
+        self.stop_type = stop_type
+        self.config = MEAL_STOP_IMPORTS[stop_type]
+        self.workers = workers
+        self.routes = {route.name: route for route in Route.objects.all()}
+        self.zip_codes = {
+            zip_code.code: zip_code for zip_code in ZipCode.objects.all()
+        }
+        self.cities = {
+            city.name: city
+            for city in City.objects.select_related('state')
+        }
+        self.oregon = None
+        self.existing = set(
+            Stop.objects.filter(**self.config['filter']).values_list(
+                'last_name', 'first_name', 'address'
+            )
+        )
+        self.report = {
+            'type': stop_type, 'imported': 0, 'skipped': [],
+            'not_geocoded': [], 'errors': [],
+        }
+
+    def get_route(self, name):
+        if name not in self.routes:
+            self.routes[name] = Route.objects.create(name=name)
+        return self.routes[name]
+
+    def get_zip_code(self, code):
+        if code not in self.zip_codes:
+            self.zip_codes[code] = ZipCode.objects.create(code=code)
+        return self.zip_codes[code]
+
+    def get_city(self, name):
+        if name not in self.cities:
+            if self.oregon is None:
+                self.oregon = State.objects.get(name='Oregon')
+            self.cities[name] = City.objects.create(
+                name=name, state=self.oregon
+            )
+        return self.cities[name]
+
+    def parse_row(self, line, row):
+        """
+        The stop for a row, without its latitude and longitude unless they
+        are overridden, or None if the row is skipped.
+        """
+        if len(row) < 9:
+            raise ValueError(f'Expected at least 9 columns, found {len(row)}')
+        row = [value.strip() for value in row]
+        last_name, first_name, address = row[0], row[1], row[2]
+        key = (last_name, first_name, address)
+        if key in self.existing:
+            self.report['skipped'].append({
+                'line': line, 'name': f'{first_name} {last_name}',
+                'address': address,
+            })
+            return None
+        latitude = longitude = None
+        if self.config['use_overrides'] and len(row) >= 11:
+            latitude = float(row[9]) if row[9] else None
+            longitude = float(row[10]) if row[10] else None
+        route_name = row[8]
+        if self.stop_type == 'waitlist':
+            if route_name in WAITLIST_HOT_ROUTES:
+                meal_type = Stop.TYPE_CHOICE_HOT
+            else:
+                meal_type = Stop.TYPE_CHOICE_COLD
+        else:
+            meal_type = self.config['filter']['meal_type']
+        stop = Stop(
+            first_name=first_name, last_name=last_name, address=address,
+            city=self.get_city(row[3]), zip_code=self.get_zip_code(row[4]),
+            notes=row[5], phone=row[6], phone_notes=row[7],
+            route=self.get_route(route_name), meal_type=meal_type,
+            waitlist=self.stop_type == 'waitlist', latitude=latitude,
+            longitude=longitude
+        )
+        self.existing.add(key)
+        return stop
+
+    def import_batch(self, rows):
+        stops = []
+        for line, row in rows:
+            try:
+                stop = self.parse_row(line, row)
+            except Exception as e:
+                self.report['errors'].append({'line': line, 'error': str(e)})
+                continue
+            if stop:
+                stops.append((line, stop))
+
+        queries = {
+            line: geocode_query(
+                stop.address, stop.city.name, stop.city.state.name,
+                stop.zip_code.code
+            )
+            for line, stop in stops
+            if stop.latitude is None or stop.longitude is None
+        }
+        coordinates = geocode_addresses(set(queries.values()), self.workers)
+        for line, stop in stops:
+            if line not in queries:
+                continue
+            latitude, longitude = coordinates.get(queries[line], (None, None))
+            if stop.latitude is None:
+                stop.latitude = latitude
+            if stop.longitude is None:
+                stop.longitude = longitude
+            if stop.latitude is None or stop.longitude is None:
+                # Imported anyway, like stops saved by hand, to be placed on
+                # the map later
+                self.report['not_geocoded'].append({
+                    'line': line, 'address': queries[line]
+                })
+                stop.latitude = stop.latitude or 0
+                stop.longitude = stop.longitude or 0
+
+        try:
+            with transaction.atomic():
+                Stop.objects.bulk_create([stop for line, stop in stops])
+        except Exception as e:
+            self.report['errors'].extend(
+                {'line': line, 'error': str(e)} for line, stop in stops
+            )
+            return
+        self.report['imported'] += len(stops)
+
+    def run(self, rows, batch_size=MEAL_STOP_IMPORT_BATCH_SIZE):
+        """
+        Imports rows of CSV values, numbered from one, and returns the report.
+        """
+        numbered = enumerate(rows, start=1)
+        while batch := list(islice(numbered, batch_size)):
+            self.import_batch(batch)
+        return self.report
+
+
+def import_meal_stops_from_file(
+    stop_type, path=None, workers=GEOCODE_WORKERS,
+    batch_size=MEAL_STOP_IMPORT_BATCH_SIZE
+):
+    path = path or MEAL_STOP_IMPORTS[stop_type]['path']
+    with open(path, newline='') as csv_file:
+        rows = csv.reader(csv_file, delimiter=',', quotechar='"')
+        return MealStopImport(stop_type, workers).run(rows, batch_size)
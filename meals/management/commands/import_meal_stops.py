@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from mainsite.helpers import GEOCODE_WORKERS
+from meals.helpers import (
+    MEAL_STOP_IMPORT_BATCH_SIZE, MEAL_STOP_IMPORTS, import_meal_stops_from_file
+)
+
+
+class Command(BaseCommand):
+    help = 'Imports hot, frozen or waitlisted meal delivery addresses ' + \
+        'from a CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', choices=list(MEAL_STOP_IMPORTS), required=True
+        )
+        parser.add_argument(
+            '--path', type=str,
+            help='CSV file to import, defaulting to the one for the type'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=GEOCODE_WORKERS,
+            help='Threads geocoding new addresses'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=MEAL_STOP_IMPORT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--report', type=str,
+            help='Write the JSON report of skipped rows and errors to ' + \
+                'this file instead of to stdout'
+        )
+
+    def handle(self, *args, **options):
+        report = import_meal_stops_from_file(
+            options['type'], options['path'], options['workers'],
+            options['batch_size']
+        )
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+        message = f"Imported {report['imported']} {options['type']} " + \
+            f"meal stops, skipped {len(report['skipped'])}, " + \
+            f"{len(report['not_geocoded'])} not geocoded, " + \
+            f"{len(report['errors'])} errors."
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -1,3 +1,154 @@
-from django.test import TestCase
+from decimal import Decimal
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.management import call_command
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from mainsite.geocoders import LocalGeocoder
+from mainsite.models import City, GeocodedAddress, State, ZipCode
+from meals.models import Route, Stop
+
+
+@override_settings(
+    GEOCODER_BACKEND='mainsite.geocoders.LocalGeocoder',
+    GEOCODER_LOCAL_RESULTS={
+        '859 willamette st, eugene, oregon, 97401': ('44.0505', '-123.0917')
+    }
+)
+class GeocodingTestCase(TestCase):
+    def setUp(self):
+        LocalGeocoder.queries = []
+        self.city = City.objects.create(
+            name="Eugene", state=State.objects.create(name="Oregon")
+        )
+        self.zip_code = ZipCode.objects.create(code="97401")
+        self.route = Route.objects.create(name="Downtown")
+
+    def add_stop(self, address):
+        return Stop.objects.create(
+            first_name="Ada", last_name="Lovelace", address=address,
+            city=self.city, zip_code=self.zip_code, phone="555-0100",
+            notes="", route=self.route
+        )
+
+    def test_each_address_is_geocoded_once(self):
+        stop = self.add_stop("859 Willamette St #2")
+        self.assertEqual(
+            (stop.latitude, stop.longitude),
+            (Decimal('44.0505'), Decimal('-123.0917'))
+        )
+        # Other units and spellings of the same address are already known
+        self.add_stop("859  willamette st #5")
+        self.add_stop("859 1/2 Willamette St")
+        self.assertEqual(LocalGeocoder.queries, [
+            '859 willamette st, eugene, oregon, 97401'
+        ])
+
+    def test_unknown_addresses_are_not_looked_up_again(self):
+        stop = self.add_stop("1 Nowhere Ln")
+        self.assertEqual((stop.latitude, stop.longitude), (0, 0))
+        stop.save()
+        self.add_stop("1 Nowhere Ln")
+        self.assertEqual(len(LocalGeocoder.queries), 1)
+        self.assertIsNone(GeocodedAddress.objects.get().latitude)
+
+    def test_address_lat_long_view_uses_the_cache(self):
+        self.add_stop("859 Willamette St")
+        response = APIClient().get('/api/v1/address-lat-long/', {
+            'address': '859 Willamette St', 'city': 'Eugene',
+            'state': 'Oregon', 'zip': '97401'
+        })
+        self.assertEqual(
+            response.json(), {'lat': '44.0505000', 'long': '-123.0917000'}
+        )
+        self.assertEqual(len(LocalGeocoder.queries), 1)
+
+
+@override_settings(
+    GEOCODER_BACKEND='mainsite.geocoders.LocalGeocoder',
+    GEOCODER_LOCAL_RESULTS={
+        '859 willamette st, eugene, oregon, 97401': ('44.0505', '-123.0917'),
+        '99 w 10th ave, eugene, oregon, 97401': ('44.0471', '-123.0935'),
+    }
+)
+class ImportMealStopsTestCase(TestCase):
+    def setUp(self):
+        LocalGeocoder.queries = []
+        oregon = State.objects.create(name="Oregon")
+        City.objects.create(name="Eugene", state=oregon)
+        self.route = Route.objects.create(name="North")
+
+    def import_rows(self, stop_type, rows):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stops.csv')
+            report_path = os.path.join(directory, 'report.json')
+            with open(path, 'w') as csv_file:
+                csv_file.write('\n'.join(rows))
+            call_command(
+                'import_meal_stops', type=stop_type, path=path,
+                report=report_path, stdout=open(os.devnull, 'w')
+            )
+            with open(report_path) as report_file:
+                return json.load(report_file)
+
+    def test_import(self):
+        Stop.objects.create(
+            first_name="Ada", last_name="Lovelace",
+            address="859 Willamette St", city=City.objects.get(),
+            zip_code=ZipCode.objects.create(code="97401"), phone="555-0100",
+            notes="", route=self.route
+        )
+        rows = [
+            'Lovelace,Ada,859 Willamette St,Eugene,97401,,555-0100,,North',
+            'Hopper,Grace,859 Willamette St #3,Eugene,97401,Back,555-0101,,'
+                'North',
+            'Turing,Alan,99 W 10th Ave,Eugene,97401,,555-0102,,Short',
+            'Turing,Alan,99 W 10th Ave,Eugene,97401,,555-0102,,Short',
+            'Knuth,Don,1 Nowhere Ln,Springfield,97477,,555-0103,,Short',
+            'Liskov,Barbara,1 Oak St,Eugene',
+            'Hamilton,Margaret,2 Elm St,Eugene,97401,,555-0104,,North,44.1,x',
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            report = self.import_rows('hot', rows)
+        self.assertEqual(report['imported'], 3)
+        self.assertEqual([row['line'] for row in report['skipped']], [1, 4])
+        self.assertEqual(report['not_geocoded'], [
+            {'line': 5, 'address': '1 nowhere ln, springfield, oregon, 97477'}
+        ])
+        self.assertEqual([row['line'] for row in report['errors']], [6, 7])
+        # Each new address looked up once, and together
+        self.assertEqual(len(LocalGeocoder.queries), 3)
+        self.assertEqual(GeocodedAddress.objects.count(), 3)
+        self.assertLess(len(queries), 15)
+
+        grace = Stop.objects.get(first_name="Grace")
+        self.assertEqual(
+            (grace.latitude, grace.longitude),
+            (Decimal('44.0505'), Decimal('-123.0917'))
+        )
+        self.assertEqual(grace.notes, "Back")
+        self.assertEqual(grace.meal_type, Stop.TYPE_CHOICE_HOT)
+        don = Stop.objects.get(first_name="Don")
+        self.assertEqual((don.latitude, don.longitude), (0, 0))
+        self.assertEqual(don.city.state.name, "Oregon")
+        self.assertEqual(don.route.name, "Short")
+
+    def test_waitlist_meal_type_follows_route(self):
+        report = self.import_rows('waitlist', [
+            'Hopper,Grace,859 Willamette St,Eugene,97401,,555-0101,,North',
+            'Turing,Alan,99 W 10th Ave,Eugene,97401,,555-0102,,Downtown',
+        ])
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual(
+            list(Stop.objects.filter(waitlist=True).order_by(
+                'last_name'
+            ).values_list('meal_type', flat=True)),
+            [Stop.TYPE_CHOICE_HOT, Stop.TYPE_CHOICE_COLD]
+        )
@@ -132,7 +132,8 @@ class PerformanceReviewAdmin(admin.ModelAdmin):
         if pr_exists:
             user_is_superuser = request.user.is_superuser
             employee_cannot_view_pr = not hasattr(request.user, 'employee') or \
-                obj.pk not in request.user.employee.prs_can_view()
+                not request.user.employee.viewable_performance_reviews()\
+                    .filter(pk=obj.pk).exists()
             if not user_is_superuser and employee_cannot_view_pr:
                 self.exclude = (
                     'step_increase', 'top_step_bonus', 'action_other',
@@ -101,7 +101,13 @@ class CurrentUserView(RetrieveAPIView):
     queryset = Employee.objects.all()
 
     def get_object(self):
-        return getattr(self.request.user, 'employee', None)
+        if not self.request.user.is_authenticated:
+            return None
+        return Employee.objects\
+            .select_related(
+                'user', 'job_title', 'unit_or_program__division', 'manager'
+            )\
+            .filter(user=self.request.user).first()
 
 
 class UserViewSet(viewsets.ModelViewSet):
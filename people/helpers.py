@@ -4,7 +4,10 @@ from django.contrib.auth.models import Group
 from django.contrib.sites.models import Site
 from django.utils import timezone
 
-from mainsite.helpers import MANAGER_SIGNATURE_REMINDER, send_email_multiple
+from mainsite.helpers import (
+    MANAGER_SIGNATURE_REMINDER, build_email, num_sent, send_email_multiple,
+    send_emails
+)
 from people.models import PerformanceReview
 
 
@@ -86,22 +89,32 @@ def send_pr_signature_reminders():
     # Notification #11
     SignatureReminder = apps.get_model('people.SignatureReminder')
     current_site = Site.objects.get_current()
-    unsigned_reminders = SignatureReminder.objects.filter(
+    unsigned_reminders = list(SignatureReminder.objects.filter(
         signed=False, next_date__lte=timezone.now()
-    )
-    count = 0
+    ).select_related(
+        'employee__user', 'review__employee__user',
+        'review__employee__manager__user'
+    ))
+    emails = []
+    next_date = datetime.today() + timedelta(days=MANAGER_SIGNATURE_REMINDER)
     for reminder in unsigned_reminders:
         review = reminder.review
         manager = reminder.employee
         url = current_site.domain + '/pr/' + str(review.pk)
-        send_email_multiple(
+        emails.append(build_email(
             [manager.user.email],
             [],
             f'Follow-Up Reminder: Signature required for {review.employee.name}\'s performance review',
             f'{review.employee.manager.name} has completed an evaluation for {review.employee.name}, which requires your signature. View and sign here: {url}',
             f'{review.employee.manager.name} has completed an evaluation for {review.employee.name}, which requires your signature. View and sign here: <a href="{url}">{url}</a>'
-        )
-        reminder.next_date = datetime.today() + timedelta(days=MANAGER_SIGNATURE_REMINDER)
-        reminder.save()
-        count += 1
-    return count
+        ))
+    outcomes = send_emails(emails)
+    # Reminders that failed to send are tried again on the next run
+    sent_reminders = [
+        reminder for reminder, (email, error)
+        in zip(unsigned_reminders, outcomes) if error is None
+    ]
+    for reminder in sent_reminders:
+        reminder.next_date = next_date
+    SignatureReminder.objects.bulk_update(sent_reminders, ['next_date'])
+    return num_sent(outcomes)
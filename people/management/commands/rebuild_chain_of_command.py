@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from people.models import Employee
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized program manager and division director ' \
+           'of every employee from the manager chain.'
+
+    def handle(self, *args, **options):
+        count = Employee.objects.rebuild_chain_of_command()
+        message = f'{ datetime.now() } - Updated the chain of command for ' \
+                  f'{count} employees.'
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from people.models import ReportingPath
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the org chart reporting path table from each ' \
+           'employee\'s manager.'
+
+    def handle(self, *args, **options):
+        count = ReportingPath.objects.rebuild()
+        message = f'{ datetime.now() } - Rebuilt {count} reporting paths.'
+        self.stdout.write(self.style.SUCCESS(message))
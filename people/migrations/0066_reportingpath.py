@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 12:32
+
+import django.db.models.deletion
+import people.models
+from django.db import migrations, models
+
+
+def populate_reporting_paths(apps, schema_editor):
+    ReportingPath = apps.get_model('people', 'ReportingPath')
+    ReportingPath.objects.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0065_prform_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportingPath',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to='people.employee')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to='people.employee')),
+            ],
+            options={
+                'verbose_name': 'Reporting Path',
+                'verbose_name_plural': 'Reporting Paths',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='people_repo_descend_a58f6d_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+            managers=[
+                ('objects', people.models.ReportingPathManager()),
+            ],
+        ),
+        migrations.RunPython(
+            populate_reporting_paths, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 12:34
+
+import django.db.models.deletion
+import people.models
+from django.db import migrations, models
+
+
+def populate_chain_of_command(apps, schema_editor):
+    Employee = apps.get_model('people', 'Employee')
+    Employee.objects.rebuild_chain_of_command()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0066_reportingpath'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='employee',
+            managers=[
+                ('objects', people.models.EmployeeManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='division_director',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='division_members', to='people.employee', verbose_name='division director'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='program_manager',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='program_members', to='people.employee', verbose_name='program manager'),
+        ),
+        migrations.RunPython(
+            populate_chain_of_command, migrations.RunPython.noop
+        ),
+    ]
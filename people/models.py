@@ -4,6 +4,7 @@ from mainsite.models import SecurityMessage
 from django.apps import apps
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from mainsite.models import (
@@ -82,13 +83,140 @@ class JobTitle(models.Model):
         return self.name
 
 
+class PermissionSnapshot:
+    """
+    The auth group names and workflow roles of an employee, loaded with one
+    query each and shared by every group or role check on that employee.
+    """
+
+    def __init__(self, employee):
+        self.group_names = frozenset(
+            employee.user.groups.values_list('name', flat=True)
+        )
+        self.workflow_roles = dict(
+            employee.workflow_roles.order_by().values_list('pk', 'name')
+        )
+
+    def in_group(self, name):
+        return name in self.group_names
+
+    def has_role(self, name):
+        return name in self.workflow_roles.values()
+
+    @property
+    def workflow_role_ids(self):
+        return list(self.workflow_roles.keys())
+
+
+class EmployeeManager(models.Manager):
+    use_in_migrations = True
+
+    def rebuild_chain_of_command(self, root=None):
+        """
+        Recompute the denormalized program manager and division director of
+        every employee by walking the manager chain in memory, and save only
+        the employees whose values changed. Returns the number updated.
+
+        With a root employee, only the root and the employees below them are
+        recomputed, since nobody else's chain of command goes through them.
+        """
+        if root is None:
+            employees = {
+                pk: (manager_id, is_division_director)
+                for pk, manager_id, is_division_director in self.order_by()\
+                    .values_list('pk', 'manager_id', 'is_division_director')
+            }
+            current_values = {
+                pk: (program_manager_id, division_director_id)
+                for pk, program_manager_id, division_director_id in \
+                    self.order_by().values_list(
+                        'pk', 'program_manager_id', 'division_director_id'
+                    )
+            }
+        else:
+            employees, current_values = self._load_subtree_chain(root)
+        changed = []
+        for pk, values in current_values.items():
+            chain = self._resolve_chain_of_command(pk, employees)
+            if chain != values:
+                changed.append(self.model(
+                    pk=pk, program_manager_id=chain[0],
+                    division_director_id=chain[1]
+                ))
+        self.bulk_update(
+            changed, ['program_manager', 'division_director'], batch_size=500
+        )
+        return len(changed)
+
+    def _load_subtree_chain(self, root):
+        # The manager and division director flag of the root, everyone below
+        # them and everyone above them, and the current chain of command of
+        # the root and everyone below them
+        fields = ('pk', 'manager_id', 'is_division_director')
+        employees = {root.pk: (root.manager_id, root.is_division_director)}
+        current_values = {}
+        frontier = [root.pk]
+        while frontier:
+            subtree = self.order_by().filter(
+                ancestor_paths__ancestor_id__in=frontier
+            ).values_list(*fields, 'program_manager_id', 'division_director_id')
+            for pk, manager_id, is_division_director, *values in subtree:
+                if pk not in current_values:
+                    employees[pk] = (manager_id, is_division_director)
+                    current_values[pk] = tuple(values)
+            # Inactive employees are detached from their manager's reporting
+            # paths, but still report to them
+            frontier = [
+                pk for pk in self.order_by().filter(
+                    manager__ancestor_paths__ancestor_id__in=frontier
+                ).values_list('pk', flat=True)
+                if pk not in current_values
+            ]
+        seen = set()
+        current = root.manager_id
+        while current is not None and current not in seen:
+            if current not in employees:
+                employees.update(
+                    (pk, (manager_id, is_division_director))
+                    for pk, manager_id, is_division_director in \
+                        self.order_by().filter(
+                            models.Q(pk=current) | \
+                            models.Q(descendant_paths__descendant_id=current)
+                        ).values_list(*fields)
+                )
+            seen.add(current)
+            current = employees[current][0]
+        return employees, current_values
+
+    @staticmethod
+    def _resolve_chain_of_command(pk, employees):
+        # The program manager is the first employee in the chain (possibly
+        # the employee themself) who reports to a division director. That
+        # division director is the employee's division director, unless the
+        # employee is a division director.
+        is_division_director = employees[pk][1]
+        current = pk
+        seen = set()
+        while current not in seen:
+            seen.add(current)
+            manager = employees[current][0]
+            if manager is None:
+                break
+            if employees[manager][1]:
+                return (
+                    current, None if is_division_director else manager
+                )
+            current = manager
+        return (None, None)
+
+
 class Employee(models.Model):
     class Meta:
         verbose_name = _("Employee")
         verbose_name_plural = _("Employees")
         ordering = ["user__username"]
 
-    objects = models.Manager()
+    objects = EmployeeManager()
     active_objects = ActiveManager()
 
     def __str__(self):
@@ -167,6 +295,27 @@ class Employee(models.Model):
     is_division_director = models.BooleanField(
         _("is a division director"), default=False
     )
+
+    # Chain of command denormalized from the manager chain. Maintained by
+    # save and the rebuild_chain_of_command management command.
+    program_manager = models.ForeignKey(
+        "self",
+        related_name="program_members",
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_("program manager"),
+        on_delete=models.SET_NULL
+    )
+    division_director = models.ForeignKey(
+        "self",
+        related_name="division_members",
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_("division director"),
+        on_delete=models.SET_NULL
+    )
     
     # These are UNIQUELY TRUE, enforced in model save
     is_hr_manager = models.BooleanField(_("is the HR manager"), default=False)
@@ -202,21 +351,25 @@ class Employee(models.Model):
         else:
             return self.user.username
 
+    @cached_property
+    def permissions(self):
+        return PermissionSnapshot(self)
+
     @property
     def is_is_employee(self):
-        return self.user.groups.filter(name='IS Employee').exists()
+        return self.permissions.in_group('IS Employee')
     
     @property
     def is_hr_employee(self):
-        return self.user.groups.filter(name='HR Employee').exists()
+        return self.permissions.in_group('HR Employee')
     
     @property
     def is_sds_hiring_lead(self):
-        return self.user.groups.filter(name='SDS Hiring Lead').exists()
+        return self.permissions.in_group('SDS Hiring Lead')
 
     @property
     def is_fiscal_employee(self):
-        return self.user.groups.filter(name='Fiscal Employee').exists()
+        return self.permissions.in_group('Fiscal Employee')
 
     @property
     def is_program_manager(self):
@@ -237,66 +390,23 @@ class Employee(models.Model):
 
     @property
     def has_program_manager(self):
-        current_employee = self
-        if current_employee.is_executive_director:
-            return False
-        if current_employee.is_division_director:
+        if self.is_executive_director or self.is_division_director:
             return False
-        if all([
-            current_employee.manager,
-            current_employee.manager.is_division_director
-        ]):
-            # They *are* the program manager
-            return False
-        while True:
-            if all([
-                current_employee.manager,
-                current_employee.manager.is_division_director
-            ]):
-                return True
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                return False
+        # When the program manager is the employee themself, they *are* the
+        # program manager
+        return self.program_manager_id not in [None, self.pk]
 
     @property
     def get_program_manager(self):
-        current_employee = self
-        if current_employee.manager.is_division_director:
-            return self
-        while True:
-            if current_employee.manager.is_division_director:
-                return current_employee
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                return None
+        return self.program_manager
 
     @property
     def has_division_director(self):
-        current_employee = self
-        if current_employee.is_division_director:
-            return False
-        while True:
-            if current_employee.is_division_director:
-                return True
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                return False
+        return self.division_director_id is not None
 
     @property
     def get_division_director(self):
-        current_employee = self
-        if current_employee.is_division_director:
-            return None
-        while True:
-            if current_employee.is_division_director:
-                return current_employee
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                return None
+        return self.division_director
 
     def save(self, *args, **kwargs):
         # is_hr_manager can only apply to ONE Employee PER Organization
@@ -321,7 +431,32 @@ class Employee(models.Model):
                     old_director.save()
             except Employee.DoesNotExist:
                 pass
+        # Keep the reporting path closure table in sync when the employee
+        # moves in the org chart or is (de)activated
+        previous = None
+        if self.pk:
+            previous = Employee.objects.filter(pk=self.pk)\
+                .values('manager_id', 'active', 'is_division_director')\
+                .first()
         super().save(*args, **kwargs)
+        if any([
+            previous is None,
+            previous and previous['manager_id'] != self.manager_id,
+            previous and previous['active'] != self.active
+        ]):
+            ReportingPath.objects.relink(self)
+        # Moving an employee or changing who is a division director changes
+        # the chain of command for everyone below them
+        if any([
+            previous is None,
+            previous and previous['manager_id'] != self.manager_id,
+            previous and \
+                previous['is_division_director'] != self.is_division_director
+        ]):
+            Employee.objects.rebuild_chain_of_command(root=self)
+            self.refresh_from_db(
+                fields=['program_manager', 'division_director']
+            )
 
     def should_receive_email_of_type(self, type, subtype):
         if self.email_opt_out_all:
@@ -367,29 +502,18 @@ class Employee(models.Model):
             return self.direct_reports.filter(active=True)
     
     def get_descendants_of_employee(self, employee):
-        employee_and_descendants = [employee]
-        descendants = employee.direct_reports.filter(active=True)
-        for descendant in descendants:
-            employee_and_descendants += \
-                self.get_descendants_of_employee(descendant)
-        return employee_and_descendants
+        # Return the employee and everyone under them, read from the
+        # reporting path closure table in a single query.
+        return Employee.objects.filter(ancestor_paths__ancestor=employee)
 
     def get_direct_reports_descendants(self, include_self=False):
         # Return all descendant direct reports, including the user's direct
         # reports.
-        direct_reports_descendants = [
-            self.get_descendants_of_employee(employee) for employee in \
-                self.get_direct_reports()
-        ]
-        # Flatten the 2-D list
-        flat_list = [
-            item for sublist in direct_reports_descendants for item in sublist
-        ]
-        pk_list = [item.pk for item in flat_list]
-        if include_self:
-            pk_list.append(self.pk)
-        unique_descendant_pks = list(set(pk_list))
-        return Employee.objects.filter(pk__in=unique_descendant_pks)
+        min_depth = 0 if include_self else 1
+        return Employee.objects.filter(
+            ancestor_paths__ancestor=self,
+            ancestor_paths__depth__gte=min_depth
+        )
 
     def manager_upcoming_reviews(self):
         reviews = []
@@ -464,38 +588,32 @@ class Employee(models.Model):
                     applications.append(employee.teleworkapplication)
         return sorted(applications, key=lambda application: application.date)
 
-    def prs_can_view(self):
+    def viewable_performance_reviews(self):
         # You can view all PRs for which either you are the employee or the
         # employee is your direct report or a descendant direct report.
         if self.is_hr_manager or self.is_executive_director:
-            return map(lambda pr: pr.id, PerformanceReview.objects.all())
-        self_and_direct_reports = self.get_direct_reports_descendants(include_self=True)
-        pr_ids = []
-        for employee in self_and_direct_reports:
-            employee_pr_ids = map(lambda pr: pr.id, PerformanceReview.objects.filter(employee=employee))
-            pr_ids += employee_pr_ids
-        return list(pr_ids)
-    
+            return PerformanceReview.objects.all()
+        return PerformanceReview.objects.filter(
+            employee__ancestor_paths__ancestor=self
+        )
+
     def notes_can_view(self):
         # You can view all notes you wrote.
         note_ids = map(lambda note: note.id, ReviewNote.objects.filter(author=self))
         return list(note_ids)
 
-    def telework_applications_can_view(self):
+    def viewable_telework_applications(self):
         # You can view all Telework Applications for which either you are the
         # employee or the employee is your direct report or a descendant direct
         # report. Employees with the 'View all telework applications' group
         # role can view all of them.
-        view_all_applications = self.user.groups.filter(name='View all telework applications').exists()
+        view_all_applications = self.permissions.in_group('View all telework applications')
         if self.is_hr_manager or self.is_executive_director or view_all_applications:
-            return map(lambda pr: pr.id, TeleworkApplication.objects.all())
-        self_and_direct_reports = self.get_direct_reports_descendants(include_self=True)
-        application_ids = []
-        for employee in self_and_direct_reports:
-            employee_application_ids = map(lambda pr: pr.id, TeleworkApplication.objects.filter(employee=employee))
-            application_ids += employee_application_ids
-        return list(application_ids)
-    
+            return TeleworkApplication.objects.all()
+        return TeleworkApplication.objects.filter(
+            employee__ancestor_paths__ancestor=self
+        )
+
     def time_off_requests_can_view(self):
         # You can view/edit all requests you made.
         TimeOffRequestModel = apps.get_model('timeoff', 'TimeOffRequest') # Avoid circular import
@@ -506,8 +624,8 @@ class Employee(models.Model):
         # You can view seating charts if you are an ED, HR Manager, or Division
         # Director. Employees with the 'HR Employee' or 'View Seating Charts'
         # group role can also view them.
-        hr_employee = self.user.groups.filter(name='HR Employee').exists()
-        view_seating_charts = self.user.groups.filter(name='View seating charts').exists()
+        hr_employee = self.permissions.in_group('HR Employee')
+        view_seating_charts = self.permissions.in_group('View seating charts')
         if any([
             self.is_executive_director, self.is_hr_manager,
             self.is_division_director, hr_employee, view_seating_charts
@@ -519,7 +637,7 @@ class Employee(models.Model):
     def can_edit_seating_charts(self):
         # Employees with the 'Edit Seating Charts' group role can edit seating
         # charts.
-        edit_seating_charts = self.user.groups.filter(name='Edit seating charts').exists()
+        edit_seating_charts = self.permissions.in_group('Edit seating charts')
         if edit_seating_charts:
             return True
         else:
@@ -528,7 +646,7 @@ class Employee(models.Model):
     def can_view_desk_reservation_reports(self):
         # Employees with the 'View Desk Reservation Reports' group role can
         # view them.
-        view_desk_reservation_reports = self.user.groups.filter(name='View Desk Reservation Reports').exists()
+        view_desk_reservation_reports = self.permissions.in_group('View Desk Reservation Reports')
         if view_desk_reservation_reports:
             return True
         else:
@@ -543,51 +661,49 @@ class Employee(models.Model):
         return None
 
     def is_all_workflows_admin(self):
-        role = apps.get_model('workflows', 'Role').objects.get(name="All Workflows Admins")
-        return self in role.members.all()
+        return self.permissions.has_role("All Workflows Admins")
 
     def is_employee_transition_admin(self):
-        role = apps.get_model('workflows', 'Role').objects.get(name="Employee Transition Admins")
-        return self in role.members.all()
+        return self.permissions.has_role("Employee Transition Admins")
     
     def can_view_employee_transitions(self):
         return self.is_employee_transition_admin() or self.is_all_workflows_admin()
 
     def admin_of_workflows(self):
-        all_workflows = apps.get_model('workflows', 'Workflow').objects.all().select_related('role')
+        all_workflows = apps.get_model('workflows', 'Workflow').objects.all()
         if self.is_all_workflows_admin():
-            return [workflow.id for workflow in all_workflows]
-        return [workflow.id for workflow in list(all_workflows) if workflow.role and self in workflow.role.members.all()]
+            return list(all_workflows.values_list('id', flat=True))
+        return list(all_workflows.filter(
+            role__in=self.permissions.workflow_role_ids
+        ).values_list('id', flat=True))
     
     def admin_of_processes(self):
-        all_processes = apps.get_model('workflows', 'Process').objects.all().select_related('role')
-        return [process.id for process in list(all_processes) if process.role and self in process.role.members.all()]
+        all_processes = apps.get_model('workflows', 'Process').objects.all()
+        return list(all_processes.filter(
+            role__in=self.permissions.workflow_role_ids
+        ).values_list('id', flat=True))
     
     def is_expense_submitter(self):
-        return self.user.groups.filter(name='Expense Submitter').exists()
+        return self.permissions.in_group('Expense Submitter')
     
     def is_expense_approver(self):
-        return self.user.groups.filter(name='Expense Approver').exists()
+        return self.permissions.in_group('Expense Approver')
 
     def can_view_phish(self):
-        return self.user.groups.filter(
-            name='View Phishing'
-        ).exists()
+        return self.permissions.in_group('View Phishing')
 
     def can_view_reviews(self):
-        return self.user.groups.filter(
-            name='View Performance Reviews'
-        ).exists()
+        return self.permissions.in_group('View Performance Reviews')
 
     def can_view_mow_routes(self):
-        view_mow_routes = self.user.groups.filter(name='View Meals on Wheels Routes').exists()
+        view_mow_routes = self.permissions.in_group('View Meals on Wheels Routes')
         if view_mow_routes:
             return True
         else:
             return False
     
     def can_manage_mow_stops(self):
-        manage_mow_stops = self.user.groups.filter(name='Manage Meals on Wheels Stops').exists()
+        manage_mow_stops = self.permissions.in_group('Manage Meals on Wheels Stops')
         if manage_mow_stops:
             return True
         else:
@@ -595,13 +711,19 @@ class Employee(models.Model):
     
     def workflow_display_options(employee):
         workflows = employee.admin_of_workflows()
-        wf_options = WorkflowOptions.objects\
-            .filter(employee=employee, workflow__in=workflows)
+        wf_options = {
+            wf_option.workflow_id: wf_option for wf_option in \
+                WorkflowOptions.objects\
+                    .filter(employee=employee, workflow__in=workflows)\
+                    .select_related('workflow')
+        }
+        unset_workflows = apps.get_model('workflows.Workflow').objects\
+            .in_bulk([wf_id for wf_id in workflows if wf_id not in wf_options])
         set_options = []
         unset_options = []
         for wf_id in workflows:
-            try:
-                wf_option = wf_options.get(workflow__id=wf_id)
+            if wf_id in wf_options:
+                wf_option = wf_options[wf_id]
                 set_options.append({
                     'id': wf_id,
                     'name': wf_option.workflow.name,
@@ -610,8 +732,8 @@ class Employee(models.Model):
                     'display': wf_option.display,
                     'order': wf_option.order
                 })
-            except WorkflowOptions.DoesNotExist:
-                wf = apps.get_model('workflows.Workflow').objects.get(id=wf_id)
+            else:
+                wf = unset_workflows[wf_id]
                 unset_options.append({
                     'id': wf_id,
                     'name': wf.name,
@@ -636,6 +758,99 @@ class WorkflowOptions(models.Model):
     order = models.IntegerField(default=0)
 
 
+class ReportingPathManager(models.Manager):
+    use_in_migrations = True
+
+    def relink(self, employee):
+        """
+        Detach the employee's subtree from its previous ancestors and attach
+        it under the employee's current manager. Inactive employees are
+        detached from their manager, matching the org chart views which only
+        walk through active employees.
+        """
+        self.get_or_create(ancestor=employee, descendant=employee, depth=0)
+        subtree = list(
+            self.filter(ancestor=employee).values_list('descendant_id', 'depth')
+        )
+        subtree_ids = [pk for pk, _ in subtree]
+        self.filter(descendant_id__in=subtree_ids)\
+            .exclude(ancestor_id__in=subtree_ids).delete()
+        if not employee.active or not employee.manager_id:
+            return
+        # Skip ancestors inside the subtree so a cycle in the manager chain
+        # can't create self-referencing paths
+        ancestors = self.filter(descendant_id=employee.manager_id)\
+            .exclude(ancestor_id__in=subtree_ids)\
+            .values_list('ancestor_id', 'depth')
+        self.bulk_create([
+            self.model(
+                ancestor_id=ancestor_id, descendant_id=descendant_id,
+                depth=ancestor_depth + 1 + descendant_depth
+            )
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree
+        ])
+
+    def rebuild(self):
+        """
+        Recompute every path from the employee table. Used to populate the
+        table and to repair it after bulk updates that bypass Employee.save.
+        Returns the number of paths created.
+        """
+        EmployeeModel = self.model._meta.get_field('ancestor').related_model
+        parents = {
+            pk: manager_id if active else None
+            for pk, manager_id, active in EmployeeModel.objects.order_by()\
+                .values_list('pk', 'manager_id', 'active')
+        }
+        paths = []
+        for pk in parents:
+            ancestor_id = pk
+            depth = 0
+            seen = set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                paths.append(self.model(
+                    ancestor_id=ancestor_id, descendant_id=pk, depth=depth
+                ))
+                ancestor_id = parents.get(ancestor_id)
+                depth += 1
+        self.all().delete()
+        self.bulk_create(paths, batch_size=1000)
+        return len(paths)
+
+
+class ReportingPath(models.Model):
+    """
+    Closure table of the org chart: one row for every (ancestor, descendant)
+    pair in the management chain, including a depth 0 row for each employee.
+    Kept in sync by Employee.save so subtree lookups are a single query.
+    """
+
+    class Meta:
+        verbose_name = _("Reporting Path")
+        verbose_name_plural = _("Reporting Paths")
+        unique_together = ("ancestor", "descendant")
+        indexes = [
+            models.Index(fields=["descendant", "depth"]),
+        ]
+
+    objects = ReportingPathManager()
+
+    def __str__(self):
+        return f"{self.ancestor} > {self.descendant} ({self.depth})"
+
+    ancestor = models.ForeignKey(
+        "people.Employee", related_name="descendant_paths",
+        on_delete=models.CASCADE
+    )
+    descendant = models.ForeignKey(
+        "people.Employee", related_name="ancestor_paths",
+        on_delete=models.CASCADE
+    )
+    depth = models.PositiveSmallIntegerField(default=0)
+
+
 class ManagerUpcomingReviewsManager(models.Manager):
     def get_queryset(self, user):
         queryset = super().get_queryset()
@@ -1288,27 +1503,10 @@ class TeleworkApplication(models.Model):
     
     def program_manager_signature(self, index):
         # Rule out this being someone who does not ultimately report to a program manager
-        if self.employee.is_division_director:
-            return
-        if self.employee.is_executive_director:
-            return
-        if self.employee.manager.is_division_director:
+        if not self.employee.has_program_manager:
             return
         # TODO: HR people? Others?
-
-        # Start by getting the program manager, which is the direct report of the division director
-        current_employee = self.employee
-        while True:
-            if current_employee.is_executive_director:
-                return
-            if current_employee.manager and current_employee.manager.is_division_director:
-                program_manager = current_employee
-                break
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                # If we don't get to a division director somehow
-                return
+        program_manager = self.employee.get_program_manager
         signature = TeleworkSignature.objects.filter(application=self, employee=program_manager, index=index).first()
         if signature:
             return[index, "Program Manager", signature.employee.name, signature.date, None, False] # Not ready to sign because there is a signature
@@ -1323,16 +1521,13 @@ class TeleworkApplication(models.Model):
     
     def division_director_signature(self):
         # Start by getting the division director
-        current_employee = self.employee
-        while True:
-            if current_employee.is_division_director:
-                director = current_employee
-                break
-            if current_employee.manager:
-                current_employee = current_employee.manager
-            else:
-                # If we don't get to a division director somehow
-                return
+        if self.employee.is_division_director:
+            director = self.employee
+        elif self.employee.has_division_director:
+            director = self.employee.get_division_director
+        else:
+            # If we don't get to a division director somehow
+            return
         signature = TeleworkSignature.objects.filter(application=self, employee=director, index=0).first()
         if signature:
             return[0, "Division Director", signature.employee.name, signature.date, None, False] # Not ready to sign because there is a signature
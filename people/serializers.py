@@ -77,8 +77,10 @@ class EmployeeSerializer(serializers.HyperlinkedModelSerializer):
     can_edit_seating_charts = serializers.SerializerMethodField()
     can_view_desk_reservation_reports = serializers.SerializerMethodField()
     is_upper_manager = serializers.SerializerMethodField()
-    prs_can_view = serializers.SerializerMethodField()
+    prs_can_view_count = serializers.SerializerMethodField()
     notes_can_view = serializers.SerializerMethodField()
+    telework_applications_can_view_count = \
+        serializers.SerializerMethodField()
     time_off_requests_can_view = serializers.SerializerMethodField()
     next_to_sign_prs = serializers.SerializerMethodField()
     workflow_roles = serializers.SerializerMethodField()
@@ -100,8 +102,9 @@ class EmployeeSerializer(serializers.HyperlinkedModelSerializer):
             'is_eligible_for_telework_application', 'can_view_seating_charts',
             'can_edit_seating_charts', 'can_view_desk_reservation_reports',
             'is_upper_manager', 'is_hr_manager', 'is_division_director',
-            'is_executive_director', 'viewed_security_message', 'prs_can_view',
-            'notes_can_view', 'telework_applications_can_view',
+            'is_executive_director', 'viewed_security_message',
+            'prs_can_view_count', 'notes_can_view',
+            'telework_applications_can_view_count',
             'time_off_requests_can_view', 'next_to_sign_prs',
             'email_opt_out_all', 'email_opt_out_timeoff_all',
             'email_opt_out_timeoff_weekly', 'email_opt_out_timeoff_daily',
@@ -159,16 +162,16 @@ class EmployeeSerializer(serializers.HyperlinkedModelSerializer):
         return employee.get_direct_reports_descendants().count() != 0
     
     @staticmethod
-    def get_prs_can_view(employee):
-        return employee.prs_can_view()
+    def get_prs_can_view_count(employee):
+        return employee.viewable_performance_reviews().count()
 
     @staticmethod
     def get_notes_can_view(employee):
         return employee.notes_can_view()
 
     @staticmethod
-    def get_telework_applications_can_view(employee):
-        return employee.telework_applications_can_view()
+    def get_telework_applications_can_view_count(employee):
+        return employee.viewable_telework_applications().count()
 
     @staticmethod
     def get_time_off_requests_can_view(employee):
@@ -199,10 +202,7 @@ class EmployeeSerializer(serializers.HyperlinkedModelSerializer):
     
     @staticmethod
     def get_workflow_roles(employee):
-        workflow_roles_ids = map(
-            lambda role: role.id, employee.workflow_roles.all()
-        )
-        return list(workflow_roles_ids)
+        return employee.permissions.workflow_role_ids
 
     @staticmethod
     def get_is_all_workflows_admin(employee):
@@ -0,0 +1,8 @@
+from django.contrib.auth.models import User
+
+from people.models import Employee
+
+
+def create_employee(username, **kwargs):
+    user = User.objects.create(username=username)
+    return Employee.objects.create(user=user, **kwargs)
@@ -0,0 +1,103 @@
+from django.test import TestCase
+
+from people.models import Employee
+from people.tests.helpers import create_employee
+
+
+class ChainOfCommandTestCase(TestCase):
+    def setUp(self):
+        self.executive_director = create_employee(
+            "executivedirector", is_executive_director=True
+        )
+        self.division_director = create_employee(
+            "divisiondirector", is_division_director=True,
+            manager=self.executive_director
+        )
+        self.program_manager = create_employee(
+            "programmanager", manager=self.division_director
+        )
+        self.manager = create_employee(
+            "manager", manager=self.program_manager
+        )
+        self.employee = create_employee("employee", manager=self.manager)
+
+    def reload(self, employee):
+        return Employee.objects.get(pk=employee.pk)
+
+    def test_chain_of_command(self):
+        employee = self.reload(self.employee)
+        self.assertTrue(employee.has_program_manager)
+        self.assertEqual(employee.get_program_manager, self.program_manager)
+        self.assertTrue(employee.has_division_director)
+        self.assertEqual(
+            employee.get_division_director, self.division_director
+        )
+
+        program_manager = self.reload(self.program_manager)
+        self.assertFalse(program_manager.has_program_manager)
+        self.assertEqual(program_manager.get_program_manager, program_manager)
+        self.assertEqual(
+            program_manager.get_division_director, self.division_director
+        )
+
+        division_director = self.reload(self.division_director)
+        self.assertFalse(division_director.has_program_manager)
+        self.assertFalse(division_director.has_division_director)
+        self.assertIsNone(division_director.get_division_director)
+
+        executive_director = self.reload(self.executive_director)
+        self.assertFalse(executive_director.has_program_manager)
+        self.assertFalse(executive_director.has_division_director)
+
+    def test_checks_are_attribute_reads(self):
+        employee = self.reload(self.employee)
+        with self.assertNumQueries(0):
+            employee.has_program_manager
+            employee.has_division_director
+
+    def test_subtree_updated_when_manager_changes(self):
+        other_director = create_employee(
+            "otherdirector", is_division_director=True,
+            manager=self.executive_director
+        )
+        self.manager.manager = other_director
+        self.manager.save()
+        employee = self.reload(self.employee)
+        self.assertEqual(employee.get_program_manager, self.manager)
+        self.assertEqual(employee.get_division_director, other_director)
+
+    def test_subtree_updated_when_director_changes(self):
+        self.program_manager.is_division_director = True
+        self.program_manager.save()
+        employee = self.reload(self.employee)
+        self.assertEqual(employee.get_program_manager, self.manager)
+        self.assertEqual(employee.get_division_director, self.program_manager)
+
+    def test_rebuild(self):
+        Employee.objects.update(program_manager=None, division_director=None)
+        self.assertEqual(Employee.objects.rebuild_chain_of_command(), 3)
+        self.assertEqual(Employee.objects.rebuild_chain_of_command(), 0)
+        employee = self.reload(self.employee)
+        self.assertEqual(employee.get_program_manager, self.program_manager)
+
+    def test_save_only_updates_the_subtree(self):
+        inactive = create_employee(
+            "inactive", active=False, manager=self.manager
+        )
+        for i in range(20):
+            create_employee(f"other{i}", manager=self.division_director)
+        other_director = create_employee(
+            "otherdirector", is_division_director=True,
+            manager=self.executive_director
+        )
+        self.manager.manager = other_director
+        # The same however many employees are outside the subtree
+        with self.assertNumQueries(14):
+            self.manager.save()
+        self.assertEqual(
+            self.reload(inactive).get_division_director, other_director
+        )
+        self.assertEqual(
+            self.reload(self.program_manager).get_division_director,
+            self.division_director
+        )
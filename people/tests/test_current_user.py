@@ -0,0 +1,92 @@
+import datetime
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from people.models import Employee, PerformanceReview
+from workflows.models import Role, Workflow
+
+
+# Queries needed to serialize the current user, independent of how many
+# groups, roles and workflows they have
+CURRENT_USER_QUERY_BUDGET = 13
+
+
+class CurrentUserQueryCountTestCase(TestCase):
+    def setUp(self):
+        manager_user = User.objects.create(username="manager")
+        self.manager = Employee.objects.create(user=manager_user)
+        self.user = User.objects.create(username="employee")
+        self.employee = Employee.objects.create(
+            user=self.user, manager=self.manager
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_permissions(self, start, count):
+        for i in range(start, start + count):
+            group = Group.objects.create(name=f"Group {i}")
+            self.user.groups.add(group)
+            role = Role.objects.create(name=f"Role {i}")
+            role.members.add(self.employee)
+            Workflow.objects.create(name=f"Workflow {i}", role=role)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/current-user/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_budget(self):
+        self.user.groups.add(Group.objects.create(name='Expense Submitter'))
+        role = Role.objects.create(name="All Workflows Admins")
+        role.members.add(self.employee)
+        self.assertLessEqual(self.count_queries(), CURRENT_USER_QUERY_BUDGET)
+
+        response = self.client.get('/api/v1/current-user/')
+        self.assertTrue(response.data['is_expense_submitter'])
+        self.assertFalse(response.data['is_hr_employee'])
+        self.assertTrue(response.data['is_all_workflows_admin'])
+        self.assertEqual(response.data['workflow_roles'], [role.pk])
+
+    def test_query_count_constant(self):
+        self.add_permissions(0, 1)
+        baseline = self.count_queries()
+        self.add_permissions(1, 10)
+        self.assertEqual(self.count_queries(), baseline)
+
+
+    def test_viewable_performance_reviews(self):
+        other = Employee.objects.create(user=User.objects.create(
+            username="other"
+        ))
+        for employee in [self.manager, self.employee, other]:
+            PerformanceReview.objects.create(
+                employee=employee,
+                period_start_date=datetime.date.today(),
+                period_end_date=datetime.date.today(),
+                effective_date=datetime.date.today()
+            )
+        self.assertEqual(
+            set(self.manager.viewable_performance_reviews()),
+            set(PerformanceReview.objects.exclude(employee=other))
+        )
+        self.client.force_authenticate(user=self.manager.user)
+        baseline = self.count_queries()
+        response = self.client.get('/api/v1/current-user/')
+        self.assertEqual(response.data['prs_can_view_count'], 2)
+        self.assertNotIn('prs_can_view', response.data)
+
+        # Adding reviews to the table doesn't add queries
+        for _ in range(5):
+            PerformanceReview.objects.create(
+                employee=self.employee,
+                period_start_date=datetime.date.today(),
+                period_end_date=datetime.date.today(),
+                effective_date=datetime.date.today()
+            )
+        self.assertEqual(self.count_queries(), baseline)
@@ -3,11 +3,12 @@ import datetime
 
 from django.contrib.auth.models import User
 from django.core import mail
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework.test import APIRequestFactory, APIClient
 
 from mainsite.helpers import send_pr_reminder_emails
+from people.helpers import send_pr_signature_reminders
 from people.models import Employee, PerformanceReview, Signature, SignatureReminder
 
 
@@ -697,3 +698,33 @@ class ManagerWritesEvaluationTestCase(BaseEmailRemindersTestCase):
         self.assertEqual(len(hr_manager_notifications['review_to_write_other']), 0)
         self.assertEqual(len(hr_manager_notifications['signature_required']), 0)
         self.assertEqual(len(hr_manager_notifications['signature_required_other']), 1)
+
+
+@override_settings(
+    EMAIL_BACKEND='mainsite.tests.test_outgoing_email.CountingEmailBackend'
+)
+class SignatureFollowUpTestCase(BaseEmailRemindersTestCase):
+    def test_failed_reminders_are_sent_again(self):
+        pr = PerformanceReview.objects.create(
+            employee=self.employee_employee,
+            period_start_date=datetime.date.today(),
+            period_end_date=datetime.date.today(),
+            effective_date=datetime.date.today()
+        )
+        SignatureReminder.objects.all().delete() # Clear other reminders
+        self.program_manager_employee.user.email = 'bounce@example.com'
+        self.program_manager_employee.user.save()
+        sent, bounced = [
+            SignatureReminder.objects.create(
+                review=pr, employee=employee,
+                next_date=datetime.date.today()
+            ) for employee in [
+                self.manager_employee, self.program_manager_employee
+            ]
+        ]
+        self.assertEqual(send_pr_signature_reminders(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        sent.refresh_from_db()
+        bounced.refresh_from_db()
+        self.assertGreater(sent.next_date, datetime.date.today())
+        self.assertEqual(bounced.next_date, datetime.date.today())
@@ -0,0 +1,92 @@
+from django.test import TestCase
+
+from people.models import ReportingPath
+from people.tests.helpers import create_employee
+
+
+class ReportingPathTestCase(TestCase):
+    def setUp(self):
+        self.director = create_employee("director", is_division_director=True)
+        self.program_manager = create_employee("programmanager")
+        self.manager = create_employee("manager")
+        self.employee = create_employee("employee")
+        self.other_employee = create_employee("otheremployee")
+
+        self.program_manager.manager = self.director
+        self.program_manager.save()
+        # Attach the leaves before their manager moves so the subtree is
+        # carried along on the next save
+        self.employee.manager = self.manager
+        self.employee.save()
+        self.other_employee.manager = self.manager
+        self.other_employee.save()
+        self.manager.manager = self.program_manager
+        self.manager.save()
+
+    def pks(self, queryset):
+        return set(queryset.values_list('pk', flat=True))
+
+    def test_descendants(self):
+        self.assertEqual(
+            self.pks(self.director.get_direct_reports_descendants()),
+            {
+                self.program_manager.pk, self.manager.pk, self.employee.pk,
+                self.other_employee.pk
+            }
+        )
+        self.assertEqual(
+            self.pks(self.manager.get_direct_reports_descendants(
+                include_self=True
+            )),
+            {self.manager.pk, self.employee.pk, self.other_employee.pk}
+        )
+        self.assertEqual(
+            self.pks(self.employee.get_direct_reports_descendants()), set()
+        )
+        self.assertEqual(
+            ReportingPath.objects.get(
+                ancestor=self.director, descendant=self.employee
+            ).depth,
+            3
+        )
+
+    def test_descendants_single_query(self):
+        with self.assertNumQueries(1):
+            list(self.director.get_direct_reports_descendants())
+
+    def test_move_subtree(self):
+        self.manager.manager = self.director
+        self.manager.save()
+        self.assertEqual(
+            self.pks(self.program_manager.get_direct_reports_descendants()),
+            set()
+        )
+        self.assertEqual(
+            ReportingPath.objects.get(
+                ancestor=self.director, descendant=self.employee
+            ).depth,
+            2
+        )
+
+    def test_deactivate(self):
+        self.manager.active = False
+        self.manager.save()
+        self.assertEqual(
+            self.pks(self.director.get_direct_reports_descendants()),
+            {self.program_manager.pk}
+        )
+        # An inactive employee still sees their own reports
+        self.assertEqual(
+            self.pks(self.manager.get_descendants_of_employee(self.manager)),
+            {self.manager.pk, self.employee.pk, self.other_employee.pk}
+        )
+
+    def test_rebuild_matches_incremental(self):
+        before = set(ReportingPath.objects.values_list(
+            'ancestor_id', 'descendant_id', 'depth'
+        ))
+        ReportingPath.objects.rebuild()
+        after = set(ReportingPath.objects.values_list(
+            'ancestor_id', 'descendant_id', 'depth'
+        ))
+        self.assertEqual(before, after)
@@ -7,7 +7,9 @@ from django.db.models import Q
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 
-from mainsite.helpers import record_error, send_email, send_email_multiple
+from mainsite.helpers import (
+    build_email, queue_emails, record_error, send_email, send_emails
+)
 from people.models import Employee
 from purchases.models import ExpenseMonth, ExpenseStatement
 
@@ -73,6 +75,8 @@ def send_submitter_monthly_expenses_reminders(sending_user: User):
                         em_last_month or em_month_before_that
                     ) and not em_this_month:
                         recipients.append([sub.user.email, 'last_month'])
+    emails = []
+    dedupe_keys = []
     for recipient in recipients:
         if sending_user.is_anonymous:
             # TODO: Not sure why these are anonymous, but log them for now.
@@ -98,13 +102,19 @@ def send_submitter_monthly_expenses_reminders(sending_user: User):
             'from_email': os.environ.get('FROM_EMAIL')
         }, })
         plaintext_message = strip_tags(html_message)
-        send_email_multiple(
+        emails.append(build_email(
             [recipient[0]],
             ['payadmin@lcog-or.gov'],
             f'Time to enter { curr_month_name } expenses',
             plaintext_message,
             html_message
+        ))
+        # Sending the reminders again in the same month doesn't send twice
+        dedupe_keys.append(
+            f'expenses-monthly-{curr_month_date:%Y-%m}-{recipient[0]}'
         )
+    # Sent from a request, so leave sending to the queued email worker
+    queue_emails(emails, dedupe_keys)
     return len(recipients)
 
 
@@ -200,19 +210,19 @@ def send_approver_weekly_approve_reminders():
             ).exists()
             if gls:
                 recipients.append(approver.user.email)
-    for recipient in recipients:
-        html_message = render_to_string(html_template, { 'context': {
-            'expenses_url': expenses_url,
-            'profile_url': profile_url,
-            'from_email': os.environ.get('FROM_EMAIL')
-        }, })
-        plaintext_message = strip_tags(html_message)
-        send_email(
-            recipient,
-            f'Expenses to approve',
-            plaintext_message,
+    # Everyone gets the same message
+    html_message = render_to_string(html_template, { 'context': {
+        'expenses_url': expenses_url,
+        'profile_url': profile_url,
+        'from_email': os.environ.get('FROM_EMAIL')
+    }, })
+    plaintext_message = strip_tags(html_message)
+    send_emails([
+        build_email(
+            [recipient], [], f'Expenses to approve', plaintext_message,
             html_message
-        )
+        ) for recipient in recipients
+    ])
     
     return len(recipients)
 
@@ -238,19 +248,19 @@ def send_fiscal_weekly_approve_reminders():
             ).exists()
             if ems:
                 recipients.append(fiscal.user.email)
-    for recipient in recipients:
-        html_message = render_to_string(html_template, { 'context': {
-            'expenses_url': expenses_url,
-            'profile_url': profile_url,
-            'from_email': os.environ.get('FROM_EMAIL')
-        }, })
-        plaintext_message = strip_tags(html_message)
-        send_email(
-            recipient,
-            f'Expenses to approve',
-            plaintext_message,
+    # Everyone gets the same message
+    html_message = render_to_string(html_template, { 'context': {
+        'expenses_url': expenses_url,
+        'profile_url': profile_url,
+        'from_email': os.environ.get('FROM_EMAIL')
+    }, })
+    plaintext_message = strip_tags(html_message)
+    send_emails([
+        build_email(
+            [recipient], [], f'Expenses to approve', plaintext_message,
             html_message
-        )
+        ) for recipient in recipients
+    ])
     
     return len(recipients)
 
@@ -1,6 +1,4 @@
 import datetime
-from time import time
-from responsibilities.models import Responsibility
 
 from rest_framework import viewsets
 from rest_framework.decorators import action
@@ -8,18 +6,17 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 
 from django.contrib.auth.models import Group, User
-from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from mainsite.helpers import is_true_string
 
-from people.models import Employee
-
 from timeoff.helpers import (
     send_employee_manager_acknowledged_timeoff_request_notification,
     send_manager_new_timeoff_request_notification
 )
-from timeoff.models import TimeOffRequest, TimeOffRequestTemporaryApprover
+from timeoff.models import (
+    TimeOffDay, TimeOffRequest, TimeOffRequestTemporaryApprover
+)
 
 from timeoff.serializers import (
     ConflictingResponsibilitiesSerializer, TimeOffRequestPrivateSerializer,
@@ -49,29 +46,16 @@ class TimeOffRequestViewSet(viewsets.ModelViewSet):
             if user.is_superuser:
                 return super().get_queryset()
             elif 'managed' in self.request.GET and is_true_string(self.request.GET['managed']):
+                # If this user is a temporary approver for someone else,
+                # also show their requests.
+                managers = TimeOffRequestTemporaryApprover.objects\
+                    .managers_approved_for(user.employee.pk)
                 requests = TimeOffRequest.objects.filter(
-                    employee__manager=user.employee,
+                    employee__manager__in=managers,
                     # Only get requests that are less than 30 days old
                     end_date__gte=\
                         datetime.date.today() - datetime.timedelta(days=60)
                 )
-                # If this user is a temporary approver for someone else,
-                # also show their requests.
-                temporary_approvers = TimeOffRequestTemporaryApprover.objects\
-                    .filter(
-                        employee_in_stead=user.employee,
-                        start_date__lte=datetime.date.today(),
-                        end_date__gte=datetime.date.today()
-                    )
-                for approver in temporary_approvers:
-                    employee_on_leave = approver.employee_on_leave
-                    employee_requests = TimeOffRequest.objects.filter(
-                        employee__manager=employee_on_leave,
-                        # Only get requests that are less than 30 days old
-                        end_date__gte=\
-                            datetime.date.today() - datetime.timedelta(days=60)
-                    )
-                    requests = requests | employee_requests
             elif 'team' in self.request.GET and is_true_string(self.request.GET['team']):
                 # Show requests from everyone including and under your
                 # program manager
@@ -81,10 +65,9 @@ class TimeOffRequestViewSet(viewsets.ModelViewSet):
                 start = self.request.GET.get('start', None)
                 end = self.request.GET.get('end', None)
                 if start and end:
-                    requests = TimeOffRequest.objects.filter(
-                        start_date__gte=start, end_date__lte=end,
-                        employee__in=program_manager_and_descendants
-                    )
+                    requests = TimeOffRequest.objects\
+                        .overlapping(start, end)\
+                        .filter(employee__in=program_manager_and_descendants)
                 else:
                     requests = TimeOffRequest.objects.filter(
                         employee__in=program_manager_and_descendants
@@ -93,13 +76,19 @@ class TimeOffRequestViewSet(viewsets.ModelViewSet):
                 requests = TimeOffRequest.objects.filter(
                     employee=user.employee
                 )
-            for request in requests:
+            requests = requests.select_related(
+                'employee__user', 'employee__manager'
+            )
+            conflicts = TimeOffRequest.objects.conflicting_responsibilities(
+                (r.employee_id, r.start_date, r.end_date) for r in requests
+            )
+            for request, employees in zip(requests, conflicts):
                 request.conflicts = [
                     {
                         'pk': e.pk,
                         'name': e.name,
                         'responsibility_names': e.responsibility_names
-                    } for e in request.conflicting_responsibilities
+                    } for e in employees
                 ]
             return requests
         else:
@@ -157,9 +146,6 @@ class TimeOffRequestViewSet(viewsets.ModelViewSet):
             context={'request': request})
         return Response(serialized_tor.data)
 
-    # TODO: Duplicated in TimeOffRequest model property
-    # TODO: .conflicting_responsibilities. Use a generic helper function to
-    # TODO: handle both?
     # A list of employees with time off requests in the same time period with
     # shared/backup responsibilities.
     @action(detail=False, methods=['post'])
@@ -175,56 +161,60 @@ class TimeOffRequestViewSet(viewsets.ModelViewSet):
             employee = request.data['user'].employee
         else:
             employee = request.user.employee
-        
-        # Get all the employees that share a responsibility with this employee
-        responsibility_buddies = Employee.objects.filter(
-            Q(primary_responsibilities__in=employee.secondary_responsibilities.all()) |
-            Q(secondary_responsibilities__in=employee.primary_responsibilities.all())
-        ).distinct()
 
-        # Get all the time off requests for those employees that conflict with
-        # this request.
-        conflicting_tors = TimeOffRequest.objects\
-            .filter(employee__in=responsibility_buddies)\
-            .exclude(employee=employee)\
-            .exclude(
-                start_date__gt=datetime.date(int(end_year),
-                int(end_month),
-                int(end_day))
-            )\
-            .exclude(
-                end_date__lt=datetime.date(int(start_year),
-                int(start_month),
-                int(start_day))
-            )
-
-        # Prune the buddy list of any employees that don't have any conflicting
-        # time off requests, and then annotate them with the list of shared
-        # responsibilities.
-        # First pass: Remove any responsibility buddies that don't have
-        # conflicting time off requests.
-        for buddy in responsibility_buddies:
-            remove_buddy = True
-            for tor in conflicting_tors:
-                if tor.employee == buddy:
-                    remove_buddy = False
-            if remove_buddy:
-                responsibility_buddies = responsibility_buddies\
-                    .exclude(pk=buddy.pk)
-        # Second pass: Add the responsibility names to the serialized
-        # employees.
-        for buddy in responsibility_buddies:
-            for tor in conflicting_tors:
-                if tor.employee == buddy:
-                    conflicting_responsibilities = Responsibility.objects.filter(
-                        (Q(primary_employee=employee) & Q(secondary_employee=buddy)) |
-                        (Q(secondary_employee=employee) & Q(primary_employee=buddy))
-                    )
-                    buddy.responsibility_names = [
-                        r.name for r in conflicting_responsibilities
-                    ]
+        responsibility_buddies = TimeOffRequest.objects\
+            .conflicting_responsibilities([(
+                employee.pk,
+                datetime.date(int(start_year), int(start_month), int(start_day)),
+                datetime.date(int(end_year), int(end_month), int(end_day))
+            )])[0]
 
         serializer = ConflictingResponsibilitiesSerializer(
             responsibility_buddies, many=True, context={'request': request}
         )
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        For each day from start to end, the number and list of employees
+        off from the user's team: everyone including and under their program
+        manager.
+        """
+        if not request.user.is_authenticated:
+            return Response([])
+        try:
+            start = datetime.date.fromisoformat(request.GET['start'])
+            end = datetime.date.fromisoformat(request.GET['end'])
+        except (KeyError, ValueError):
+            return Response(
+                data="Missing or invalid start or end date", status=400
+            )
+        employee = request.user.employee
+        program_manager_pk = employee.program_manager_id or employee.pk
+        days_off = TimeOffDay.objects\
+            .filter(
+                date__gte=start, date__lte=end,
+                employee__ancestor_paths__ancestor=program_manager_pk
+            )\
+            .order_by('date', 'employee__user__username')\
+            .values_list(
+                'date', 'employee', 'employee__display_name',
+                'employee__user__first_name', 'employee__user__last_name'
+            )
+        absent = {}
+        for date, pk, display_name, first_name, last_name in days_off:
+            employees = absent.setdefault(date, {})
+            employees[pk] = display_name or f'{first_name} {last_name}'.strip()
+        calendar = []
+        for offset in range((end - start).days + 1):
+            date = start + datetime.timedelta(days=offset)
+            employees = absent.get(date, {})
+            calendar.append({
+                'date': date,
+                'count': len(employees),
+                'employees': [
+                    {'pk': pk, 'name': name} for pk, name in employees.items()
+                ]
+            })
+        return Response(calendar)
@@ -1,4 +1,4 @@
-from datetime import date, datetime
+from datetime import datetime
 import os
 
 from django.contrib.sites.models import Site
@@ -23,24 +23,23 @@ def send_manager_new_timeoff_request_notification(tor):
             f'{tor.employee.name} has requested time off from {tor.start_date}'
             f' to {tor.end_date}. View and acknowledge here: {url}'
         )
-    emails = [tor.employee.manager.user.email]
-
-    # If this user is a temporary approver for someone else,
-    # send them the notification as well.
-    temporary_approvers = TimeOffRequestTemporaryApprover.objects.filter(
-        employee_on_leave=tor.employee.manager,
-        start_date__lte=date.today(),
-        end_date__gte=date.today()
+    # Notify the manager, and anyone approving in their stead
+    approvers = TimeOffRequestTemporaryApprover.objects.effective_approvers(
+        tor.employee.manager_id
     )
-    for approver in temporary_approvers:
-        emails.append(approver.employee_in_stead.user.email)
+    approver_emails = dict(
+        Employee.objects.filter(pk__in=approvers)\
+            .values_list('pk', 'user__email')
+    )
+    emails = [approver_emails[pk] for pk in approvers if pk in approver_emails]
 
     send_email_multiple(
         emails,
         [],
         f'New time off request: {tor.employee.name}',
         message,
-        message
+        message,
+        dedupe_key=f'timeoff-request-{tor.pk}'
     )
 
 
@@ -90,7 +89,6 @@ def send_team_timeoff_next_week_report(manager_username: str, team_name: str):
     profile_url = current_site.domain + '/profile'
     manager = Employee.objects.get(user__username=manager_username)
     team = manager.get_descendants_of_employee(manager)
-    tors = TimeOffRequest.objects.filter(employee__in=team)
     
     today = datetime.now().date()
     next_monday = next_weekday(today, 0) # 0=Monday, 1=Tuesday, 2=Wednesday...
@@ -98,26 +96,25 @@ def send_team_timeoff_next_week_report(manager_username: str, team_name: str):
     next_wednesday = next_weekday(next_monday, 2)
     next_thursday = next_weekday(next_monday, 3)
     next_friday = next_weekday(next_monday, 4)
-    
-    monday_tors = tors.filter(
-        start_date__lte=next_monday, end_date__gte=next_monday
-    )
-    tuesday_tors = tors.filter(
-        start_date__lte=next_tuesday, end_date__gte=next_tuesday
-    )
-    wednesday_tors = tors.filter(
-        start_date__lte=next_wednesday, end_date__gte=next_wednesday
-    )
-    thursday_tors = tors.filter(
-        start_date__lte=next_thursday, end_date__gte=next_thursday
-    )
-    friday_tors = tors.filter(
-        start_date__lte=next_friday, end_date__gte=next_friday
+
+    # Fetch the whole week once and sort the requests into days
+    tors = list(
+        TimeOffRequest.objects\
+            .overlapping(next_monday, next_friday)\
+            .filter(employee__in=team)\
+            .select_related('employee__user')
     )
+    monday_tors, tuesday_tors, wednesday_tors, thursday_tors, friday_tors = [
+        [tor for tor in tors if tor.start_date <= day <= tor.end_date]
+        for day in [
+            next_monday, next_tuesday, next_wednesday, next_thursday,
+            next_friday
+        ]
+    ]
 
     num_tors = sum([
-        monday_tors.count(), tuesday_tors.count(), wednesday_tors.count(),
-        thursday_tors.count(), friday_tors.count()
+        len(monday_tors), len(tuesday_tors), len(wednesday_tors),
+        len(thursday_tors), len(friday_tors)
     ])
 
     if num_tors == 0:
@@ -168,11 +165,15 @@ def send_daily_helpdesk_timeoff_today_report():
     team_name = 'IS'
     help_desk = Employee.objects.filter(user__groups__name='IS Help Desk')
     is_team = Employee.objects.filter(user__groups__name='IS Employee')
-    tors = TimeOffRequest.objects.filter(employee__in=is_team)
     
     today = datetime.now().date()
-    today_tors = tors.filter(start_date__lte=today, end_date__gte=today)
-    num_tors = today_tors.count()
+    today_tors = list(
+        TimeOffRequest.objects\
+            .overlapping(today, today)\
+            .filter(employee__in=is_team)\
+            .select_related('employee__user')
+    )
+    num_tors = len(today_tors)
 
     if num_tors == 0:
         return num_tors, len(help_desk)
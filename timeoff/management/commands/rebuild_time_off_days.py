@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from timeoff.models import TimeOffDay
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-day time off table from the time off requests.'
+
+    def handle(self, *args, **options):
+        count = TimeOffDay.objects.rebuild()
+        message = f'{ datetime.now() } - Rebuilt {count} time off days.'
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0067_employee_chain_of_command'),
+        ('timeoff', '0003_timeoffrequesttemporaryapprover'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeoffrequest',
+            index=models.Index(fields=['end_date', 'start_date'], name='timeoff_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeoffrequest',
+            index=models.Index(fields=['employee', 'end_date', 'start_date'], name='timeoff_employee_dates_idx'),
+        ),
+    ]
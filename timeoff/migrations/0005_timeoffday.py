@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 13:04
+
+import django.db.models.deletion
+import timeoff.models
+from django.db import migrations, models
+
+
+def populate_time_off_days(apps, schema_editor):
+    TimeOffDay = apps.get_model('timeoff', 'TimeOffDay')
+    TimeOffDay.objects.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0067_employee_chain_of_command'),
+        ('timeoff', '0004_timeoffrequest_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeOffDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_off_days', to='people.employee')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='timeoff.timeoffrequest')),
+            ],
+            options={
+                'verbose_name': 'Time Off Day',
+                'verbose_name_plural': 'Time Off Days',
+                'indexes': [models.Index(fields=['date', 'employee'], name='timeoff_tim_date_bce4f2_idx')],
+                'unique_together': {('request', 'date')},
+            },
+            managers=[
+                ('objects', timeoff.models.TimeOffDayManager()),
+            ],
+        ),
+        migrations.RunPython(
+            populate_time_off_days, migrations.RunPython.noop
+        ),
+    ]
@@ -1,5 +1,9 @@
+import copy
 import datetime
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q
 from django.utils.translation import gettext as _
@@ -8,11 +12,159 @@ from people.models import Employee
 from responsibilities.models import Responsibility
 
 
+class TimeOffRequestQuerySet(models.QuerySet):
+    def overlapping(self, start_date, end_date):
+        """
+        Requests with any day off between start_date and end_date, inclusive.
+        """
+        return self.filter(start_date__lte=end_date, end_date__gte=start_date)
+
+
+class TimeOffRequestManager(models.Manager.from_queryset(TimeOffRequestQuerySet)):
+    def conflicting_responsibilities(self, checks):
+        """
+        For each (employee pk, start date, end date) in checks, list the
+        employees who share a responsibility with that employee as its primary
+        or secondary and have a time off request overlapping those dates. Each
+        listed employee is annotated with responsibility_names, the names of
+        the shared responsibilities.
+
+        Runs at most three queries however many checks there are.
+        """
+        checks = list(checks)
+        if not checks:
+            return []
+        employee_pks = {employee_pk for employee_pk, start, end in checks}
+
+        # Responsibility buddies of each employee, with the names of the
+        # responsibilities they share, in responsibility name order
+        shared = {}
+        responsibilities = Responsibility.objects\
+            .filter(
+                Q(primary_employee__in=employee_pks) |
+                Q(secondary_employee__in=employee_pks)
+            )\
+            .exclude(primary_employee=None)\
+            .exclude(secondary_employee=None)\
+            .values_list('name', 'primary_employee', 'secondary_employee')
+        for name, primary_pk, secondary_pk in responsibilities:
+            if primary_pk == secondary_pk:
+                continue
+            for employee_pk, buddy_pk in [
+                (primary_pk, secondary_pk), (secondary_pk, primary_pk)
+            ]:
+                if employee_pk in employee_pks:
+                    shared.setdefault(employee_pk, {})\
+                        .setdefault(buddy_pk, []).append(name)
+        buddy_pks = {
+            buddy_pk for buddies in shared.values() for buddy_pk in buddies
+        }
+        if not buddy_pks:
+            return [[] for check in checks]
+
+        # Buddies' time off overlapping any of the checked date ranges
+        time_off = {}
+        requests = self\
+            .overlapping(
+                min(start for employee_pk, start, end in checks),
+                max(end for employee_pk, start, end in checks)
+            )\
+            .filter(employee__in=buddy_pks)\
+            .values_list('employee', 'start_date', 'end_date')
+        for buddy_pk, start_date, end_date in requests:
+            time_off.setdefault(buddy_pk, []).append((start_date, end_date))
+
+        conflicts = []
+        conflicting_pks = set()
+        for employee_pk, start, end in checks:
+            buddies = {
+                buddy_pk: names
+                for buddy_pk, names in shared.get(employee_pk, {}).items()
+                if any(
+                    start_date <= end and end_date >= start
+                    for start_date, end_date in time_off.get(buddy_pk, [])
+                )
+            }
+            conflicts.append(buddies)
+            conflicting_pks.update(buddies)
+        employees = list(
+            Employee.objects.filter(pk__in=conflicting_pks)\
+                .select_related('user')
+        ) if conflicting_pks else []
+
+        results = []
+        for buddies in conflicts:
+            result = []
+            for employee in employees:
+                if employee.pk in buddies:
+                    # Copy so each check has its own responsibility_names
+                    buddy = copy.copy(employee)
+                    buddy.responsibility_names = buddies[employee.pk]
+                    result.append(buddy)
+            results.append(result)
+        return results
+
+
+class TimeOffDayManager(models.Manager):
+    use_in_migrations = True
+
+    def sync(self, tor):
+        """
+        Replace the days recorded for a time off request with one row for each
+        day from its start date to its end date.
+        """
+        start_date, end_date = tor.start_date, tor.end_date
+        if isinstance(start_date, str):
+            start_date = datetime.date.fromisoformat(start_date)
+        if isinstance(end_date, str):
+            end_date = datetime.date.fromisoformat(end_date)
+        self.filter(request=tor).delete()
+        self.bulk_create([
+            self.model(
+                request=tor, employee_id=tor.employee_id,
+                date=start_date + datetime.timedelta(days=offset)
+            ) for offset in range((end_date - start_date).days + 1)
+        ])
+
+    def rebuild(self):
+        """
+        Recompute the days for every time off request. Returns the number of
+        days recorded.
+        """
+        TimeOffRequest = self.model._meta.get_field('request').related_model
+        self.all().delete()
+        days = []
+        for pk, employee_pk, start_date, end_date in TimeOffRequest.objects\
+            .values_list('pk', 'employee_id', 'start_date', 'end_date'):
+            days.extend(
+                self.model(
+                    request_id=pk, employee_id=employee_pk,
+                    date=start_date + datetime.timedelta(days=offset)
+                ) for offset in range((end_date - start_date).days + 1)
+            )
+        self.bulk_create(days, batch_size=1000)
+        return len(days)
+
+
 class TimeOffRequest(models.Model):
     class Meta:
         verbose_name = _("Time Off Request")
         verbose_name_plural = _("Time Off Requests")
         ordering = ordering = ["id"]
+        indexes = [
+            # Overlap lookups bound end_date from below and start_date from
+            # above, for everyone or for a set of employees
+            models.Index(
+                fields=["end_date", "start_date"],
+                name="timeoff_dates_idx"
+            ),
+            models.Index(
+                fields=["employee", "end_date", "start_date"],
+                name="timeoff_employee_dates_idx"
+            )
+        ]
+
+    objects = TimeOffRequestManager()
 
     employee = models.ForeignKey("people.Employee", on_delete=models.CASCADE)
     start_date = models.DateField(auto_now=False, auto_now_add=False)
@@ -25,54 +177,123 @@ class TimeOffRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     acknowledged_at = models.DateTimeField(blank=True, null=True)
 
-    # TODO: Duplicated in TimeOffRequestViewSet action conflicting_responsibilities. Use a generic helper function to handle both?
-    # TODO: Cached property? When/how to break cache?
+    def save(self, *args, **kwargs):
+        if self.pk:
+            previous = TimeOffRequest.objects.filter(pk=self.pk)\
+                .values('employee_id', 'start_date', 'end_date').first()
+        else:
+            previous = None
+        super().save(*args, **kwargs)
+        if previous != {
+            'employee_id': self.employee_id,
+            'start_date': self.start_date,
+            'end_date': self.end_date
+        }:
+            TimeOffDay.objects.sync(self)
+
     @property
     # A list of employees with time off requests in the same time period with
     # shared/backup responsibilities.
     def conflicting_responsibilities(self):
-        start_year, start_month, start_day = self.start_date.year, self.start_date.month, self.start_date.day
-        end_year, end_month, end_day = self.end_date.year, self.end_date.month, self.end_date.day
-        employee = self.employee
-
-        # Get all the employees that share a responsibility with this employee
-        responsibility_buddies = Employee.objects.filter(
-            Q(primary_responsibilities__in=employee.secondary_responsibilities.all()) |
-            Q(secondary_responsibilities__in=employee.primary_responsibilities.all())
-        ).distinct()
-
-        # Get all the time off requests for those employees that conflict with
-        # this request.
-        conflicting_tors = TimeOffRequest.objects\
-            .filter(employee__in=responsibility_buddies)\
-            .exclude(employee=employee)\
-            .exclude(start_date__gt=datetime.date(int(end_year), int(end_month), int(end_day)))\
-            .exclude(end_date__lt=datetime.date(int(start_year), int(start_month), int(start_day)))
-
-        # Prune the buddy list of any employees that don't have any conflicting
-        # time off requests, and then annotate them with the list of shared
-        # responsibilities.
-        # First pass: Remove any responsibility buddies that don't have
-        # conflicting time off requests.
-        for buddy in responsibility_buddies:
-            remove_buddy = True
-            for tor in conflicting_tors:
-                if tor.employee == buddy:
-                    remove_buddy = False
-            if remove_buddy:
-                responsibility_buddies = responsibility_buddies.exclude(pk=buddy.pk)
-        # Second pass: Add the responsibility names to the serialized
-        # employees.
-        for buddy in responsibility_buddies:
-            for tor in conflicting_tors:
-                if tor.employee == buddy:
-                    conflicting_responsibilities = Responsibility.objects.filter(
-                        (Q(primary_employee=employee) & Q(secondary_employee=buddy)) |
-                        (Q(secondary_employee=employee) & Q(primary_employee=buddy))
-                    )
-                    buddy.responsibility_names = [r.name for r in conflicting_responsibilities]
-        
-        return responsibility_buddies
+        return TimeOffRequest.objects.conflicting_responsibilities(
+            [(self.employee_id, self.start_date, self.end_date)]
+        )[0]
+
+
+class TimeOffDay(models.Model):
+    """
+    One row per employee per day off, kept in sync by TimeOffRequest.save and
+    deleted along with its request, so a team calendar for any window is a
+    single query.
+    """
+
+    class Meta:
+        verbose_name = _("Time Off Day")
+        verbose_name_plural = _("Time Off Days")
+        unique_together = ("request", "date")
+        indexes = [
+            models.Index(fields=["date", "employee"]),
+        ]
+
+    objects = TimeOffDayManager()
+
+    def __str__(self):
+        return f"{self.employee} off on {self.date}"
+
+    request = models.ForeignKey(
+        "timeoff.TimeOffRequest", related_name="days",
+        on_delete=models.CASCADE
+    )
+    employee = models.ForeignKey(
+        "people.Employee", related_name="time_off_days",
+        on_delete=models.CASCADE
+    )
+    date = models.DateField()
+
+
+class TimeOffRequestTemporaryApproverManager(models.Manager):
+    # Changed to clear the cached windows of every day at once
+    VERSION_KEY = 'timeoff:temporary_approvers:version'
+
+    def cache_key(self, day):
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            cache.add(self.VERSION_KEY, time.time_ns(), None)
+            version = cache.get(self.VERSION_KEY)
+        return f'timeoff:temporary_approvers:{version}:{day.isoformat()}'
+
+    def active_on(self, day=None):
+        """
+        Return a list of (employee on leave pk, employee in stead pk) for the
+        approver windows that include day, today by default. Cached until the
+        end of the day or until an approver is saved or deleted.
+        """
+        day = day or datetime.date.today()
+        key = self.cache_key(day)
+        pairs = cache.get(key)
+        if pairs is None:
+            pairs = list(
+                self.filter(start_date__lte=day, end_date__gte=day)\
+                    .order_by('pk')\
+                    .values_list('employee_on_leave', 'employee_in_stead')
+            )
+            until_midnight = datetime.datetime.combine(
+                day + datetime.timedelta(days=1), datetime.time.min
+            ) - datetime.datetime.now()
+            timeout = min(
+                settings.LOCAL_CACHE_TIMEOUT,
+                max(int(until_midnight.total_seconds()), 1)
+            )
+            cache.set(key, pairs, timeout)
+        return pairs
+
+    def effective_approvers(self, manager_pk, day=None):
+        """
+        Pks of the employees who approve time off for a manager's direct
+        reports: the manager, then anyone approving in their stead.
+        """
+        approvers = [manager_pk]
+        for on_leave_pk, in_stead_pk in self.active_on(day):
+            if on_leave_pk == manager_pk and in_stead_pk not in approvers:
+                approvers.append(in_stead_pk)
+        return approvers
+
+    def managers_approved_for(self, employee_pk, day=None):
+        """
+        Pks of the managers whose direct reports' time off an employee
+        approves: themself, and anyone they are approving in the stead of.
+        """
+        managers = [employee_pk]
+        for on_leave_pk, in_stead_pk in self.active_on(day):
+            if in_stead_pk == employee_pk and on_leave_pk not in managers:
+                managers.append(on_leave_pk)
+        return managers
+
+    def clear_cache(self):
+        """
+        Clear the cached windows of every day, whichever days changed.
+        """
+        cache.set(self.VERSION_KEY, time.time_ns(), None)
 
 
 class TimeOffRequestTemporaryApprover(models.Model):
@@ -81,6 +302,17 @@ class TimeOffRequestTemporaryApprover(models.Model):
     During this period, approvals that would have gone to this person would
     also go to someone else.
     """
+    objects = TimeOffRequestTemporaryApproverManager()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        TimeOffRequestTemporaryApprover.objects.clear_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        TimeOffRequestTemporaryApprover.objects.clear_cache()
+        return result
+
     employee_on_leave = models.ForeignKey("people.Employee",
         related_name="time_off_request_approvers_on_leave",
         on_delete=models.CASCADE)
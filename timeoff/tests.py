@@ -1,3 +1,318 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from rest_framework.test import APIClient
+
+from mainsite.helpers import next_weekday, send_queued_emails
+from people.models import Employee
+from responsibilities.models import Responsibility
+from timeoff.helpers import (
+    send_manager_new_timeoff_request_notification,
+    send_team_timeoff_next_week_report
+)
+from timeoff.models import (
+    TimeOffDay, TimeOffRequest, TimeOffRequestTemporaryApprover
+)
+
+
+class ConflictingResponsibilitiesTestCase(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave = [
+            Employee.objects.create(
+                user=User.objects.create(
+                    username=username, first_name=username.title()
+                )
+            ) for username in ["alice", "bob", "carol", "dave"]
+        ]
+        # Bob backs up Alice's payroll and phones, and Alice backs up Carol's
+        # mail. Dave shares nothing with Alice.
+        Responsibility.objects.create(
+            name="Phones", primary_employee=self.alice,
+            secondary_employee=self.bob
+        )
+        Responsibility.objects.create(
+            name="Payroll", primary_employee=self.alice,
+            secondary_employee=self.bob
+        )
+        Responsibility.objects.create(
+            name="Mail", primary_employee=self.carol,
+            secondary_employee=self.alice
+        )
+        Responsibility.objects.create(
+            name="Copier", primary_employee=self.dave
+        )
+        self.alice_request = TimeOffRequest.objects.create(
+            employee=self.alice,
+            start_date=date(2025, 3, 3), end_date=date(2025, 3, 7)
+        )
+        TimeOffRequest.objects.create(
+            employee=self.bob,
+            start_date=date(2025, 3, 7), end_date=date(2025, 3, 10)
+        )
+        TimeOffRequest.objects.create(
+            employee=self.carol,
+            start_date=date(2025, 2, 24), end_date=date(2025, 2, 28)
+        )
+        TimeOffRequest.objects.create(
+            employee=self.dave,
+            start_date=date(2025, 3, 3), end_date=date(2025, 3, 3)
+        )
+
+    def conflicts(self, employees):
+        return [
+            (employee.user.username, employee.responsibility_names)
+            for employee in employees
+        ]
+
+    def test_conflicts_for_a_batch_of_requests(self):
+        checks = [
+            (self.alice.pk, date(2025, 3, 3), date(2025, 3, 7)),
+            (self.alice.pk, date(2025, 2, 27), date(2025, 2, 27)),
+            (self.bob.pk, date(2025, 3, 10), date(2025, 3, 10)),
+            (self.dave.pk, date(2025, 3, 3), date(2025, 3, 3))
+        ]
+        with self.assertNumQueries(3):
+            results = TimeOffRequest.objects.conflicting_responsibilities(
+                checks
+            )
+        self.assertEqual([self.conflicts(r) for r in results], [
+            [('bob', ['Payroll', 'Phones'])],
+            [('carol', ['Mail'])],
+            [],
+            []
+        ])
+        self.assertEqual(
+            self.conflicts(self.alice_request.conflicting_responsibilities),
+            [('bob', ['Payroll', 'Phones'])]
+        )
+
+    def test_conflicting_responsibilities_endpoint(self):
+        self.alice.manager = self.dave
+        self.alice.save()
+        client = APIClient()
+        client.force_authenticate(self.alice.user)
+        response = client.post(
+            '/api/v1/timeoffrequest/conflicting_responsibilities',
+            {'dates': {'from': '2025/02/28', 'to': '2025/03/07'}},
+            format='json'
+        )
+        self.assertEqual(
+            [(e['name'], e['responsibility_names']) for e in response.data],
+            [('Bob', ['Payroll', 'Phones']), ('Carol', ['Mail'])]
+        )
+
+        response = client.get('/api/v1/timeoffrequest')
+        self.assertEqual(
+            [r['conflicts'] for r in response.data['results']],
+            [[{
+                'pk': self.bob.pk, 'name': 'Bob',
+                'responsibility_names': ['Payroll', 'Phones']
+            }]]
+        )
+
+
+class TeamTimeOffNextWeekReportTestCase(TestCase):
+    def setUp(self):
+        self.manager, self.bob, self.carol, self.outsider = [
+            Employee.objects.create(
+                user=User.objects.create(
+                    username=username, first_name=username.title(),
+                    email=f'{username}@example.com'
+                )
+            ) for username in ["manager", "bob", "carol", "outsider"]
+        ]
+        for employee in [self.bob, self.carol]:
+            employee.manager = self.manager
+            employee.save()
+        self.next_monday = next_weekday(date.today(), 0)
+
+    def request(self, employee, first_day, last_day):
+        TimeOffRequest.objects.create(
+            employee=employee,
+            start_date=self.next_monday + timedelta(days=first_day),
+            end_date=self.next_monday + timedelta(days=last_day)
+        )
+
+    def test_overlapping(self):
+        self.request(self.bob, -3, 0)
+        self.request(self.carol, 4, 10)
+        self.request(self.outsider, -5, -1)
+        self.assertEqual(
+            TimeOffRequest.objects.overlapping(
+                self.next_monday, self.next_monday + timedelta(days=4)
+            ).count(),
+            2
+        )
+
+    def test_days_are_sorted_from_one_query(self):
+        # Bob is out Friday to Wednesday and Carol on Friday
+        self.request(self.bob, -3, 2)
+        self.request(self.carol, 4, 4)
+        self.request(self.outsider, 1, 1)
+        self.request(self.carol, 7, 8)
+
+        self.assertEqual(
+            send_team_timeoff_next_week_report('manager', 'Test'), (4, 3)
+        )
+        send_queued_emails()
+        self.assertEqual(len(mail.outbox), 1)
+        html = mail.outbox[0].alternatives[0][0]
+        days = html.split('<strong>')[1:]
+        self.assertEqual(
+            [day.count('<li>') for day in days], [1, 1, 1, 0, 1]
+        )
+        self.assertIn('Carol', days[4])
+        self.assertNotIn('Outsider', html)
+
+
+class TeamCalendarTestCase(TestCase):
+    def setUp(self):
+        self.manager, self.bob, self.carol, self.outsider = [
+            Employee.objects.create(
+                user=User.objects.create(
+                    username=username, first_name=username.title()
+                )
+            ) for username in ["manager", "bob", "carol", "outsider"]
+        ]
+        director = Employee.objects.create(
+            user=User.objects.create(username="director"),
+            is_division_director=True
+        )
+        # The manager is the program manager of Bob and Carol
+        for employee, manager in [
+            (self.manager, director), (self.bob, self.manager),
+            (self.carol, self.bob)
+        ]:
+            employee.manager = manager
+            employee.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.carol.user)
+
+    def calendar(self, start, end):
+        response = self.client.get(
+            '/api/v1/timeoffrequest/calendar', {'start': start, 'end': end}
+        )
+        return [
+            (day['date'], day['count'], [e['name'] for e in day['employees']])
+            for day in response.data
+        ]
+
+    def test_days_follow_request_changes(self):
+        bob_request = TimeOffRequest.objects.create(
+            employee=self.bob,
+            start_date=date(2025, 3, 3), end_date=date(2025, 3, 5)
+        )
+        TimeOffRequest.objects.create(
+            employee=self.carol,
+            start_date=date(2025, 3, 5), end_date=date(2025, 3, 5)
+        )
+        TimeOffRequest.objects.create(
+            employee=self.outsider,
+            start_date=date(2025, 3, 4), end_date=date(2025, 3, 4)
+        )
+        self.assertEqual(TimeOffDay.objects.count(), 5)
+
+        with self.assertNumQueries(1):
+            calendar = self.calendar('2025-03-02', '2025-03-06')
+        self.assertEqual(calendar, [
+            (date(2025, 3, 2), 0, []),
+            (date(2025, 3, 3), 1, ['Bob']),
+            (date(2025, 3, 4), 1, ['Bob']),
+            (date(2025, 3, 5), 2, ['Bob', 'Carol']),
+            (date(2025, 3, 6), 0, [])
+        ])
+
+        bob_request.start_date = date(2025, 3, 6)
+        bob_request.end_date = date(2025, 3, 6)
+        bob_request.save()
+        self.assertEqual(
+            [count for day, count, names in self.calendar('2025-03-03', '2025-03-06')],
+            [0, 0, 1, 1]
+        )
+
+        bob_request.delete()
+        self.assertEqual(TimeOffDay.objects.count(), 2)
+        self.assertEqual(TimeOffDay.objects.rebuild(), 2)
+
+
+class TemporaryApproverTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager, self.stand_in, self.bob, self.carol = [
+            Employee.objects.create(
+                user=User.objects.create(
+                    username=username, email=f'{username}@example.com'
+                )
+            ) for username in ["manager", "stand_in", "bob", "carol"]
+        ]
+        self.bob.manager = self.manager
+        self.bob.save()
+        self.carol.manager = self.stand_in
+        self.carol.save()
+        today = date.today()
+        self.approver = TimeOffRequestTemporaryApprover.objects.create(
+            employee_on_leave=self.manager, employee_in_stead=self.stand_in,
+            start_date=today - timedelta(days=1),
+            end_date=today + timedelta(days=1)
+        )
+        # An approver window that has already closed
+        TimeOffRequestTemporaryApprover.objects.create(
+            employee_on_leave=self.manager, employee_in_stead=self.carol,
+            start_date=today - timedelta(days=10),
+            end_date=today - timedelta(days=5)
+        )
+        self.bob_request = TimeOffRequest.objects.create(
+            employee=self.bob, start_date=today, end_date=today
+        )
+        self.carol_request = TimeOffRequest.objects.create(
+            employee=self.carol, start_date=today, end_date=today
+        )
+
+    def managed(self, employee):
+        client = APIClient()
+        client.force_authenticate(employee.user)
+        response = client.get('/api/v1/timeoffrequest', {'managed': 'true'})
+        return [r['pk'] for r in response.data['results']]
+
+    def test_effective_approvers(self):
+        approvers = TimeOffRequestTemporaryApprover.objects
+        self.assertEqual(
+            approvers.effective_approvers(self.manager.pk),
+            [self.manager.pk, self.stand_in.pk]
+        )
+        # Cached for the rest of the day
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                approvers.managers_approved_for(self.stand_in.pk),
+                [self.stand_in.pk, self.manager.pk]
+            )
+
+        self.assertEqual(
+            self.managed(self.stand_in),
+            [self.bob_request.pk, self.carol_request.pk]
+        )
+        send_manager_new_timeoff_request_notification(self.bob_request)
+        send_queued_emails()
+        self.assertEqual(
+            mail.outbox[-1].to, ['manager@example.com', 'stand_in@example.com']
+        )
+
+        self.approver.delete()
+        self.assertEqual(self.managed(self.stand_in), [self.carol_request.pk])
+
+    def test_saving_clears_each_cached_day(self):
+        approvers = TimeOffRequestTemporaryApprover.objects
+        tomorrow = date.today() + timedelta(days=1)
+        next_week = date.today() + timedelta(days=7)
+        self.assertEqual(len(approvers.active_on(tomorrow)), 1)
+        self.assertEqual(approvers.active_on(next_week), [])
+
+        self.approver.start_date = next_week
+        self.approver.end_date = next_week
+        self.approver.save()
+        self.assertEqual(approvers.active_on(tomorrow), [])
+        self.assertEqual(len(approvers.active_on(next_week)), 1)
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.forms import BaseInlineFormSet, ModelForm
 from django.urls import reverse
 from django.utils.safestring import mark_safe
@@ -186,6 +186,21 @@ def duplicate_process(modeladmin, request, queryset):
                         choice.next_step = new_next_step
                         choice.save()
 
+        process.compile_step_graph()
+
+
+def compile_step_graph(request, process):
+    """
+    Recompile a process's step distances after its steps or choices are saved
+    in the admin, and warn if any step leads back to an earlier one.
+    """
+    if process.compile_step_graph():
+        messages.warning(
+            request,
+            f"{process} has steps that lead back to earlier steps. Progress "
+            "is measured along the quickest path through the process."
+        )
+
 
 @admin.register(Process)
 class ProcessAdmin(admin.ModelAdmin):
@@ -195,6 +210,10 @@ class ProcessAdmin(admin.ModelAdmin):
     inlines = (StepInline,)
     actions = [duplicate_process]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        compile_step_graph(request, form.instance)
+
 
 class StepChoiceInline(admin.TabularInline):
     model = StepChoice
@@ -213,6 +232,15 @@ class StepAdmin(admin.ModelAdmin):
     form = StepForm
     inlines = (StepChoiceInline,)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        compile_step_graph(request, form.instance.process)
+
+    def delete_model(self, request, obj):
+        process = obj.process
+        super().delete_model(request, obj)
+        process.compile_step_graph()
+
 
 @admin.register(Action)
 class ActionAdmin(admin.ModelAdmin):
@@ -6,9 +6,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.utils.timezone import get_current_timezone
 
+from mainsite.api_views import LargeResultsSetPagination
 from mainsite.helpers import is_true_string, prop_in_obj, record_error
 
 from people.models import Employee, JobTitle, UnitOrProgram
@@ -34,6 +37,29 @@ from workflows.serializers import (
 )
 
 
+# Process instances with their current steps, for deciding whether a workflow
+# instance requires action without a query per process instance
+WORKFLOW_INSTANCE_PIS_PREFETCH = Prefetch(
+    'pis',
+    queryset=ProcessInstance.objects.select_related(
+        'current_step_instance__step'
+    )
+)
+
+# Query plan for listing workflow instances, so that the number of queries
+# does not grow with the number of rows: the transition with its submitter and
+# title, the workflow with its role and the creator with their workflow
+# options are joined, and process instances are prefetched with their current
+# steps
+WORKFLOW_INSTANCE_LIST_SELECT = [
+    'created_by', 'transition__submitter__user', 'transition__title',
+    'workflow__role'
+]
+WORKFLOW_INSTANCE_LIST_PREFETCH = [
+    'created_by__workflow_options', WORKFLOW_INSTANCE_PIS_PREFETCH
+]
+
+
 class WorkflowViewSet(viewsets.ModelViewSet):
     queryset = Workflow.objects.all()
     serializer_class = WorkflowSerializer
@@ -65,6 +91,7 @@ class WorkflowViewSet(viewsets.ModelViewSet):
 class WorkflowInstanceViewSet(viewsets.ModelViewSet):
     queryset = WorkflowInstance.objects.all()
     serializer_class = WorkflowInstanceSerializer
+    pagination_class = LargeResultsSetPagination
     # permission_classes = [
     #     IsAuthenticatedOrReadOnly
     # ]
@@ -77,43 +104,39 @@ class WorkflowInstanceViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-
+        Workflow instances the user can view, filtered by archived and
+        complete, with everything the list serializers read loaded up front.
         """
         user = self.request.user
-        if user.is_authenticated:
-            wfs_can_view = filter(
-                lambda x: x['display'],
-                user.employee.workflow_display_options()
-            )
-            wfs_can_view_ids = list(map(lambda x: x['id'], wfs_can_view))
-            archived = self.request.query_params.get('archived', None)
-            if archived is not None and is_true_string(archived):
-                # Archived WFIs
-                return WorkflowInstance.inactive_objects.filter(
-                    workflow__id__in=wfs_can_view_ids
-                ).order_by('-started_at').select_related(
-                    'transition', 'workflow', 'workflow__role'
-                ).prefetch_related('pis')
-            elif archived is not None and not is_true_string(archived):
-                complete = self.request.query_params.get('complete', None)
-                if complete is not None and is_true_string(complete):
-                    # Complete WFIs
-                    return WorkflowInstance.active_objects.filter(
-                        workflow__id__in=wfs_can_view_ids, complete=True
-                    ).order_by('-completed_at').select_related(
-                        'transition', 'workflow', 'workflow__role'
-                    ).prefetch_related('pis')
-                elif complete is not None and not is_true_string(complete):
-                    # Current active WFIs
-                    return WorkflowInstance.active_objects.filter(
-                        workflow__id__in=wfs_can_view_ids, complete=False
-                    ).order_by('started_at').select_related(
-                        'transition', 'workflow', 'workflow__role'
-                    ).prefetch_related('pis')
-            return WorkflowInstance.objects.all()
-        else:
+        if not user.is_authenticated:
             return WorkflowInstance.objects.none()
-
+        queryset = WorkflowInstance.objects.all()
+        wfs_can_view = filter(
+            lambda x: x['display'],
+            user.employee.workflow_display_options()
+        )
+        wfs_can_view_ids = list(map(lambda x: x['id'], wfs_can_view))
+        archived = self.request.query_params.get('archived', None)
+        if archived is not None and is_true_string(archived):
+            # Archived WFIs
+            queryset = WorkflowInstance.inactive_objects.filter(
+                workflow__id__in=wfs_can_view_ids
+            ).order_by('-started_at')
+        elif archived is not None and not is_true_string(archived):
+            complete = self.request.query_params.get('complete', None)
+            if complete is not None and is_true_string(complete):
+                # Complete WFIs
+                queryset = WorkflowInstance.active_objects.filter(
+                    workflow__id__in=wfs_can_view_ids, complete=True
+                ).order_by('-completed_at')
+            elif complete is not None and not is_true_string(complete):
+                # Current active WFIs
+                queryset = WorkflowInstance.active_objects.filter(
+                    workflow__id__in=wfs_can_view_ids, complete=False
+                ).order_by('started_at')
+        return queryset.select_related(
+            *WORKFLOW_INSTANCE_LIST_SELECT
+        ).prefetch_related(*WORKFLOW_INSTANCE_LIST_PREFETCH)
 
     def create(self, request):
         wf_type = request.data['type']
@@ -479,7 +502,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
             transition = EmployeeTransition.objects.get(pk=pk)
             if request.data['type'] == 'SDS':
                 transition.assignee = EmployeeTransition.ASSIGNEE_HIRING_LEAD
-                transition.save()
+                transition.save(update_fields=['assignee'])
                 send_transition_sds_hiring_leads_email(
                     transition,
                     extra_message=request.data['extraMessage'],
@@ -493,7 +516,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                 )
             elif request.data['type'] == 'FI':
                 transition.assignee = EmployeeTransition.ASSIGNEE_FISCAL
-                transition.save()
+                transition.save(update_fields=['assignee'])
                 send_transition_fiscal_email(
                     transition,
                     extra_message=request.data['extraMessage'],
@@ -511,7 +534,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                     )
             elif request.data['type'] == 'HR':
                 transition.assignee = EmployeeTransition.ASSIGNEE_HR
-                transition.save()
+                transition.save(update_fields=['assignee'])
                 send_transition_hr_email(
                     transition,
                     extra_message=request.data['extraMessage'],
@@ -521,7 +544,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                 )
             elif request.data['type'] == 'STN':
                 transition.assignee = EmployeeTransition.ASSIGNEE_COMPLETE
-                transition.save()
+                transition.save(update_fields=['assignee'])
                 send_transition_stn_email(
                     transition,
                     update=request.data['update'],
@@ -533,7 +556,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
             elif request.data['type'] == 'ASSIGN':
                 if request.data['reassignTo'] == 'Submitter':
                     transition.assignee = EmployeeTransition.ASSIGNEE_SUBMITTER
-                    transition.save()
+                    transition.save(update_fields=['assignee'])
                     send_transition_submitter_email(
                         transition,
                         extra_message=request.data['extraMessage'],
@@ -544,7 +567,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                     )
                 elif request.data['reassignTo'] == 'Hiring Lead':
                     transition.assignee = EmployeeTransition.ASSIGNEE_HIRING_LEAD
-                    transition.save()
+                    transition.save(update_fields=['assignee'])
                     send_transition_sds_hiring_leads_email(
                         transition,
                         extra_message=request.data['extraMessage'],
@@ -555,7 +578,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                     )
                 elif request.data['reassignTo'] == 'Fiscal':
                     transition.assignee = EmployeeTransition.ASSIGNEE_FISCAL
-                    transition.save()
+                    transition.save(update_fields=['assignee'])
                     send_transition_fiscal_email(
                         transition,
                         extra_message=request.data['extraMessage'],
@@ -566,7 +589,7 @@ class EmployeeTransitionViewSet(viewsets.ModelViewSet):
                     )
                 elif request.data['reassignTo'] == 'HR':
                     transition.assignee = EmployeeTransition.ASSIGNEE_HR
-                    transition.save()
+                    transition.save(update_fields=['assignee'])
                     send_transition_hr_email(
                         transition,
                         extra_message=request.data['extraMessage'],
@@ -684,6 +707,24 @@ class StepViewSet(viewsets.ModelViewSet):
             queryset = Step.objects.none()
         return queryset
 
+    # Recompile the process's step graph after each change, as the admin
+    # does, so that step counts don't use stale distances
+    def perform_create(self, serializer):
+        step = serializer.save()
+        step.process.compile_step_graph()
+
+    def perform_update(self, serializer):
+        old_process = serializer.instance.process
+        step = serializer.save()
+        old_process.compile_step_graph()
+        if step.process_id != old_process.pk:
+            step.process.compile_step_graph()
+
+    def perform_destroy(self, instance):
+        process = instance.process
+        instance.delete()
+        process.compile_step_graph()
+
 
 class StepChoiceViewSet(viewsets.ModelViewSet):
     queryset = StepChoice.objects.all()
@@ -703,6 +744,23 @@ class StepChoiceViewSet(viewsets.ModelViewSet):
             queryset = StepChoice.objects.none()
         return queryset
 
+    # Recompile the step's process, as for steps
+    def perform_create(self, serializer):
+        choice = serializer.save()
+        choice.step.process.compile_step_graph()
+
+    def perform_update(self, serializer):
+        old_process = serializer.instance.step.process
+        choice = serializer.save()
+        old_process.compile_step_graph()
+        if choice.step.process_id != old_process.pk:
+            choice.step.process.compile_step_graph()
+
+    def perform_destroy(self, instance):
+        process = instance.step.process
+        instance.delete()
+        process.compile_step_graph()
+
 
 class StepInstanceViewSet(viewsets.ModelViewSet):
     queryset = StepInstance.objects.all()
@@ -722,6 +780,7 @@ class StepInstanceViewSet(viewsets.ModelViewSet):
             queryset = StepInstance.objects.none()
         return queryset
     
+    @transaction.atomic
     def partial_update(self, request, pk=None):
         """
         Complete or undo completion of a step instance
@@ -5,11 +5,15 @@ import pytz
 from django.apps import apps
 from django.contrib.auth.models import Group
 from django.contrib.sites.models import Site
+from django.db.models import Prefetch
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 
-from mainsite.helpers import readable_date, send_email, send_email_multiple
-from people.models import JobTitle
+from mainsite.helpers import (
+    build_email, num_sent, readable_date, send_email, send_email_multiple,
+    send_emails
+)
+from people.models import Employee, JobTitle
 from workflows.models import (
     EmployeeTransition, ProcessInstance, Role, WorkflowInstance
 )
@@ -377,10 +381,31 @@ def send_step_completion_email(si, old_si=None):
     ]
 
     send_email_multiple(
-        to_addresses, [], subject, plaintext_message, html_message
+        to_addresses, [], subject, plaintext_message, html_message,
+        dedupe_key=f'step-completion-{si.pk}'
+    )
+
+# Process instances with what the weekly reminders and report show for each:
+# the process, the current step and the members of its role
+WEEKLY_PIS_PREFETCH = Prefetch(
+    'pis',
+    queryset=ProcessInstance.objects.select_related(
+        'process', 'current_step_instance__step__role'
+    ).prefetch_related(
+        Prefetch(
+            'current_step_instance__step__role__members',
+            queryset=Employee.objects.select_related('user')
+        )
     )
+)
+
+def current_step_assignees(pi):
+    si = pi.current_step_instance
+    if si and si.step and si.step.role:
+        return si.step.role.members.all()
+    return []
 
-def send_weekly_step_reminders():
+def send_weekly_step_reminders(dry_run=False):
     # Every week on Monday, send reminders to all employees who have
     # steps assigned to them that are not yet complete.
     current_site = Site.objects.get_current()
@@ -394,11 +419,11 @@ def send_weekly_step_reminders():
     
     incomplete_workflow_instances = WorkflowInstance.objects.filter(
         active=True, complete=False
-    ).prefetch_related('pis')
+    ).prefetch_related(WEEKLY_PIS_PREFETCH)
     employees = {}
     for wfi in incomplete_workflow_instances:
         for pi in wfi.pis.all():
-            for assignee in pi.current_step_instance.step.role.members.all() if pi.current_step_instance.step.role else []:
+            for assignee in current_step_assignees(pi):
                 if assignee not in employees:
                     employees[assignee] = []
                 employees[assignee].append({
@@ -408,7 +433,7 @@ def send_weekly_step_reminders():
                     'pi_url': url % wfi.pk
                 })
 
-    sent_emails = 0
+    emails = []
     for employee, steps in employees.items():
         if not employee.should_receive_email_of_type('workflows', 'processes'):
             continue
@@ -419,12 +444,16 @@ def send_weekly_step_reminders():
         })
         plaintext_message = strip_tags(html_message)
 
-        send_email(employee.user.email, subject, plaintext_message, html_message)
-        sent_emails += 1
-    
-    return sent_emails
+        emails.append(build_email(
+            [employee.user.email], [], subject, plaintext_message,
+            html_message
+        ))
+
+    if dry_run:
+        return len(emails)
+    return num_sent(send_emails(emails))
 
-def send_employee_transition_report():
+def send_employee_transition_report(dry_run=False):
     current_site = Site.objects.get_current()
     workflows_url = current_site.domain + '/workflows/dashboard'
     profile_url = current_site.domain + '/profile'
@@ -435,7 +464,9 @@ def send_employee_transition_report():
             'employee-new', 'employee-name-change', 'employee-change',
             'employee-return', 'employee-exit'
         ]
-    ).order_by('transition__transition_date').prefetch_related('pis')
+    ).order_by('transition__transition_date').select_related(
+        'transition__title'
+    ).prefetch_related(WEEKLY_PIS_PREFETCH)
     current_wfis = [{
         'pk': wfi.pk,
         'percent_complete': wfi.percent_complete,
@@ -456,8 +487,8 @@ def send_employee_transition_report():
                 'percent_complete': pi.percent_complete,
                 'assigned_ago': pi.current_step_instance.duration.days if pi.current_step_instance else None,
                 'assignees': [
-                    member.name for member in pi.current_step_instance.step.role.members.all()
-                ] if pi.current_step_instance and pi.current_step_instance.step and pi.current_step_instance.step.role else ['No one!']
+                    member.name for member in current_step_assignees(pi)
+                ] or ['No one!']
             } for pi in wfi.pis.all()
         ]
     } for wfi in current_wfis]
@@ -470,7 +501,7 @@ def send_employee_transition_report():
         ],
         completed_at__gte=datetime.now() - timedelta(days=10),
         completed_at__lt=datetime.now()
-    )
+    ).select_related('transition__title')
     last_week_wfis = [{
         'pk': wfi.pk,
         'completed_at': wfi.completed_at,
@@ -495,15 +526,16 @@ def send_employee_transition_report():
     # Send to the appropriate workflow admins
     to_employees = Role.objects.get(
         name='Employee Transition Management'
-    ).members.all()
+    ).members.select_related('user')
     to_addresses = [
         e.user.email for e in to_employees if \
         e.should_receive_email_of_type('workflows', 'transitions')
     ]
 
-    send_email_multiple(
-        to_addresses, [], subject, plaintext_message, html_message
-    )
+    if not dry_run:
+        send_emails([build_email(
+            to_addresses, [], subject, plaintext_message, html_message
+        )])
     
     return len(to_addresses)
 
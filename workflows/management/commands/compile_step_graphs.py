@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from workflows.models import Process
+
+
+class Command(BaseCommand):
+    help = 'Recompiles the step distances of every process.'
+
+    def handle(self, *args, **options):
+        processes = Process.objects.all()
+        cycles = [process for process in processes if process.compile_step_graph()]
+        message = f'{ datetime.now() } - Compiled {len(processes)} processes.'
+        self.stdout.write(self.style.SUCCESS(message))
+        for process in cycles:
+            self.stdout.write(
+                self.style.WARNING(f'    { process } has a cycle.')
+            )
@@ -1,16 +1,35 @@
 from datetime import datetime
+import time
 
 from django.core.management.base import BaseCommand
 
+from mainsite.helpers import count_queries
 from workflows.helpers import send_employee_transition_report
 
 
 class Command(BaseCommand):
     help = 'Sends next week time off email to members of the IS team'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Build the report without sending it, and report the '
+                'queries and time taken'
+        )
+
     def handle(self, *args, **options):
-        num_employees = send_employee_transition_report()
-        dt = datetime.now()
-        message = f'{dt} - Sent current employee transitions notification ' + \
-            f'to {num_employees} managers.'
-        self.stdout.write(self.style.SUCCESS(message))
\ No newline at end of file
+        if options['dry_run']:
+            start = time.monotonic()
+            with count_queries() as queries:
+                num_employees = send_employee_transition_report(dry_run=True)
+            seconds = time.monotonic() - start
+            dt = datetime.now()
+            message = f'{dt} - Dry run: built the current employee ' + \
+                f'transitions notification for {num_employees} managers ' + \
+                f'in {len(queries)} queries and {seconds:.2f} seconds.'
+        else:
+            num_employees = send_employee_transition_report()
+            dt = datetime.now()
+            message = f'{dt} - Sent current employee transitions ' + \
+                f'notification to {num_employees} managers.'
+        self.stdout.write(self.style.SUCCESS(message))
@@ -1,16 +1,35 @@
 from datetime import datetime
+import time
 
 from django.core.management.base import BaseCommand
 
+from mainsite.helpers import count_queries
 from workflows.helpers import send_weekly_step_reminders
 
 
 class Command(BaseCommand):
     help = 'Sends weekly step reminder email to workflow workhorses'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Build the reminders without sending them, and report the '
+                'queries and time taken'
+        )
+
     def handle(self, *args, **options):
-        num_employees = send_weekly_step_reminders()
-        dt = datetime.now()
-        message = f'{dt} - Sent weekly step reminders to ' + \
-            f'{num_employees} workflow workhorses.'
+        if options['dry_run']:
+            start = time.monotonic()
+            with count_queries() as queries:
+                num_employees = send_weekly_step_reminders(dry_run=True)
+            seconds = time.monotonic() - start
+            dt = datetime.now()
+            message = f'{dt} - Dry run: built weekly step reminders for ' + \
+                f'{num_employees} workflow workhorses in ' + \
+                f'{len(queries)} queries and {seconds:.2f} seconds.'
+        else:
+            num_employees = send_weekly_step_reminders()
+            dt = datetime.now()
+            message = f'{dt} - Sent weekly step reminders to ' + \
+                f'{num_employees} workflow workhorses.'
         self.stdout.write(self.style.SUCCESS(message))
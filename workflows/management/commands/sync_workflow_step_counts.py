@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from workflows.models import ProcessInstance, WorkflowInstance
+
+
+class Command(BaseCommand):
+    help = 'Backfills the step counters of every ProcessInstance and the ' \
+           'percent complete of every WorkflowInstance. With --check, only ' \
+           'reports counters that are out of date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Report out of date counters without changing them'
+        )
+
+    def handle(self, *args, **options):
+        stale = []
+        pis = ProcessInstance.objects.select_related(
+            'process', 'current_step_instance__step'
+        )
+        for pi in pis:
+            counters = (pi.steps_completed, pi.steps_total)
+            pi.count_steps()
+            if counters != (pi.steps_completed, pi.steps_total):
+                stale.append(pi)
+                self.stdout.write(
+                    f'    { pi }: { counters[0] }/{ counters[1] } should be '
+                    f'{ pi.steps_completed }/{ pi.steps_total }'
+                )
+        if options['check']:
+            message = f'{ datetime.now() } - { len(stale) } of ' \
+                f'{ len(pis) } ProcessInstances have out of date step counts.'
+            self.stdout.write(self.style.SUCCESS(message))
+            return
+        ProcessInstance.objects.bulk_update(
+            stale, ['steps_completed', 'steps_total'], batch_size=500
+        )
+        for wfi in WorkflowInstance.objects.filter(pis__in=stale).distinct():
+            wfi.update_percent_complete()
+        message = f'{ datetime.now() } - Updated step counts for ' \
+            f'{ len(stale) } of { len(pis) } ProcessInstances.'
+        self.stdout.write(self.style.SUCCESS(message))
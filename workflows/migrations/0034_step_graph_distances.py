@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0033_employeetransition_extension_remain_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='step_graph_has_cycle',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether any step can lead back to an earlier step'),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='max_steps_after',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='max_steps_before',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='min_steps_after',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='min_steps_before',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
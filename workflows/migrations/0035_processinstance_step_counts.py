@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0034_step_graph_distances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processinstance',
+            name='steps_completed',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processinstance',
+            name='steps_total',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0035_processinstance_step_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='step_graph_compiled',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether the step distances are up to date with the steps and their choices'),
+        ),
+    ]
@@ -57,6 +57,25 @@ class Role(models.Model):
     )
 
 
+class EmployeeTransitionManager(models.Manager):
+    def save_all(self, transitions, update_fields=None):
+        """
+        Save several transitions, creating their change records in a single
+        query.
+        """
+        changes = []
+        for transition in transitions:
+            change = transition.save_tracked(update_fields=update_fields)
+            if change:
+                changes.append(change)
+        if changes:
+            employee = get_current_employee()
+            for change in changes:
+                change.created_by = employee
+            TransitionChange.objects.bulk_create(changes)
+        return changes
+
+
 class EmployeeTransition(models.Model):
     TRANSITION_TYPE_NEW = 'New'
     TRANSITION_TYPE_RETURN = 'Return'
@@ -303,81 +322,109 @@ class EmployeeTransition(models.Model):
         max_length=100, choices=ASSIGNEE_CHOICES, default=ASSIGNEE_NONE
     )
 
-    __original_values = {}
+    objects = EmployeeTransitionManager()
+
+    # Fields that changes are not recorded for
+    UNTRACKED_FIELDS = ['id', 'date_submitted', 'submitter']
 
     @property
     def is_sds(self):
         return self.employee_id == self.EMPLOYEE_ID_CLSD
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.__original_values = self.__dict__.copy()
-        # self.__original_values["date_submitted"] = json.dumps(self.date_submitted)
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        original = self.__original_values
-        new = self.__dict__.copy()
-        # Creata a change record
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Keep the loaded values as they are, only building the tracked values
+        # from them when the transition is saved
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = (field_names, values)
+        return instance
+
+    @classmethod
+    def tracked_fields(cls):
+        return [
+            field for field in cls._meta.concrete_fields
+            if field.name not in cls.UNTRACKED_FIELDS
+        ]
+
+    @staticmethod
+    def tracked_value(field, value):
+        """
+        The value of a field as compared for change records. Dates from the
+        form are strings, and microseconds are ignored.
+        """
+        if isinstance(field, models.DateTimeField) and value:
+            if type(value) == str:
+                value = datetime.strptime(
+                    value, '%Y-%m-%dT%H:%M:%S.%fZ'
+                ).replace(tzinfo=timezone.utc)
+            return str(value - timedelta(microseconds=value.microsecond))
+        return value
+
+    def original_values(self):
+        """
+        Tracked field values as last loaded from or saved to the database, by
+        column, or None for a transition that was never loaded or saved.
+        """
+        if not hasattr(self, '_original_values'):
+            if not hasattr(self, '_loaded_values'):
+                return None
+            field_names, values = self._loaded_values
+            self._original_values = dict(zip(field_names, values))
+        return self._original_values
+
+    def pending_change(self, update_fields=None):
+        """
+        An unsaved change record for the tracked fields that differ from
+        their original values, or None if nothing changed.
+        """
+        original = self.original_values()
+        if original is None:
+            return None
         changes = {}
-        for field in self._meta.fields:
-            if field.name in ["id", "date_submitted", "submitter"]:
+        for field in self.tracked_fields():
+            if field.attname not in original:
+                # Deferred when loaded
                 continue
-            if field.name == 'transition_date' and new[field.name]:
-                original_date = original[field.name]
-                new_date = new[field.name]
-                # When coming from the form, the date is a string
-                if type(new_date) == str:
-                    new_date = datetime.strptime(
-                        new_date, '%Y-%m-%dT%H:%M:%S.%fZ'
-                    ).replace(tzinfo=timezone.utc)
-                # Strip microseconds from timestamps
-                new_date -= timedelta(microseconds=new_date.microsecond)
-                if original_date:
-                    original_date -= timedelta(
-                        microseconds=original_date.microsecond
-                    )
-                # Do not create a change record if the date has not changed
-                if original_date == new_date:
-                    continue
-                # String representation of the date
-                original_value = str(original_date)
-                new_value = str(new_date)
-            elif field.name == 'system_change_date' and new[field.name]:
-                original_date = original[field.name]
-                new_date = new[field.name]
-                # When coming from the form, the date is a string
-                if type(new_date) == str:
-                    new_date = datetime.strptime(
-                        new_date, '%Y-%m-%dT%H:%M:%S.%fZ'
-                    ).replace(tzinfo=timezone.utc)
-                # Strip microseconds from timestamps
-                new_date -= timedelta(microseconds=new_date.microsecond)
-                if original_date:
-                    original_date -= timedelta(
-                        microseconds=original_date.microsecond
-                    )
-                # Do not create a change record if the date has not changed
-                if original_date == new_date:
-                    continue
-                # String representation of the date
-                original_value = str(original_date)
-                new_value = str(new_date)
-            else:
-                original_value = original[field.column]
-                new_value = new[field.column]
+            if update_fields is not None and field.name not in update_fields:
+                continue
+            original_value = self.tracked_value(field, original[field.attname])
+            new_value = self.tracked_value(field, getattr(self, field.attname))
             if original_value != new_value:
                 changes[field.name] = {
                     "original": original_value,
                     "new": new_value,
                 }
-        if len(changes):
-            json_changes = json.dumps(changes, sort_keys=True, default=str)
-            employee = get_current_employee()
-            TransitionChange.objects.create(
-                transition=self, created_by=employee,
-                changes=json_changes
-            )
+        if not len(changes):
+            return None
+        return TransitionChange(
+            transition=self,
+            changes=json.dumps(changes, sort_keys=True, default=str)
+        )
+
+    def reset_original_values(self, update_fields=None):
+        original = self.original_values()
+        if original is None:
+            original = self._original_values = {}
+        for field in self.tracked_fields():
+            if update_fields is None or field.name in update_fields:
+                original[field.attname] = getattr(self, field.attname)
+
+    def save_tracked(self, *args, **kwargs):
+        """
+        Save the transition, returning its unsaved change record, if any.
+        """
+        update_fields = kwargs.get('update_fields')
+        change = self.pending_change(update_fields)
+        super().save(*args, **kwargs)
+        self.reset_original_values(update_fields)
+        return change
+
+    def save(self, *args, **kwargs):
+        change = self.save_tracked(*args, **kwargs)
+        # Create a change record
+        if change:
+            change.created_by = get_current_employee()
+            change.save()
 
     def employee_action_required(self, employee):
         # Return True if the employee is responsible for reviewing the form
@@ -385,7 +432,7 @@ class EmployeeTransition(models.Model):
         if assignee in [self.ASSIGNEE_NONE, self.ASSIGNEE_COMPLETE]:
             return False
         elif assignee == self.ASSIGNEE_SUBMITTER:
-            if self.submitter == employee:
+            if self.submitter_id == employee.pk:
                 return True
         elif assignee == self.ASSIGNEE_HIRING_LEAD:
             return employee.is_sds_hiring_lead
@@ -470,6 +517,17 @@ class Process(models.Model):
         )
     )
     version = models.IntegerField(default=1)
+    step_graph_has_cycle = models.BooleanField(
+        default=False, editable=False,
+        help_text=_("Whether any step can lead back to an earlier step")
+    )
+    step_graph_compiled = models.BooleanField(
+        default=False, editable=False,
+        help_text=_(
+            "Whether the step distances are up to date with the steps and "
+            "their choices"
+        )
+    )
 
     @property
     def total_steps(self):
@@ -500,6 +558,117 @@ class Process(models.Model):
     #                 self.steps.last().end = True
     #                 self.save()
 
+    def compile_step_graph(self):
+        """
+        Store on each step the fewest and most steps between it and the start
+        step and between it and the end step, so progress through a process is
+        a lookup instead of a walk. Steps that lead back to an earlier step
+        form a cycle; those edges are left out of the longest paths, and the
+        process is flagged. Returns whether there is a cycle.
+        """
+        steps = {
+            pk: (start, end) for pk, start, end in
+            self.steps.values_list('pk', 'start', 'end')
+        }
+        edges = {pk: [] for pk in steps}
+        for pk, next_step_pk in self.steps.values_list('pk', 'next_step'):
+            if next_step_pk in steps:
+                edges[pk].append(next_step_pk)
+        for pk, next_step_pk in StepChoice.objects\
+            .filter(step__process=self)\
+            .order_by('step', 'order', 'pk')\
+            .values_list('step', 'next_step'):
+            if next_step_pk in steps and next_step_pk not in edges[pk]:
+                edges[pk].append(next_step_pk)
+        reverse_edges = {pk: [] for pk in steps}
+        for pk, next_pks in edges.items():
+            for next_pk in next_pks:
+                reverse_edges[next_pk].append(pk)
+        starts = [pk for pk, (start, end) in steps.items() if start]
+        ends = [pk for pk, (start, end) in steps.items() if end]
+
+        def shortest(sources, graph):
+            distances = {pk: 0 for pk in sources}
+            queue = list(sources)
+            for pk in queue:
+                for next_pk in graph[pk]:
+                    if next_pk not in distances:
+                        distances[next_pk] = distances[pk] + 1
+                        queue.append(next_pk)
+            return distances
+
+        # Depth first search for edges that lead back to a step still being
+        # visited, and a topological order of what remains
+        back_edges = set()
+        order = []
+        state = {}
+        for root in starts + sorted(steps):
+            if root in state:
+                continue
+            state[root] = 'visiting'
+            stack = [(root, iter(edges[root]))]
+            while stack:
+                pk, next_pks = stack[-1]
+                next_pk = next(next_pks, None)
+                if next_pk is None:
+                    state[pk] = 'done'
+                    order.append(pk)
+                    stack.pop()
+                elif state.get(next_pk) == 'visiting':
+                    back_edges.add((pk, next_pk))
+                elif next_pk not in state:
+                    state[next_pk] = 'visiting'
+                    stack.append((next_pk, iter(edges[next_pk])))
+        order.reverse()
+
+        def longest(sources, graph, order, reverse):
+            distances = {pk: 0 for pk in sources}
+            for pk in order:
+                if pk not in distances:
+                    continue
+                for next_pk in graph[pk]:
+                    edge = (next_pk, pk) if reverse else (pk, next_pk)
+                    if edge not in back_edges:
+                        distances[next_pk] = max(
+                            distances.get(next_pk, 0), distances[pk] + 1
+                        )
+            return distances
+
+        min_before = shortest(starts, edges)
+        min_after = shortest(ends, reverse_edges)
+        max_before = longest(starts, edges, order, False)
+        max_after = longest(ends, reverse_edges, order[::-1], True)
+        Step.objects.bulk_update([
+            Step(
+                pk=pk,
+                min_steps_before=min_before.get(pk),
+                max_steps_before=max_before.get(pk),
+                min_steps_after=min_after.get(pk),
+                max_steps_after=max_after.get(pk)
+            ) for pk in steps
+        ], [
+            'min_steps_before', 'max_steps_before', 'min_steps_after',
+            'max_steps_after'
+        ])
+        has_cycle = bool(back_edges)
+        self.step_graph_has_cycle = has_cycle
+        self.step_graph_compiled = True
+        Process.objects.filter(pk=self.pk).update(
+            step_graph_has_cycle=has_cycle, step_graph_compiled=True
+        )
+        return has_cycle
+
+    def clear_step_graph(self):
+        """
+        Clear the step distances, to be compiled again on next use.
+        """
+        self.step_graph_compiled = False
+        Process.objects.filter(pk=self.pk).update(step_graph_compiled=False)
+        self.steps.update(
+            min_steps_before=None, max_steps_before=None,
+            min_steps_after=None, max_steps_after=None
+        )
+
     def create_process_instance(self, wfi):
         pi = ProcessInstance.objects.create(
             process=self, workflow_instance=wfi
@@ -509,6 +678,7 @@ class Process(models.Model):
         from workflows.helpers import send_step_completion_email
         send_step_completion_email(si)
         pi.current_step_instance = si
+        pi.count_steps()
         pi.save()
     
     def delete_process_instances(self, wfi):
@@ -572,6 +742,9 @@ class Step(models.Model):
     def __str__(self):
         return f"{self.order} - {self.name}"
 
+    # Whether the distances were reloaded after the process was compiled
+    _distances_loaded = False
+
     process = models.ForeignKey(
         Process, related_name="steps", on_delete=models.CASCADE
     )
@@ -606,6 +779,20 @@ class Step(models.Model):
     optional_actions = models.ManyToManyField(
         Action, blank=True, related_name="triggering_steps"
     )
+    # Distances to the start and end steps, compiled by
+    # Process.compile_step_graph. Blank until compiled or when unreachable.
+    min_steps_before = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+    max_steps_before = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+    min_steps_after = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+    max_steps_after = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
 
     # TODO: On save, make sure there is only one start and end step for a given process
 
@@ -628,71 +815,51 @@ class Step(models.Model):
         else:
             return None
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.process.clear_step_graph()
+
+    def delete(self, *args, **kwargs):
+        process = self.process
+        result = super().delete(*args, **kwargs)
+        process.clear_step_graph()
+        return result
+
+    def compiled_distance(self, field):
+        # Stays None once compiled for steps that can't be reached, so a step
+        # loaded before its process was compiled is only reloaded once
+        if getattr(self, field) is None and not self._distances_loaded:
+            if not self.process.step_graph_compiled:
+                self.process.compile_step_graph()
+            self.refresh_from_db(fields=[
+                'min_steps_before', 'max_steps_before', 'min_steps_after',
+                'max_steps_after'
+            ])
+            self._distances_loaded = True
+        return getattr(self, field)
+
     @property
     def num_steps_before(self):
         """
-        Count the number of steps before the current step. Since there are
-        multiple possible paths to the beginning of a process, just get one
-        route back and call that sufficient.
-        TODO: Rewrite to calculate the best-case (quickest) path back (or worst
-        case, or average of all cases)
+        Count the number of steps before the current step, along the quickest
+        path back to the start of the process.
         """
-        num_steps = 0
-        current_step = self
-        while True:
-            if current_step.start == True:
-                # We have reached the beginning of the process.
-                break
-            else:
-                # Here we just get the first previous step we can
-                previous_step = Step.objects.filter(
-                    next_step=current_step
-                ).first()
-                if not previous_step:
-                    # In the case of a choice, there is no next step, so find
-                    # the step that leads to this one with choices.
-                    step_choice = StepChoice.objects.filter(
-                        next_step=current_step
-                    ).first()
-                    previous_step = step_choice.step
-                if not previous_step:
-                    raise Exception("Couldn't find a previous step.")
-                # Move back one step
-                current_step = previous_step
-                num_steps += 1
+        num_steps = self.compiled_distance('min_steps_before')
+        if num_steps is None:
+            raise Exception("Couldn't find a previous step.")
         return num_steps
 
     @property
     def num_steps_after(self):
         """
-        Count the number of steps after the current step. Since there are
-        multiple possible paths to the end of a process, just get one route
-        forward and call that sufficient.
-        TODO: Rewrite to calculate the best-case (quickest) path forward (or
-        worst case, or average of all cases)
+        Count the number of steps after the current step, along the quickest
+        path forward to the end of the process.
         """
-        num_steps = 0
-        current_step = self
-        while True:
-            if current_step.end == True:
-                # We have reached the end of the process.
-                break
-            else:
-                # Look for the next step
-                if current_step.next_step:
-                    current_step = current_step.next_step
-                else:
-                    # In the case of a choice, there is no next step, so find
-                    # the first choice that leads to a step.
-                    step_choice = StepChoice.objects.filter(
-                        step=current_step
-                    ).first()
-                    if not step_choice:
-                        m = "Couldn't find a next step."
-                        record_error(m, None, None, traceback.format_exc())
-                        raise Exception(m)
-                    current_step = step_choice.next_step
-                num_steps += 1
+        num_steps = self.compiled_distance('min_steps_after')
+        if num_steps is None:
+            m = "Couldn't find a next step."
+            record_error(m, None, None, traceback.format_exc())
+            raise Exception(m)
         return num_steps
 
     #TODO: On save, error if no next and not end
@@ -714,6 +881,16 @@ class StepChoice(models.Model):
         Process, related_name="triggering_step_choices", blank=True
     )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.step.process.clear_step_graph()
+
+    def delete(self, *args, **kwargs):
+        process = self.step.process
+        result = super().delete(*args, **kwargs)
+        process.clear_step_graph()
+        return result
+
 
 class WorkflowInstance(HasTimeStampsMixin, HasCreatorMixin):
     class Meta:
@@ -765,6 +942,15 @@ class WorkflowInstance(HasTimeStampsMixin, HasCreatorMixin):
         return self.pis_action_required(employee) or \
             self.transition_action_required(employee)
     
+    def step_counts(self):
+        return self.pis.aggregate(
+            completed=models.Sum('steps_completed'),
+            total=models.Sum('steps_total'),
+            uncounted=models.Count(
+                'pk', filter=models.Q(steps_total__isnull=True)
+            )
+        )
+
     def delete(self, *args, **kwargs):
         # Delete any employee transitions
         if self.transition:
@@ -772,12 +958,19 @@ class WorkflowInstance(HasTimeStampsMixin, HasCreatorMixin):
         super().delete(*args, **kwargs)
     
     def update_percent_complete(self):
-        pis = self.pis.all()
-        total_steps = sum([pi.total_steps for pi in pis])
+        # Roll up the process instances' step counters, counting any that
+        # have not been counted yet
+        counts = self.step_counts()
+        if counts['uncounted']:
+            for pi in self.pis.filter(steps_total__isnull=True):
+                pi.count_steps()
+                pi.save(update_fields=['steps_completed', 'steps_total'])
+            counts = self.step_counts()
+        total_steps = counts['total'] or 0
         if total_steps == 0:
             self.percent_complete = 100
         else:
-            complete_steps = sum([pi.complete_steps for pi in pis])
+            complete_steps = counts['completed'] or 0
             self.percent_complete = int((complete_steps / total_steps) * 100)
         # Trigger completion if all process instances are complete.
         # If stepping backwards, mark incomplete.
@@ -806,6 +999,10 @@ class ProcessInstance(HasTimeStampsMixin):
         on_delete=models.SET_NULL
     )
     percent_complete = models.IntegerField(default=0)
+    # Steps completed and steps in total, kept up to date as steps are
+    # completed so workflow instances can sum them. Blank until counted.
+    steps_completed = models.PositiveIntegerField(blank=True, null=True)
+    steps_total = models.PositiveIntegerField(blank=True, null=True)
 
     @property
     def total_steps(self):
@@ -825,7 +1022,12 @@ class ProcessInstance(HasTimeStampsMixin):
             return False
         return self.current_step_instance.employee_action_required(employee)
 
+    def count_steps(self):
+        self.steps_total = self.total_steps
+        self.steps_completed = self.complete_steps
+
     def update_percent_complete(self):
+        self.count_steps()
         if not self.current_step_instance:
             self.percent_complete = 100
         else:
@@ -894,8 +1096,6 @@ class StepInstance(HasTimeStampsMixin):
 
     def employee_action_required(self, employee):
         # Return True if the employee is responsible for completing this step
-        if self.step.role:
-            return employee.workflow_roles.filter(
-                pk=self.step.role.pk
-            ).count() > 0
+        if self.step.role_id:
+            return self.step.role_id in employee.permissions.workflow_roles
         return False
\ No newline at end of file
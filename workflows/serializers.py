@@ -321,32 +321,35 @@ class WorkflowInstanceBaseSerializer(serializers.ModelSerializer):
             else:
                 return ''
 
+    def action_required(self, wfi):
+        """
+        Whether the requesting employee has action to take on the process
+        instances and on the transition of a workflow instance. Worked out
+        once per instance and shared by the action required fields.
+        """
+        results = self.context.setdefault('action_required', {})
+        if wfi.pk not in results:
+            user = None
+            request = self.context.get("request")
+            if request and hasattr(request, "user"):
+                user = request.user
+            if user and hasattr(user, "employee"):
+                results[wfi.pk] = (
+                    wfi.pis_action_required(user.employee),
+                    wfi.transition_action_required(user.employee)
+                )
+            else:
+                results[wfi.pk] = (False, False)
+        return results[wfi.pk]
+
     def get_employee_action_required(self, wfi):
-        user = None
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            user = request.user
-        if user and hasattr(user, "employee"):
-            return wfi.employee_action_required(user.employee)
-        return False
+        return any(self.action_required(wfi))
     
     def get_transition_action_required(self, wfi):
-        user = None
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            user = request.user
-        if user and hasattr(user, "employee"):
-            return wfi.transition_action_required(user.employee)
-        return False
+        return self.action_required(wfi)[1]
     
     def get_pis_action_required(self, wfi):
-        user = None
-        request = self.context.get("request")
-        if request and hasattr(request, "user"):
-            user = request.user
-        if user and hasattr(user, "employee"):
-            return wfi.pis_action_required(user.employee)
-        return False
+        return self.action_required(wfi)[0]
 
     @staticmethod
     def get_workflow_name(wfi):
@@ -360,7 +363,24 @@ class WorkflowInstanceBaseSerializer(serializers.ModelSerializer):
         return display_value
 
 
-class WorkflowInstanceSimpleSerializer(WorkflowInstanceBaseSerializer):
+class SparseFieldsMixin:
+    """
+    Only serialize the fields named in the request's comma separated `fields`
+    query parameter, when one is given.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+        if fields:
+            requested = set(fields.split(','))
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+
+class WorkflowInstanceSimpleSerializer(
+    SparseFieldsMixin, WorkflowInstanceBaseSerializer
+):
     """
     Used for WorkflowTable component
     """
@@ -1,3 +1,393 @@
-from django.test import TestCase
+from datetime import datetime, timezone
+from io import StringIO
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from people.middleware import request_local
+from people.models import Employee
+from workflows.api_views import WORKFLOW_INSTANCE_PIS_PREFETCH
+from workflows.helpers import send_weekly_step_reminders
+
+from workflows.models import (
+    EmployeeTransition, Process, ProcessInstance, Role, Step, StepChoice,
+    StepInstance, TransitionChange, Workflow, WorkflowInstance
+)
+
+
+class StepGraphTestCase(TestCase):
+    def setUp(self):
+        workflow = Workflow.objects.create(name="Onboarding")
+        self.process = Process.objects.create(name="IS", workflow=workflow)
+        # A leads to B, which can go on to D, detour through C, or send the
+        # process back to A.
+        self.a, self.b, self.c, self.d = [
+            Step.objects.create(
+                process=self.process, name=name, order=order,
+                start=name == "A", end=name == "D"
+            ) for order, name in enumerate("ABCD")
+        ]
+        self.a.next_step = self.b
+        self.a.save()
+        self.c.next_step = self.d
+        self.c.save()
+        for text, next_step in [
+            ("Done", self.d), ("More", self.c), ("Redo", self.a)
+        ]:
+            StepChoice.objects.create(
+                step=self.b, choice_text=text, next_step=next_step
+            )
+
+    def distances(self):
+        return list(Step.objects.filter(process=self.process).order_by('order')\
+            .values_list(
+                'min_steps_before', 'max_steps_before', 'min_steps_after',
+                'max_steps_after'
+            ))
+
+    def test_compile_step_graph(self):
+        self.assertEqual(self.distances(), [(None,) * 4] * 4)
+        self.assertTrue(self.process.compile_step_graph())
+        self.assertEqual(self.distances(), [
+            (0, 0, 2, 3),
+            (1, 1, 1, 2),
+            (2, 2, 1, 1),
+            (2, 3, 0, 0)
+        ])
+        self.process.refresh_from_db()
+        self.assertTrue(self.process.step_graph_has_cycle)
+
+        StepChoice.objects.filter(choice_text="Redo").delete()
+        self.assertFalse(self.process.compile_step_graph())
+
+    def test_unreachable_step_is_not_recompiled(self):
+        orphan = Step.objects.create(process=self.process, name="E", order=4)
+        self.process.compile_step_graph()
+        orphan = Step.objects.select_related('process').get(pk=orphan.pk)
+        # Reloaded once, then left alone
+        with self.assertNumQueries(1):
+            with self.assertRaises(Exception):
+                orphan.num_steps_before
+        with self.assertNumQueries(0):
+            with self.assertRaises(Exception):
+                orphan.num_steps_before
+        # Changing a step marks the graph to be compiled again
+        orphan.save()
+        self.process.refresh_from_db()
+        self.assertFalse(self.process.step_graph_compiled)
+
+    def test_api_changes_recompile(self):
+        self.process.compile_step_graph()
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create(username="admin", is_superuser=True)
+        )
+        choice = StepChoice.objects.get(choice_text="Redo")
+        response = client.delete(f'/api/v1/stepchoice/{choice.pk}')
+        self.assertEqual(response.status_code, 204)
+        self.process.refresh_from_db()
+        self.assertFalse(self.process.step_graph_has_cycle)
+
+        # C becomes an end step as well
+        response = client.patch(
+            f'/api/v1/step/{self.c.pk}', {'end': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.distances()[2], (2, 2, 0, 1))
+
+    def test_percent_complete_is_a_lookup(self):
+        creator = Employee.objects.create(
+            user=User.objects.create(username="creator")
+        )
+        wfi = WorkflowInstance.objects.create(
+            workflow=self.process.workflow, created_by=creator
+        )
+        pi = ProcessInstance.objects.create(
+            process=self.process, workflow_instance=wfi
+        )
+        pi.current_step_instance = StepInstance.objects.create(
+            step=self.c, process_instance=pi
+        )
+        # Compiled on first use
+        pi.update_percent_complete()
+        self.assertEqual(pi.percent_complete, 66)
+
+        pi = ProcessInstance.objects.select_related(
+            'process', 'current_step_instance__step'
+        ).get(pk=pi.pk)
+        # Find the end step and save
+        with self.assertNumQueries(2):
+            pi.update_percent_complete()
+        self.assertEqual(pi.percent_complete, 66)
+        self.assertEqual(self.process.total_steps, 2)
+
+
+class StepCountTestCase(TestCase):
+    def setUp(self):
+        workflow = Workflow.objects.create(name="Onboarding")
+        creator = Employee.objects.create(
+            user=User.objects.create(username="creator")
+        )
+        self.wfi = WorkflowInstance.objects.create(
+            workflow=workflow, created_by=creator
+        )
+        self.pis = []
+        # Processes of 3 and 1 steps, each at its first step
+        for name, length in [("HR", 4), ("IS", 2)]:
+            process = Process.objects.create(name=name, workflow=workflow)
+            steps = [
+                Step.objects.create(
+                    process=process, name=str(i), order=i, start=i == 0,
+                    end=i == length - 1
+                ) for i in range(length)
+            ]
+            for step, next_step in zip(steps, steps[1:]):
+                step.next_step = next_step
+                step.save()
+            pi = ProcessInstance.objects.create(
+                process=process, workflow_instance=self.wfi
+            )
+            pi.current_step_instance = StepInstance.objects.create(
+                step=steps[0], process_instance=pi
+            )
+            pi.save()
+            self.pis.append((pi, steps))
+
+    def test_counters_roll_up(self):
+        # Counted on first roll up
+        self.wfi.update_percent_complete()
+        self.assertEqual(self.wfi.percent_complete, 0)
+
+        pi, steps = self.pis[0]
+        pi.current_step_instance = StepInstance.objects.create(
+            step=steps[2], process_instance=pi
+        )
+        pi.update_percent_complete()
+        with self.assertNumQueries(2):
+            # Aggregate and save
+            self.wfi.update_percent_complete()
+        self.assertEqual(self.wfi.percent_complete, 50)
+
+        ProcessInstance.objects.filter(pk=pi.pk).update(steps_completed=0)
+        output = StringIO()
+        call_command('sync_workflow_step_counts', '--check', stdout=output)
+        self.assertIn('1 of 2 ProcessInstances', output.getvalue())
+        call_command('sync_workflow_step_counts', stdout=StringIO())
+        pi.refresh_from_db()
+        self.assertEqual(pi.steps_completed, 2)
+
+
+class ActionRequiredTestCase(TestCase):
+    def setUp(self):
+        self.employee = Employee.objects.create(
+            user=User.objects.create(username="admin")
+        )
+        admins = Role.objects.create(name="All Workflows Admins")
+        self.reviewers = Role.objects.create(name="Reviewers")
+        for role in [admins, self.reviewers]:
+            role.members.add(self.employee)
+        self.workflow = Workflow.objects.create(name="Onboarding")
+        self.process = Process.objects.create(
+            name="HR", workflow=self.workflow
+        )
+        self.steps = [
+            Step.objects.create(
+                process=self.process, name="Review", start=True,
+                role=self.reviewers
+            ),
+            Step.objects.create(process=self.process, name="File", end=True)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def add_instances(self, count):
+        for i in range(count):
+            wfi = WorkflowInstance.objects.create(
+                workflow=self.workflow, created_by=self.employee,
+                transition=EmployeeTransition.objects.create(
+                    submitter=self.employee
+                )
+            )
+            pi = ProcessInstance.objects.create(
+                process=self.process, workflow_instance=wfi
+            )
+            pi.current_step_instance = StepInstance.objects.create(
+                step=self.steps[i % 2], process_instance=pi
+            )
+            pi.save()
+
+    def test_action_required_from_preloaded_data(self):
+        self.add_instances(8)
+        wfis = list(
+            WorkflowInstance.objects\
+                .select_related('transition')\
+                .prefetch_related(WORKFLOW_INSTANCE_PIS_PREFETCH)
+        )
+        employee = Employee.objects.select_related('user')\
+            .get(pk=self.employee.pk)
+        # The employee's groups and roles, once
+        with self.assertNumQueries(2):
+            required = [wfi.employee_action_required(employee) for wfi in wfis]
+        self.assertEqual(required, [True, False] * 4)
+
+        response = self.client.get('/api/v1/workflowinstance', {
+            'simple': 'true', 'archived': 'false', 'complete': 'false'
+        })
+        self.assertEqual(
+            [wfi['pis_action_required'] for wfi in response.data['results']],
+            [True, False] * 4
+        )
+
+    def list_queries(self, params):
+        # A fresh user each time, so nothing cached on the employee carries
+        # over between requests
+        self.client.force_authenticate(User.objects.get(username="admin"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/workflowinstance', {
+                'simple': 'true', 'archived': 'false', 'complete': 'false',
+                **params
+            })
+        return response, len(queries)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        self.add_instances(10)
+        response, queries = self.list_queries({})
+        self.assertEqual(len(response.data['results']), 10)
+
+        self.add_instances(990)
+        response, more_queries = self.list_queries({})
+        self.assertEqual(len(response.data['results']), 1000)
+        self.assertEqual(more_queries, queries)
+
+    def test_list_fields_parameter(self):
+        self.add_instances(2)
+        response = self.list_queries({
+            'fields': 'pk,workflow_name,pis_action_required'
+        })[0]
+        self.assertEqual(
+            [set(wfi) for wfi in response.data['results']],
+            [{'pk', 'workflow_name', 'pis_action_required'}] * 2
+        )
+
+
+class TransitionChangeTestCase(TestCase):
+    def setUp(self):
+        # Change records are credited to the requesting employee
+        self.employee = Employee.objects.create(
+            user=User.objects.create(username="hr")
+        )
+        request_local.request = RequestFactory().get('/')
+        request_local.request.user = self.employee.user
+        self.addCleanup(delattr, request_local, 'request')
+        EmployeeTransition.objects.create(
+            employee_first_name="Ada",
+            transition_date=datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)
+        )
+
+    def test_changes_are_recorded_against_loaded_values(self):
+        transition = EmployeeTransition.objects.get()
+        # The same date from the form, with microseconds
+        transition.transition_date = '2024-05-01T08:30:00.250Z'
+        transition.employee_first_name = "Grace"
+        transition.save()
+        transition.save()
+        change = TransitionChange.objects.get()
+        self.assertEqual(change.created_by, self.employee)
+        self.assertEqual(json.loads(change.changes), {
+            "employee_first_name": {"original": "Ada", "new": "Grace"}
+        })
+
+    def test_only_update_fields_are_recorded(self):
+        transition = EmployeeTransition.objects.get()
+        transition.employee_first_name = "Grace"
+        transition.assignee = EmployeeTransition.ASSIGNEE_HR
+        transition.save(update_fields=['assignee'])
+        self.assertEqual(
+            list(json.loads(TransitionChange.objects.get().changes)),
+            ['assignee']
+        )
+        transition.refresh_from_db()
+        self.assertEqual(transition.employee_first_name, "Ada")
+
+    def test_save_all_creates_changes_together(self):
+        for i in range(4):
+            EmployeeTransition.objects.create(employee_first_name="Ada")
+        transitions = list(EmployeeTransition.objects.all())
+        for transition in transitions:
+            transition.employee_first_name = "Grace"
+        # One update per transition and one insert for all the changes
+        with CaptureQueriesContext(connection) as queries:
+            EmployeeTransition.objects.save_all(transitions)
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(queries), len(transitions) + 1)
+        self.assertEqual(TransitionChange.objects.count(), len(transitions))
+
+
+class WeeklyStepRemindersTestCase(TestCase):
+    def setUp(self):
+        reviewers = Role.objects.create(name="Reviewers")
+        self.reviewers = [
+            Employee.objects.create(user=User.objects.create(
+                username=username, email=f"{username}@example.com"
+            )) for username in ["ada", "grace"]
+        ]
+        reviewers.members.add(*self.reviewers)
+        self.workflow = Workflow.objects.create(name="Onboarding")
+        self.process = Process.objects.create(
+            name="HR", workflow=self.workflow
+        )
+        self.step = Step.objects.create(
+            process=self.process, name="Review", start=True, role=reviewers
+        )
+
+    def add_instances(self, count):
+        for i in range(count):
+            wfi = WorkflowInstance.objects.create(
+                workflow=self.workflow, created_by=self.reviewers[0]
+            )
+            pi = ProcessInstance.objects.create(
+                process=self.process, workflow_instance=wfi
+            )
+            pi.current_step_instance = StepInstance.objects.create(
+                step=self.step, process_instance=pi
+            )
+            pi.save()
+
+    def reminder_queries(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            sent = send_weekly_step_reminders(**kwargs)
+        return sent, len(queries)
+
+    def test_reminders_are_sent_together(self):
+        self.add_instances(3)
+        sent, queries = self.reminder_queries()
+        self.assertEqual(sent, 2)
+        self.assertEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            ["ada@example.com", "grace@example.com"]
+        )
+
+        # More steps to remind about take no more queries
+        self.add_instances(6)
+        self.assertEqual(self.reminder_queries(), (2, queries))
+
+    def test_dry_run_sends_nothing(self):
+        self.add_instances(2)
+        self.assertEqual(send_weekly_step_reminders(dry_run=True), 2)
+        self.assertEqual(len(mail.outbox), 0)
+        out = StringIO()
+        call_command('send_weekly_step_reminders', '--dry-run', stdout=out)
+        self.assertIn('Dry run', out.getvalue())
+        self.assertRegex(out.getvalue(), r'in [1-9]\d* queries')
+        self.assertEqual(len(mail.outbox), 0)